@@ -0,0 +1,846 @@
+"""Persistencia de inventario y pedidos (Gestión Documental).
+
+Define la interfaz ``Almacen`` y dos implementaciones:
+
+* ``AlmacenCSV``: los pedidos se guardan en un libro de solo-anexado
+  (``pedidos.csv``) y los cambios de stock como movimientos (deltas) en
+  ``inventario_movimientos.csv``. ``inventario.csv`` solo se reescribe al compactar.
+* ``AlmacenSQLite``: base de datos embebida con claves primarias en ``ID`` e
+  ``ID_Pedido`` e índices en ``Fecha``, ``Vendedor`` y ``Producto``. Cada venta
+  se confirma en una única transacción.
+
+Con el backend CSV, ``inventario.csv`` y ``pedidos.csv`` tienen además una
+instantánea columnar Arrow IPC (``.arrow``) que se abre mapeada en memoria al
+arrancar: solo las filas anexadas al CSV después de la instantánea se parsean
+como texto. Los CSV siguen siendo la fuente de verdad y el formato de
+intercambio; la instantánea se regenera sola cuando quedan muchas filas fuera.
+
+La compactación no aplica dos veces un delta aunque se corte a la mitad: los
+movimientos se apartan (``.plegando``), el inventario nuevo se escribe y
+sincroniza en ``inventario.csv.compactado``, los movimientos pasan a
+``.plegado`` y solo entonces se instala el inventario. Al abrir el almacén
+se termina o deshace la compactación interrumpida. Las referencias de las
+ventas plegadas se anotan en ``inventario_movimientos_plegados.csv`` (una fila
+por venta) para que la recuperación de la bitácora sepa que su stock ya se
+descontó aunque sus movimientos ya no existan. Anexos y compactación se
+excluyen entre procesos con ``flock`` sobre ``inventario_movimientos.csv.lock``;
+sin ``fcntl`` (Windows) solo un proceso debe escribir los CSV a la vez.
+
+El backend se elige con la variable de entorno ``ALMACEN_BACKEND`` (``csv`` o
+``sqlite``). Para importar los CSV existentes a SQLite::
+
+    python almacenamiento.py migrar --db ventas.db
+"""
+import argparse
+import contextlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from esquema import FORMATO_FECHA, tipar_inventario, tipar_pedidos, concatenar
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:  # Sin pyarrow se leen siempre los CSV completos
+    pa = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo de archivos entre procesos
+    fcntl = None
+
+# --- ARCHIVOS Y PARÁMETROS ---
+INVENTARIO_FILE = 'inventario.csv'
+PEDIDOS_FILE = 'pedidos.csv'
+MOVIMIENTOS_FILE = 'inventario_movimientos.csv'
+SQLITE_FILE = 'ventas.db'
+UMBRAL_COMPACTACION = 500  # Movimientos acumulados antes de reescribir inventario.csv
+
+COLUMNAS_INVENTARIO = ['ID', 'Producto', 'Stock_Actual', 'Precio', 'Categoría']
+COLUMNAS_PEDIDOS = ['ID_Pedido', 'Fecha', 'Producto', 'Cantidad', 'Monto_Neto', 'Monto_Total', 'Vendedor', 'Factura_Ruta']
+COLUMNAS_MOVIMIENTOS = ['ID', 'Delta', 'Referencia']
+TAMANO_BLOQUE = 50_000  # Filas por bloque al recorrer el historial
+UMBRAL_INSTANTANEA = 10_000  # Filas del CSV fuera de la instantánea antes de regenerarla
+
+
+class StockInsuficiente(Exception):
+    """No hay unidades suficientes para completar la operación."""
+
+    def __init__(self, id_producto, solicitado, disponible):
+        super().__init__(f"Stock insuficiente para {id_producto}: solicitado {solicitado}, disponible {disponible}.")
+        self.id_producto = id_producto
+        self.solicitado = solicitado
+        self.disponible = disponible
+
+
+class VentaIncompleta(Exception):
+    """El stock de la venta quedó descontado en disco sin sus líneas de pedido.
+
+    La venta no debe anularse: la recuperación de la bitácora completa el pedido.
+    """
+
+
+def inventario_base():
+    """Inventario de ejemplo con el que arranca un almacén vacío."""
+    return pd.DataFrame({
+        'ID': ['E101', 'E102', 'E103', 'E104', 'E105'],
+        'Producto': ['Cable THHN 12AWG', 'Toma Corriente Doble', 'Interruptor Sencillo', 'Regulador de Voltaje', 'Fusible 10A'],
+        'Stock_Actual': [1500, 35, 400, 100, 10],
+        'Precio': [0.75, 3.50, 2.15, 45.00, 0.50],
+        'Categoría': ['Material', 'Accesorio', 'Accesorio', 'Equipo', 'Componente']
+    })
+
+
+def tipar(df):
+    """Aplica el esquema de inventario o de pedidos según las columnas del DataFrame."""
+    if 'ID_Pedido' in df.columns:
+        return tipar_pedidos(df)
+    if 'Stock_Actual' in df.columns:
+        return tipar_inventario(df)
+    return df
+
+
+def cargar_datos(filename):
+    """Carga datos desde CSV con su esquema tipado. Si no existe, crea un DataFrame base."""
+    if os.path.exists(filename):
+        return tipar(pd.read_csv(filename))
+    else:
+        if filename == INVENTARIO_FILE:
+            return tipar(inventario_base())
+        elif filename == PEDIDOS_FILE:
+            return tipar(pd.DataFrame(columns=COLUMNAS_PEDIDOS))
+    return pd.DataFrame()
+
+
+def guardar_datos(df, filename):
+    """Guarda el DataFrame en un archivo CSV (escritura atómica vía archivo temporal)."""
+    temporal = f"{filename}.tmp"
+    df.to_csv(temporal, index=False, date_format=FORMATO_FECHA)
+    os.replace(temporal, filename)
+
+
+def anexar_datos(df, filename):
+    """Añade filas al final de un CSV, escribiendo la cabecera solo si el archivo es nuevo."""
+    nuevo = not os.path.exists(filename) or os.path.getsize(filename) == 0
+    df.to_csv(filename, mode='a', header=nuevo, index=False, date_format=FORMATO_FECHA)
+
+
+def _sincronizar_archivo(filename):
+    """fsync de un archivo existente (no hace nada si no existe)."""
+    if not os.path.exists(filename):
+        return
+    fd = os.open(filename, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _sincronizar_directorio(directorio):
+    """fsync de un directorio para que sus altas y renombres sobrevivan a un corte (solo POSIX)."""
+    try:
+        fd = os.open(directorio or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# --- INSTANTÁNEAS COLUMNARES (Arrow IPC) ---
+
+def ruta_instantanea(filename):
+    return os.path.splitext(filename)[0] + '.arrow'
+
+
+def _cola_csv(filename, posicion, tamano=64):
+    """Últimos bytes del CSV antes de ``posicion``: validan que la instantánea corresponde al archivo."""
+    with open(filename, 'rb') as f:
+        f.seek(max(posicion - tamano, 0))
+        return f.read(min(posicion, tamano))
+
+
+def guardar_instantanea(df, filename):
+    """Escribe la instantánea Arrow de ``df``, que debe reflejar el CSV tal como está ahora."""
+    if pa is None or not os.path.exists(filename):
+        return
+    posicion = os.path.getsize(filename)
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    tabla = tabla.replace_schema_metadata({
+        **(tabla.schema.metadata or {}),
+        b'csv_posicion': str(posicion).encode(),
+        b'csv_cola': _cola_csv(filename, posicion).hex().encode(),
+    })
+    ruta = ruta_instantanea(filename)
+    temporal = f"{ruta}.tmp"
+    with pa.OSFile(temporal, 'wb') as destino, pa_ipc.new_file(destino, tabla.schema) as escritor:
+        escritor.write_table(tabla)
+    os.replace(temporal, ruta)
+
+
+def cargar_con_instantanea(filename):
+    """Carga un CSV de solo-anexado desde su instantánea mapeada en memoria más las filas posteriores.
+
+    Devuelve ``(df, filas_fuera)``, donde ``filas_fuera`` es el número de filas
+    leídas del CSV como texto, o ``None`` si no hubo instantánea válida.
+    """
+    ruta = ruta_instantanea(filename)
+    if pa is None or not os.path.exists(filename) or not os.path.exists(ruta):
+        return cargar_datos(filename), None
+    # Sin "with": los búferes del DataFrame pueden seguir apuntando al mapa
+    tabla = pa_ipc.open_file(pa.memory_map(ruta)).read_all()
+    metadatos = tabla.schema.metadata or {}
+    posicion = int(metadatos.get(b'csv_posicion', -1))
+    tamano = os.path.getsize(filename)
+    if posicion < 0 or posicion > tamano or _cola_csv(filename, posicion).hex().encode() != metadatos.get(b'csv_cola'):
+        return cargar_datos(filename), None  # El CSV se reescribió: instantánea obsoleta
+    df = tabla.to_pandas(split_blocks=True)
+    if tamano == posicion:
+        return df, 0
+    with open(filename, 'rb') as f:
+        f.seek(posicion)
+        resto = tipar(pd.read_csv(f, header=None, names=list(df.columns)))
+    return concatenar([df, resto]), len(resto)
+
+
+def _referencias_aplicadas(movimientos):
+    """Referencias con algún delta neto distinto de cero (una venta revertida por completo no cuenta)."""
+    netos = movimientos.groupby(['Referencia', 'ID'])['Delta'].sum()
+    return netos[netos != 0].index.get_level_values('Referencia').unique()
+
+
+def _filtrar_pedidos(df, desde=None, hasta=None, vendedor=None, producto=None):
+    """Aplica los filtros comunes de consulta sobre un DataFrame de pedidos."""
+    mascara = pd.Series(True, index=df.index)
+    if desde is not None:
+        mascara &= df['Fecha'] >= desde
+    if hasta is not None:
+        mascara &= df['Fecha'] <= hasta
+    if vendedor is not None:
+        mascara &= df['Vendedor'] == vendedor
+    if producto is not None:
+        mascara &= df['Producto'] == producto
+    return df[mascara]
+
+
+class Almacen:
+    """Interfaz común de los backends de persistencia.
+
+    Las fechas de los filtros se comparan como texto ``'%Y-%m-%d %H:%M'``.
+    """
+
+    def cargar_inventario(self):
+        """Inventario completo como DataFrame."""
+        raise NotImplementedError
+
+    def cargar_pedidos(self):
+        """Historial completo de líneas de pedido."""
+        raise NotImplementedError
+
+    def obtener_producto(self, id_producto):
+        """Fila del inventario como dict, o ``None`` si el ID no existe."""
+        raise NotImplementedError
+
+    def consultar_pedidos(self, desde=None, hasta=None, vendedor=None, producto=None, limite=None):
+        """Líneas de pedido que cumplen los filtros, ordenadas por fecha (las más recientes si hay límite)."""
+        raise NotImplementedError
+
+    def iterar_pedidos(self, desde=None, hasta=None, vendedor=None, producto=None, tamano_bloque=TAMANO_BLOQUE):
+        """Recorre los pedidos filtrados en bloques de DataFrame, en orden del libro.
+
+        La memoria queda acotada por ``tamano_bloque`` sin importar el tamaño del historial.
+        """
+        raise NotImplementedError
+
+    def registrar_venta(self, lineas_pedido, movimientos, referencia):
+        """Persiste las líneas de pedido y los deltas de stock de una venta.
+
+        ``movimientos`` es un dict ``{ID: delta}`` (negativo al vender) y
+        ``referencia`` identifica la venta (ID de factura).
+        """
+        raise NotImplementedError
+
+    def registrar_lote(self, lineas_pedido, df_movimientos):
+        """Persiste varias ventas en una sola operación (importación masiva).
+
+        ``df_movimientos`` tiene las columnas ``COLUMNAS_MOVIMIENTOS``, con la
+        referencia de cada venta en ``Referencia``. Se aplica todo o nada.
+        """
+        raise NotImplementedError
+
+    def agregar_producto(self, item):
+        """Persiste un nuevo producto (DataFrame de una fila)."""
+        raise NotImplementedError
+
+    def pedidos_existentes(self, ids_pedido):
+        """Subconjunto de ``ids_pedido`` que ya está en el libro de pedidos (recuperación de la bitácora)."""
+        raise NotImplementedError
+
+    def referencias_con_movimientos(self, referencias):
+        """Subconjunto de ``referencias`` con movimientos de stock persistidos sin sus líneas de pedido."""
+        return set()
+
+    def sincronizar(self):
+        """Lleva a disco (fsync) todo lo persistido hasta ahora (opcional)."""
+
+    def compactar(self):
+        """Mantenimiento periódico del backend (opcional)."""
+
+
+class AlmacenCSV(Almacen):
+    """Almacén basado en CSV: libro de pedidos y deltas de stock de solo-anexado.
+
+    Mantiene en memoria una copia del inventario indexada por ``ID`` para que
+    las búsquedas por producto no relean el archivo.
+    """
+
+    def __init__(self, inventario_file=INVENTARIO_FILE, pedidos_file=PEDIDOS_FILE,
+                 movimientos_file=MOVIMIENTOS_FILE, umbral_compactacion=UMBRAL_COMPACTACION):
+        self.inventario_file = inventario_file
+        self.pedidos_file = pedidos_file
+        self.movimientos_file = movimientos_file
+        self.umbral_compactacion = umbral_compactacion
+        self._plegando_file = f"{movimientos_file}.plegando"  # Movimientos apartados por la compactación
+        self._plegado_file = f"{movimientos_file}.plegado"  # Ya incluidos en inventario.csv.compactado
+        self._compactado_file = f"{inventario_file}.compactado"  # Inventario nuevo aún sin instalar
+        self._plegados_file = f"{os.path.splitext(movimientos_file)[0]}_plegados.csv"  # Referencias ya plegadas
+        self._lock = threading.Lock()
+        self._archivo_bloqueo = None  # (pid, descriptor) del .lock compartido entre procesos
+        self._inventario = None
+        with self._bloqueo():
+            self._movimientos_pendientes = self._contar_movimientos()
+
+    @contextlib.contextmanager
+    def _bloqueo(self):
+        """Excluye a los demás hilos y, con ``fcntl``, a los procesos que usan los mismos CSV.
+
+        Al entrar termina o deshace la compactación que otro proceso dejó a medias.
+        """
+        with self._lock:
+            if fcntl is None:
+                self._reparar_compactacion()
+                yield
+                return
+            pid, fd = self._archivo_bloqueo or (None, None)
+            if pid != os.getpid():  # Tras un fork el descriptor heredado compartiría el bloqueo del padre
+                fd = os.open(f"{self.movimientos_file}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+                self._archivo_bloqueo = (os.getpid(), fd)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                self._reparar_compactacion()
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _reparar_compactacion(self):
+        if os.path.exists(self._plegado_file):
+            # Los movimientos ya están en el inventario compactado: solo faltaba instalarlo
+            if os.path.exists(self._compactado_file):
+                os.replace(self._compactado_file, self.inventario_file)
+            os.remove(self._plegado_file)
+        elif os.path.exists(self._compactado_file):
+            os.remove(self._compactado_file)  # A medio escribir; sus movimientos siguen en .plegando
+
+    def _archivos_movimientos(self):
+        """Archivos de deltas aún no plegados en inventario.csv."""
+        return [ruta for ruta in (self._plegando_file, self.movimientos_file) if os.path.exists(ruta)]
+
+    def _contar_movimientos(self):
+        if not os.path.exists(self.movimientos_file):
+            return 0
+        with open(self.movimientos_file, 'rb') as f:
+            return max(sum(1 for _ in f) - 1, 0)  # Sin contar la cabecera
+
+    def _inventario_con_movimientos(self, archivos=None):
+        df, _ = cargar_con_instantanea(self.inventario_file)
+        if not os.path.exists(self.inventario_file):
+            # Materializa el inventario base para que los anexos posteriores tengan cabecera
+            guardar_datos(df, self.inventario_file)
+        archivos = self._archivos_movimientos() if archivos is None else archivos
+        if archivos:
+            movimientos = pd.concat([pd.read_csv(ruta) for ruta in archivos])
+            deltas = movimientos.groupby('ID')['Delta'].sum()
+            df['Stock_Actual'] = (df['Stock_Actual'] + df['ID'].map(deltas).fillna(0)).astype(int)
+        return tipar_inventario(df)
+
+    def _inventario_en_memoria(self):
+        if self._inventario is None:
+            self._inventario = self._inventario_con_movimientos().set_index('ID', drop=False)
+        return self._inventario
+
+    def cargar_inventario(self):
+        """Inventario base de inventario.csv con los movimientos pendientes aplicados."""
+        with self._bloqueo():
+            return self._inventario_en_memoria().reset_index(drop=True)
+
+    def cargar_pedidos(self):
+        with self._lock:
+            df, filas_fuera = cargar_con_instantanea(self.pedidos_file)
+            if filas_fuera is None or filas_fuera >= UMBRAL_INSTANTANEA:
+                guardar_instantanea(df, self.pedidos_file)
+        return df
+
+    def obtener_producto(self, id_producto):
+        with self._bloqueo():
+            inventario = self._inventario_en_memoria()
+            if id_producto not in inventario.index:
+                return None
+            return inventario.loc[id_producto].to_dict()
+
+    def consultar_pedidos(self, desde=None, hasta=None, vendedor=None, producto=None, limite=None):
+        df = _filtrar_pedidos(self.cargar_pedidos(), desde, hasta, vendedor, producto)
+        return df.tail(limite) if limite is not None else df
+
+    def iterar_pedidos(self, desde=None, hasta=None, vendedor=None, producto=None, tamano_bloque=TAMANO_BLOQUE):
+        if not os.path.exists(self.pedidos_file):
+            return
+        for bloque in pd.read_csv(self.pedidos_file, chunksize=tamano_bloque):
+            bloque = _filtrar_pedidos(tipar_pedidos(bloque), desde, hasta, vendedor, producto)
+            if len(bloque):
+                yield bloque
+
+    def registrar_venta(self, lineas_pedido, movimientos, referencia):
+        df_movimientos = pd.DataFrame(
+            [{'ID': id_producto, 'Delta': delta, 'Referencia': referencia} for id_producto, delta in movimientos.items()],
+            columns=COLUMNAS_MOVIMIENTOS
+        )
+        self.registrar_lote(lineas_pedido, df_movimientos)
+
+    def registrar_lote(self, lineas_pedido, df_movimientos):
+        with self._bloqueo():
+            # Primero los movimientos: si el proceso cae entre ambos anexos, la
+            # recuperación ve el stock descontado y solo completa el libro de pedidos
+            anexar_datos(df_movimientos[COLUMNAS_MOVIMIENTOS], self.movimientos_file)
+            self._movimientos_pendientes += len(df_movimientos)
+            try:
+                anexar_datos(lineas_pedido[COLUMNAS_PEDIDOS], self.pedidos_file)
+            except BaseException as error:
+                self._compensar(df_movimientos, error)
+                raise
+            self._aplicar_deltas(df_movimientos)
+            if self._movimientos_pendientes >= self.umbral_compactacion:
+                self._compactar()
+
+    def _aplicar_deltas(self, df_movimientos):
+        if self._inventario is not None:
+            deltas = df_movimientos.groupby('ID', sort=False)['Delta'].sum()
+            stock = self._inventario['Stock_Actual']
+            self._inventario.loc[deltas.index, 'Stock_Actual'] = (stock.loc[deltas.index] + deltas).astype(stock.dtype).to_numpy()
+
+    def _compensar(self, df_movimientos, error):
+        """Revierte con deltas opuestos los movimientos de una venta cuyo pedido no se pudo anexar."""
+        try:
+            anexar_datos(df_movimientos[COLUMNAS_MOVIMIENTOS].assign(Delta=-df_movimientos['Delta']), self.movimientos_file)
+        except Exception:
+            # El descuento sigue en disco: la memoria lo refleja y la bitácora conserva la venta
+            self._aplicar_deltas(df_movimientos)
+            raise VentaIncompleta(f"Venta sin líneas de pedido: {error}") from error
+        self._movimientos_pendientes += len(df_movimientos)
+
+    def agregar_producto(self, item):
+        with self._bloqueo():
+            inventario = self._inventario_en_memoria()
+            anexar_datos(item[COLUMNAS_INVENTARIO], self.inventario_file)
+            self._inventario = concatenar([inventario, tipar_inventario(item[COLUMNAS_INVENTARIO])]).set_index('ID', drop=False)
+
+    def pedidos_existentes(self, ids_pedido):
+        ids = set(ids_pedido)
+        pedidos = self.cargar_pedidos()
+        return set(pedidos.loc[pedidos['ID_Pedido'].isin(ids), 'ID_Pedido'])
+
+    def referencias_con_movimientos(self, referencias):
+        aplicadas = set()
+        with self._bloqueo():
+            archivos = self._archivos_movimientos()
+            if archivos:
+                aplicadas.update(_referencias_aplicadas(
+                    pd.concat([pd.read_csv(ruta, dtype={'Referencia': str}) for ruta in archivos])))
+            if os.path.exists(self._plegados_file):
+                aplicadas.update(pd.read_csv(self._plegados_file, dtype=str)['Referencia'])
+        return aplicadas.intersection(referencias)
+
+    def sincronizar(self):
+        with self._bloqueo():
+            for ruta in (self.inventario_file, self.pedidos_file, *self._archivos_movimientos()):
+                _sincronizar_archivo(ruta)
+
+    def _compactar(self):
+        if os.path.exists(self._plegando_file):
+            self._plegar()  # Movimientos de una compactación cortada: van primero, solos
+        if os.path.exists(self.movimientos_file):
+            # Apartarlos bajo el bloqueo: ningún anexo posterior puede caer en el archivo que se pliega
+            os.replace(self.movimientos_file, self._plegando_file)
+            self._plegar()
+        else:
+            inventario = self._inventario_con_movimientos([])
+            guardar_instantanea(inventario, self.inventario_file)
+        self._movimientos_pendientes = 0
+
+    def _plegar(self):
+        """Suma los movimientos de ``.plegando`` a inventario.csv; un corte en cualquier paso lo resuelve ``_reparar_compactacion``."""
+        inventario = self._inventario_con_movimientos([self._plegando_file])
+        inventario.to_csv(self._compactado_file, index=False, date_format=FORMATO_FECHA)
+        _sincronizar_archivo(self._compactado_file)
+        # Sin sus movimientos, estas ventas siguen contando como descontadas para la recuperación
+        plegadas = _referencias_aplicadas(pd.read_csv(self._plegando_file, dtype={'Referencia': str}))
+        anexar_datos(pd.DataFrame({'Referencia': plegadas}), self._plegados_file)
+        _sincronizar_archivo(self._plegados_file)
+        # Desde este renombre los movimientos cuentan como plegados: el inventario nuevo ya está en disco
+        os.replace(self._plegando_file, self._plegado_file)
+        _sincronizar_directorio(os.path.dirname(self._plegado_file))
+        os.replace(self._compactado_file, self.inventario_file)
+        _sincronizar_directorio(os.path.dirname(self.inventario_file))
+        guardar_instantanea(inventario, self.inventario_file)
+        os.remove(self._plegado_file)
+
+    def compactar(self):
+        """Vuelca los movimientos acumulados en inventario.csv y reinicia el registro de deltas."""
+        with self._bloqueo():
+            self._compactar()
+
+    def regenerar_instantaneas(self):
+        """Reescribe las instantáneas Arrow de inventario y pedidos desde los CSV."""
+        with self._bloqueo():
+            self._compactar()
+            guardar_instantanea(cargar_datos(self.pedidos_file), self.pedidos_file)
+
+
+class AlmacenSQLite(Almacen):
+    """Almacén en una base SQLite embebida (una conexión por hilo, modo WAL)."""
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS inventario (
+            ID TEXT PRIMARY KEY,
+            Producto TEXT NOT NULL,
+            Stock_Actual INTEGER NOT NULL,
+            Precio REAL NOT NULL,
+            "Categoría" TEXT
+        );
+        CREATE TABLE IF NOT EXISTS pedidos (
+            ID_Pedido TEXT PRIMARY KEY,
+            Fecha TEXT NOT NULL,
+            Producto TEXT NOT NULL,
+            Cantidad INTEGER NOT NULL,
+            Monto_Neto REAL NOT NULL,
+            Monto_Total REAL NOT NULL,
+            Vendedor TEXT NOT NULL,
+            Factura_Ruta TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_inventario_producto ON inventario(Producto);
+        CREATE INDEX IF NOT EXISTS idx_pedidos_fecha ON pedidos(Fecha);
+        CREATE INDEX IF NOT EXISTS idx_pedidos_vendedor ON pedidos(Vendedor);
+        CREATE INDEX IF NOT EXISTS idx_pedidos_producto ON pedidos(Producto);
+    """
+
+    def __init__(self, ruta=SQLITE_FILE):
+        self.ruta = ruta
+        self._local = threading.local()
+        conn = self._conexion()
+        with conn:
+            conn.executescript(self.ESQUEMA)
+            if conn.execute("SELECT COUNT(*) FROM inventario").fetchone()[0] == 0:
+                self._insertar_inventario(conn, inventario_base())
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _leer(self, consulta, parametros=()):
+        return pd.read_sql_query(consulta, self._conexion(), params=parametros)
+
+    @staticmethod
+    def _filas(df, columnas):
+        """Filas como tuplas de tipos nativos de Python (sqlite3 no acepta escalares de NumPy)."""
+        return df[columnas].astype(object).where(df[columnas].notna(), None).itertuples(index=False, name=None)
+
+    def _insertar_inventario(self, conn, df):
+        conn.executemany('INSERT INTO inventario (ID, Producto, Stock_Actual, Precio, "Categoría") VALUES (?, ?, ?, ?, ?)',
+                         self._filas(df, COLUMNAS_INVENTARIO))
+
+    def _insertar_pedidos(self, conn, df):
+        if pd.api.types.is_datetime64_any_dtype(df['Fecha']):
+            df = df.assign(Fecha=df['Fecha'].dt.strftime(FORMATO_FECHA))  # Texto ordenable, como en el CSV
+        filas = self._filas(df, COLUMNAS_PEDIDOS)
+        conn.executemany(
+            "INSERT INTO pedidos (ID_Pedido, Fecha, Producto, Cantidad, Monto_Neto, Monto_Total, Vendedor, Factura_Ruta) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", filas)
+
+    def cargar_inventario(self):
+        return tipar_inventario(self._leer("SELECT * FROM inventario ORDER BY rowid"))
+
+    def cargar_pedidos(self):
+        return tipar_pedidos(self._leer("SELECT * FROM pedidos ORDER BY Fecha, rowid"))
+
+    def obtener_producto(self, id_producto):
+        df = self._leer("SELECT * FROM inventario WHERE ID = ?", (id_producto,))
+        return df.iloc[0].to_dict() if not df.empty else None
+
+    @staticmethod
+    def _condiciones(desde, hasta, vendedor, producto):
+        condiciones, parametros = [], []
+        for columna, operador, valor in (('Fecha', '>=', desde), ('Fecha', '<=', hasta),
+                                         ('Vendedor', '=', vendedor), ('Producto', '=', producto)):
+            if valor is not None:
+                condiciones.append(f"{columna} {operador} ?")
+                parametros.append(valor)
+        return (f"WHERE {' AND '.join(condiciones)}" if condiciones else ""), parametros
+
+    def consultar_pedidos(self, desde=None, hasta=None, vendedor=None, producto=None, limite=None):
+        where, parametros = self._condiciones(desde, hasta, vendedor, producto)
+        if limite is None:
+            return tipar_pedidos(self._leer(f"SELECT * FROM pedidos {where} ORDER BY Fecha, rowid", parametros))
+        # Las más recientes, devueltas en orden cronológico
+        df = self._leer(f"SELECT * FROM pedidos {where} ORDER BY Fecha DESC, rowid DESC LIMIT ?", parametros + [int(limite)])
+        return tipar_pedidos(df.iloc[::-1].reset_index(drop=True))
+
+    def iterar_pedidos(self, desde=None, hasta=None, vendedor=None, producto=None, tamano_bloque=TAMANO_BLOQUE):
+        where, parametros = self._condiciones(desde, hasta, vendedor, producto)
+        # Conexión propia: el generador puede consumirse desde otro hilo
+        conn = sqlite3.connect(self.ruta, timeout=30)
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(COLUMNAS_PEDIDOS)} FROM pedidos {where} ORDER BY Fecha, rowid", parametros)
+            while True:
+                filas = cursor.fetchmany(tamano_bloque)
+                if not filas:
+                    break
+                yield tipar_pedidos(pd.DataFrame(filas, columns=COLUMNAS_PEDIDOS))
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _descontar(conn, movimientos):
+        # El UPDATE condicional es un check-and-decrement atómico también entre procesos.
+        for id_producto, delta in movimientos.items():
+            cursor = conn.execute("UPDATE inventario SET Stock_Actual = Stock_Actual + ? WHERE ID = ? AND Stock_Actual + ? >= 0",
+                                  (int(delta), id_producto, int(delta)))
+            if cursor.rowcount == 0:
+                fila = conn.execute("SELECT Stock_Actual FROM inventario WHERE ID = ?", (id_producto,)).fetchone()
+                raise StockInsuficiente(id_producto, -int(delta), fila[0] if fila else 0)
+
+    def registrar_venta(self, lineas_pedido, movimientos, referencia):
+        # El bloque "with" confirma inventario y pedidos juntos o revierte ambos.
+        with self._conexion() as conn:
+            self._descontar(conn, movimientos)
+            self._insertar_pedidos(conn, lineas_pedido)
+
+    def registrar_lote(self, lineas_pedido, df_movimientos):
+        # Un UPDATE por producto con el delta acumulado del lote, en la misma transacción
+        with self._conexion() as conn:
+            self._descontar(conn, df_movimientos.groupby('ID', sort=True)['Delta'].sum().to_dict())
+            self._insertar_pedidos(conn, lineas_pedido)
+
+    def agregar_producto(self, item):
+        with self._conexion() as conn:
+            self._insertar_inventario(conn, item)
+
+    def pedidos_existentes(self, ids_pedido):
+        # Stock y pedidos se confirman en la misma transacción: basta mirar el libro
+        ids, existentes = list(dict.fromkeys(ids_pedido)), set()
+        for inicio in range(0, len(ids), 500):
+            parte = ids[inicio:inicio + 500]
+            consulta = f"SELECT ID_Pedido FROM pedidos WHERE ID_Pedido IN ({', '.join('?' * len(parte))})"
+            existentes.update(fila[0] for fila in self._conexion().execute(consulta, parte))
+        return existentes
+
+    def sincronizar(self):
+        # Con synchronous=NORMAL el WAL de SQLite se sincroniza en el checkpoint
+        self._conexion().execute("PRAGMA wal_checkpoint(FULL)")
+
+    def migrar_desde(self, origen):
+        """Importa inventario y pedidos de otro almacén (p. ej. ``AlmacenCSV``).
+
+        Los ``ID_Pedido`` repetidos del historial (ventas en el mismo segundo)
+        reciben un sufijo para respetar la clave primaria.
+        """
+        inventario = origen.cargar_inventario()
+        pedidos = origen.cargar_pedidos()
+        repetidos = pedidos.groupby('ID_Pedido').cumcount()
+        if (repetidos > 0).any():
+            pedidos['ID_Pedido'] = pedidos['ID_Pedido'].where(repetidos == 0, pedidos['ID_Pedido'] + '-dup' + repetidos.astype(str))
+        with self._conexion() as conn:
+            conn.execute("DELETE FROM inventario")
+            conn.execute("DELETE FROM pedidos")
+            self._insertar_inventario(conn, inventario)
+            self._insertar_pedidos(conn, pedidos)
+        return len(inventario), len(pedidos)
+
+
+class HistorialPedidos:
+    """Historial de pedidos en memoria compartido por todas las sesiones.
+
+    Anexar una venta solo guarda el bloque nuevo (costo independiente del
+    tamaño del historial); los bloques se consolidan al leer el DataFrame.
+    El DataFrame devuelto es de solo lectura.
+
+    Para el registro paginado mantiene índices: las fechas (en orden de
+    anexado, que es cronológico) se filtran por búsqueda binaria y vendedor,
+    producto y factura tienen índices invertidos de posiciones.
+    """
+
+    COLUMNAS_INDEXADAS = ('Vendedor', 'Producto', 'Factura_Ruta')
+
+    def __init__(self, df_pedidos):
+        self._lock = threading.Lock()
+        self._base = df_pedidos.reset_index(drop=True)
+        self._bloques = []
+        self._filas = len(df_pedidos)
+        self.version = 0
+        self._indices = None  # columna -> {valor: [arreglos de posiciones]}
+        self._fechas = None   # [arreglos de Fecha], consolidados al consultar
+        self._fechas_ordenadas = True
+
+    def __len__(self):
+        return self._filas
+
+    def anexar(self, lineas_pedido):
+        with self._lock:
+            bloque = lineas_pedido[COLUMNAS_PEDIDOS].reset_index(drop=True)
+            if self._indices is not None:
+                self._indexar(bloque, self._filas)
+            self._bloques.append(bloque)
+            self._filas += len(bloque)
+            self.version += 1
+
+    def _consolidar(self):
+        if self._bloques:
+            self._base = concatenar([self._base, *self._bloques])
+            self._bloques = []
+        return self._base
+
+    def dataframe(self):
+        with self._lock:
+            return self._consolidar()
+
+    # --- ÍNDICES PARA CONSULTAS PAGINADAS ---
+
+    def _indexar(self, df, inicio):
+        for columna in self.COLUMNAS_INDEXADAS:
+            indice = self._indices[columna]
+            for valor, posiciones in df.groupby(columna, sort=False).indices.items():
+                indice.setdefault(valor, []).append(posiciones + inicio)
+        fechas = df['Fecha'].to_numpy()
+        if len(fechas):
+            anterior = self._fechas[-1][-1] if self._fechas and len(self._fechas[-1]) else None
+            if (anterior is not None and fechas[0] < anterior) or (fechas[1:] < fechas[:-1]).any():
+                self._fechas_ordenadas = False
+        self._fechas.append(fechas)
+
+    def _preparar_indices(self):
+        if self._indices is None:
+            self._indices = {columna: {} for columna in self.COLUMNAS_INDEXADAS}
+            self._fechas = []
+            self._indexar(self._consolidar(), 0)
+        if len(self._fechas) > 1:
+            self._fechas = [np.concatenate(self._fechas)]
+
+    def _posiciones(self, columna, valor):
+        trozos = self._indices[columna].get(valor)
+        if not trozos:
+            return np.empty(0, dtype=np.int64)
+        if len(trozos) > 1:
+            trozos[:] = [np.concatenate(trozos)]
+        return trozos[0]
+
+    def valores(self, columna):
+        """Valores distintos de una columna indexada (para los filtros de la interfaz)."""
+        with self._lock:
+            self._preparar_indices()
+            return sorted(self._indices[columna])
+
+    def pagina(self, desde=None, hasta=None, vendedor=None, producto=None, factura_ruta=None,
+               numero_pagina=0, tamano_pagina=50):
+        """Página de pedidos filtrados, de la más reciente a la más antigua.
+
+        Devuelve ``(df_pagina, total_filtrado)``; solo se materializan las
+        filas de la página pedida.
+        """
+        with self._lock:
+            self._preparar_indices()
+            fechas = self._fechas[0] if self._fechas else np.empty(0, dtype='datetime64[ns]')
+            if fechas.dtype.kind == 'M':
+                desde, hasta = (None if v is None else np.datetime64(pd.Timestamp(v), 'ns') for v in (desde, hasta))
+
+            # 1. Rango de fechas: búsqueda binaria sobre el orden cronológico
+            if self._fechas_ordenadas:
+                inicio = 0 if desde is None else int(np.searchsorted(fechas, desde, side='left'))
+                fin = len(fechas) if hasta is None else int(np.searchsorted(fechas, hasta, side='right'))
+                rango = None
+            else:
+                inicio, fin = 0, len(fechas)
+                mascara = np.ones(len(fechas), dtype=bool)
+                if desde is not None:
+                    mascara &= fechas >= desde
+                if hasta is not None:
+                    mascara &= fechas <= hasta
+                rango = np.flatnonzero(mascara)
+
+            # 2. Filtros exactos: intersección de índices invertidos
+            posiciones = rango
+            for columna, valor in (('Vendedor', vendedor), ('Producto', producto), ('Factura_Ruta', factura_ruta)):
+                if valor is None:
+                    continue
+                candidatas = self._posiciones(columna, valor)
+                candidatas = candidatas[np.searchsorted(candidatas, inicio):np.searchsorted(candidatas, fin)]
+                posiciones = candidatas if posiciones is None else np.intersect1d(posiciones, candidatas, assume_unique=True)
+
+            # 3. Página (más recientes primero)
+            primero = numero_pagina * tamano_pagina
+            if posiciones is None:
+                total = fin - inicio
+                ultima = fin - primero
+                seleccion = np.arange(ultima - 1, max(ultima - tamano_pagina, inicio) - 1, -1)
+            else:
+                total = len(posiciones)
+                seleccion = posiciones[::-1][primero:primero + tamano_pagina]
+            return self._consolidar().iloc[seleccion], total
+
+
+def crear_almacen(backend=None):
+    """Crea el almacén configurado en ``ALMACEN_BACKEND`` (``csv`` por defecto)."""
+    backend = (backend or os.environ.get('ALMACEN_BACKEND', 'csv')).lower()
+    if backend == 'sqlite':
+        return AlmacenSQLite(os.environ.get('ALMACEN_SQLITE', SQLITE_FILE))
+    if backend == 'csv':
+        return AlmacenCSV()
+    raise ValueError(f"Backend de almacenamiento desconocido: {backend}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Herramientas del almacén de ventas e inventario.")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    migrar = subcomandos.add_parser('migrar', help="Importa inventario.csv y pedidos.csv a SQLite.")
+    migrar.add_argument('--db', default=SQLITE_FILE)
+    migrar.add_argument('--inventario', default=INVENTARIO_FILE)
+    migrar.add_argument('--pedidos', default=PEDIDOS_FILE)
+    migrar.add_argument('--movimientos', default=MOVIMIENTOS_FILE)
+    instantanea = subcomandos.add_parser('instantanea', help="Regenera las instantáneas Arrow de los CSV.")
+    instantanea.add_argument('--inventario', default=INVENTARIO_FILE)
+    instantanea.add_argument('--pedidos', default=PEDIDOS_FILE)
+    instantanea.add_argument('--movimientos', default=MOVIMIENTOS_FILE)
+    args = parser.parse_args(argv)
+
+    if args.comando == 'migrar':
+        origen = AlmacenCSV(args.inventario, args.pedidos, args.movimientos)
+        n_inventario, n_pedidos = AlmacenSQLite(args.db).migrar_desde(origen)
+        print(f"Migrados {n_inventario} productos y {n_pedidos} líneas de pedido a {args.db}.")
+    elif args.comando == 'instantanea':
+        if pa is None:
+            parser.error("Las instantáneas requieren pyarrow.")
+        AlmacenCSV(args.inventario, args.pedidos, args.movimientos).regenerar_instantaneas()
+        print(f"Instantáneas escritas: {ruta_instantanea(args.inventario)}, {ruta_instantanea(args.pedidos)}.")
+
+
+if __name__ == '__main__':
+    main()
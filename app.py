@@ -2,321 +2,281 @@ import streamlit as st
 import pandas as pd
 import os
 from datetime import datetime
-import matplotlib.pyplot as plt
-import numpy as np
-import base64 
-
-# Librerías de la IA y Gestión Documental
-from fpdf import FPDF
-from google import genai
-from google.genai.errors import APIError
+import functools
+import html
+import itertools
+from collections import deque
+import pathlib
+import uuid
+
+# matplotlib (gráficas), fpdf (facturas) y google-genai (IA) se importan al
+# usar cada función por primera vez: abrir la caja no espera por ellos.
+
+# Persistencia (backend CSV o SQLite según ALMACEN_BACKEND)
+from almacenamiento import crear_almacen, HistorialPedidos, StockInsuficiente
+from inventario_compartido import InventarioCompartido, ConflictoVersion, RESERVA_TTL
+from motor_ventas import MotorVentas
+from bitacora_ventas import BitacoraVentas, recuperar
+from bus_eventos import crear_bus, tema_area, TEMA_VENTAS, TEMA_INVENTARIO, PREFIJO_AREA
+from numeracion import Numerador
+from archivo_facturas import Archivo
+from kpis import AgregadosKPI
+from prediccion import VelocidadVentas, DIAS_ALERTA
+from busqueda import IndiceProductos
+from marketing_ia import ServicioMarketing, ClienteLocal, PLANTILLA_PROMPT, prompt_producto
+from graficas import (CacheGraficas, grafica_tendencia, grafica_vendedores, grafica_stock_valorizado,
+                      grafica_stock_actual)
+from diagnostico import Diagnostico, DIAGNOSTICO_LOG
+from reportes import exportar_reporte, FORMATOS_REPORTE, REPORTE_VENTAS, REPORTE_INVENTARIO
+from facturacion import (ServicioFacturas, CacheFacturas, ruta_de_factura, calcular_montos, agrupar_facturas,
+                         exportar_facturas_pdf, exportar_facturas_zip, LISTA, ERROR)
 
 # --- CONFIGURACIÓN GLOBAL Y ARCHIVOS ---
-INVENTARIO_FILE = 'inventario.csv'
-PEDIDOS_FILE = 'pedidos.csv'
-STOCK_ALERTA = 50 
-TASA_ITBMS = 0.07 
-UMBRAL_DESCUENTO = 1000 
-DEFAULT_COLOR = '#34495e' 
-DARK_BACKGROUND = '#2c3e50' 
-DARK_TEXT = '#ecf0f1' 
+from configuracion import STOCK_ALERTA, TASA_ITBMS, TASA_DESCUENTO, DEFAULT_COLOR, DARK_BACKGROUND, DARK_TEXT
+EXPORTACIONES_DIR = 'exportaciones'
+LIMITE_PDF_UNICO = 500  # Facturas máximas en un solo PDF; por encima se exporta en ZIP
+LIMITE_FEED = 8  # Mensajes visibles en el feed de la barra lateral
+INTERVALO_FEED = 5  # Segundos entre consultas del bus de eventos sin interacción
+TEMAS_SESION = [TEMA_VENTAS, TEMA_INVENTARIO, PREFIJO_AREA]
+
+# --- DIAGNÓSTICO DE RECARGAS (activar con DIAGNOSTICO_ACTIVO=1) ---
+
+@st.cache_resource
+def obtener_diagnostico():
+    """Spans por recarga compartidos por el proceso; DIAGNOSTICO_MEMORIA=1 mide también la memoria."""
+    return Diagnostico(activo=os.environ.get('DIAGNOSTICO_ACTIVO') == '1',
+                       memoria=os.environ.get('DIAGNOSTICO_MEMORIA') == '1',
+                       ruta_log=os.environ.get('DIAGNOSTICO_LOG', DIAGNOSTICO_LOG))
+
+diagnostico = obtener_diagnostico()
+diagnostico.iniciar_rerun(st.session_state.get('id_sesion'))
 
 # --- GESTIÓN DOCUMENTAL (Carga/Guardado) ---
 
-def cargar_datos(filename):
-    """Carga datos desde CSV. Si no existe, crea un DataFrame base."""
-    if os.path.exists(filename):
-        return pd.read_csv(filename)
-    else:
-        if filename == INVENTARIO_FILE:
-            return pd.DataFrame({
-                'ID': ['E101', 'E102', 'E103', 'E104', 'E105'],
-                'Producto': ['Cable THHN 12AWG', 'Toma Corriente Doble', 'Interruptor Sencillo', 'Regulador de Voltaje', 'Fusible 10A'],
-                'Stock_Actual': [1500, 35, 400, 100, 10], 
-                'Precio': [0.75, 3.50, 2.15, 45.00, 0.50], 
-                'Categoría': ['Material', 'Accesorio', 'Accesorio', 'Equipo', 'Componente']
-            })
-        elif filename == PEDIDOS_FILE:
-            return pd.DataFrame(columns=['ID_Pedido', 'Fecha', 'Producto', 'Cantidad', 'Monto_Neto', 'Monto_Total', 'Vendedor', 'Factura_Ruta'])
-    return pd.DataFrame()
-
-def guardar_datos(df, filename):
-    """Guarda el DataFrame en un archivo CSV."""
-    df.to_csv(filename, index=False)
-
-# Inicializar o cargar DataFrames en la sesión de Streamlit
-if 'df_inventario' not in st.session_state:
-    st.session_state.df_inventario = cargar_datos(INVENTARIO_FILE)
-    st.session_state.df_pedidos = cargar_datos(PEDIDOS_FILE)
-    st.session_state.feed_mensajes = [("🔒 [CIBERSEGURIDAD] Sistema iniciado. MFA activo.", 'blue')]
+@st.cache_resource
+def obtener_almacen():
+    """Almacén compartido por todas las sesiones del servidor."""
+    return crear_almacen()
+
+@st.cache_resource
+def obtener_recuperacion():
+    """Aplica las ventas que la bitácora registró y un corte dejó sin aplicar; devuelve ``(lineas, resumen)``."""
+    return recuperar(obtener_almacen())
+
+@st.cache_resource
+def obtener_bitacora():
+    """Bitácora de ventas (WAL con group commit) compartida por todas las cajas del proceso."""
+    almacen = obtener_almacen()
+    return BitacoraVentas(sincronizar=almacen.sincronizar)
+
+@st.cache_resource
+def obtener_inventario():
+    """Inventario único del proceso: todas las cajas venden contra el mismo stock."""
+    obtener_recuperacion()  # El stock debe incluir las ventas recuperadas
+    return InventarioCompartido(obtener_almacen().cargar_inventario())
+
+@st.cache_resource
+def obtener_historial():
+    """Historial de pedidos único del proceso (las ventas se anexan por bloques)."""
+    obtener_recuperacion()
+    return HistorialPedidos(obtener_almacen().cargar_pedidos())
+
+@st.cache_resource
+def obtener_kpis():
+    """Agregados del dashboard: se calculan una vez y cada venta o alta los actualiza."""
+    return AgregadosKPI(obtener_historial().dataframe(), obtener_inventario().snapshot())
+
+@st.cache_resource
+def obtener_velocidades():
+    """Velocidad de venta por producto (IA básica predictiva), actualizada con cada venta."""
+    return VelocidadVentas(obtener_inventario().snapshot(), obtener_historial().dataframe())
+
+@st.cache_resource
+def obtener_indice_productos():
+    """Índice de búsqueda del selector de productos del carrito."""
+    return IndiceProductos(obtener_inventario().snapshot())
+
+@st.cache_resource
+def obtener_cache_graficas():
+    """Gráficas del dashboard ya renderizadas, compartidas entre sesiones."""
+    return CacheGraficas()
+
+@st.cache_resource
+def obtener_archivo_facturas():
+    """Segmentos de PDF e índice de facturas; un segmento abierto para todas las sesiones."""
+    return Archivo()
+
+@st.cache_resource
+def obtener_servicio_facturas():
+    """Grupo de hilos que genera los PDF de factura en segundo plano."""
+    archivo = obtener_archivo_facturas()
+    servicio = ServicioFacturas(archivo=archivo)
+    # Ventas recuperadas de la bitácora cuyo PDF no llegó a generarse
+    lineas, _ = obtener_recuperacion()
+    for factura_id, pedido_info, df_carrito in agrupar_facturas([lineas]):
+        if not archivo.existe(factura_id):
+            servicio.encolar(factura_id, pedido_info, df_carrito)
+    return servicio
+
+@st.cache_resource
+def obtener_cache_facturas():
+    """PDF abiertos recientemente, compartidos entre sesiones."""
+    return CacheFacturas(archivo=obtener_archivo_facturas())
+
+@st.cache_resource
+def obtener_numerador():
+    """Números de factura y de pedido, reservados por bloques para todas las sesiones."""
+    return Numerador()
+
+@st.cache_resource
+def obtener_bus():
+    """Bus de eventos del feed y del stock, compartido por todas las sesiones (BUS_EVENTOS=sqlite entre procesos)."""
+    return crear_bus()
+
+@st.cache_resource
+def obtener_motor_ventas():
+    """Lógica de negocio de la caja (sin Streamlit) sobre los servicios compartidos."""
+    return MotorVentas(obtener_almacen(), obtener_inventario(), historial=obtener_historial(), kpis=obtener_kpis(),
+                       velocidades=obtener_velocidades(), indice_productos=obtener_indice_productos(),
+                       facturas=obtener_servicio_facturas(), numerador=obtener_numerador(),
+                       bitacora=obtener_bitacora(), bus=obtener_bus())
+
+with diagnostico.span('recursos'):
+    almacen = obtener_almacen()
+    inventario = obtener_inventario()
+    historial = obtener_historial()
+    kpis = obtener_kpis()
+    velocidades = obtener_velocidades()
+    indice_productos = obtener_indice_productos()
+    cache_graficas = obtener_cache_graficas()
+    archivo_facturas = obtener_archivo_facturas()
+    facturas = obtener_servicio_facturas()
+    cache_facturas = obtener_cache_facturas()
+    bus = obtener_bus()
+    motor = obtener_motor_ventas()
+
+# Inicializar o cargar DataFrames en la sesión de Streamlit.
+# Ya no se reescriben los CSV en cada recarga: solo se persiste cuando hay cambios
+# (ventas y altas de inventario), anexando al libro de pedidos y de movimientos.
+# Inventario e historial no se copian por sesión: son compartidos por el proceso.
+if 'carrito' not in st.session_state:
+    st.session_state.id_sesion = uuid.uuid4().hex
+    # El feed queda acotado; los mensajes nuevos llegan del bus desde cursor_eventos
+    st.session_state.feed_mensajes = deque([("🔒 [CIBERSEGURIDAD] Sistema iniciado. MFA activo.", 'blue')], maxlen=LIMITE_FEED)
+    st.session_state.cursor_eventos = 0  # Desde 0: la sesión nueva ve los avisos recientes
+    _, recuperacion = obtener_recuperacion()
+    if recuperacion['aplicadas'] or recuperacion['rechazadas']:
+        st.session_state.feed_mensajes.append(
+            (f"↺ [VENTAS] Bitácora: {recuperacion['aplicadas']} ventas recuperadas tras un cierre inesperado, "
+             f"{recuperacion['rechazadas']} rechazadas.", 'orange'))
     st.session_state.carrito = [] # NUEVO: Inicializar el carrito de compras
 
-# Guardar automáticamente los datos al finalizar o al recargar
-guardar_datos(st.session_state.df_inventario, INVENTARIO_FILE)
-guardar_datos(st.session_state.df_pedidos, PEDIDOS_FILE)
-
 # --- INICIALIZACIÓN DE LA IA (Gemini - CONFIGURACIÓN SEGURA) ---
-client = None
-api_key_secure = st.secrets.get("GEMINI_API_KEY") 
 
-if api_key_secure:
-    try:
-        client = genai.Client(api_key=api_key_secure)
-    except Exception as e:
-        st.error(f"Error al inicializar la API de Gemini. Verifique la clave en secrets.toml. Error: {e}")
-        client = None
-else:
-    pass 
+@st.cache_resource
+def obtener_cliente_ia(api_key):
+    """Cliente de Gemini, creado una sola vez por proceso al abrir la pestaña de IA.
+
+    Sin clave devuelve ``None``; una clave nueva crea otro cliente. Si falla la
+    creación, la excepción no se guarda en caché y la siguiente recarga vuelve
+    a intentarlo.
+    """
+    if os.environ.get('MARKETING_IA_CLIENTE') == 'local':
+        return ClienteLocal()  # Sin red: para pruebas y demostraciones
+    if not api_key:
+        return None
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+@st.cache_resource
+def obtener_servicio_marketing(api_key):
+    """Caché de respuestas, límite de solicitudes y grupo de hilos de la IA, compartidos por todas las sesiones.
+
+    Va por clave, igual que el cliente: con una clave nueva el servicio usa el cliente nuevo.
+    """
+    return ServicioMarketing(obtener_cliente_ia(api_key))
 
 
 # --- CLASES Y UTILIDADES ---
 
-class PDF(FPDF):
-    """Clase personalizada para el diseño del PDF (Factura)."""
-    def header(self):
-        self.set_font('Arial', 'B', 15)
-        self.cell(0, 10, 'ElectroPanamá Solutions - Factura Electrónica', 0, 1, 'C')
-        self.ln(5)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
-
-def get_binary_file_downloader_html(bin_file, file_label='Descargar Archivo', file_name='factura.pdf'):
-    """Genera un botón de descarga para un archivo binario (PDF) en Streamlit."""
-    with open(bin_file, 'rb') as f:
-        data = f.read()
-    bin_str = base64.b64encode(data).decode()
-    # Estilo del botón de descarga integrado en HTML/CSS
-    href = f'<a href="data:application/octet-stream;base64,{bin_str}" download="{file_name}" style="background-color: #2ecc71; color: white; padding: 0.5em 1em; text-decoration: none; border-radius: 5px; font-size: 14px;">{file_label}</a>'
-    return href
-
-def create_download_link(row):
-    """Genera el HTML para el botón de descarga del PDF."""
-    ruta = row['Factura_Ruta']
-    if os.path.exists(ruta):
-        # Utiliza la función get_binary_file_downloader_html ya definida
-        html_link = get_binary_file_downloader_html(ruta, 
-                                                    file_label='⬇️ Descargar', 
-                                                    file_name=os.path.basename(ruta))
-        return html_link
-    return "N/A"
+def boton_descarga_factura(factura_id, etiqueta='⬇️ Descargar', key=None):
+    """Botón de descarga de un PDF; los bytes se leen del archivo (vía caché) solo al hacer clic."""
+    st.download_button(
+        label=etiqueta,
+        data=functools.partial(cache_facturas.leer, factura_id),
+        file_name=f"{factura_id}.pdf",
+        mime='application/pdf',
+        key=key
+    )
 
 
-# --- LÓGICA DE NEGOCIO Y FLUJO DIGITAL ---
+def etiqueta_producto(id_producto):
+    """Texto del selector del carrito, con el stock vigente."""
+    info = inventario.producto(id_producto)
+    return f"{id_producto} - {info['Producto']} (Stock: {info['Stock_Actual']})" if info else str(id_producto)
 
-def generar_documento_factura(pedido_info, df_carrito):
-    """Crea un archivo .pdf detallado que simula la factura electrónica (Gestión Documental)."""
-    
-    factura_id = f"F{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    ruta_factura = f"facturas/{factura_id}.pdf"
-    
-    if not os.path.exists("facturas"):
-        os.makedirs("facturas")
-    
-    pdf = PDF('P', 'mm', 'Letter')
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    
-    # Colores y fuentes
-    pdf.set_fill_color(52, 73, 94) 
-    pdf.set_text_color(255, 255, 255) 
-    pdf.set_font('Arial', 'B', 12)
-    
-    pdf.cell(0, 8, 'DATOS DE LA TRANSACCIÓN', 1, 1, 'C', 1)
-    
-    pdf.set_text_color(0, 0, 0) 
-    pdf.set_font('Arial', '', 10)
-    pdf.cell(50, 6, 'FACTURA ID:', 0, 0)
-    pdf.cell(0, 6, factura_id, 0, 1)
-    pdf.cell(50, 6, 'FECHA:', 0, 0)
-    pdf.cell(0, 6, pedido_info['Fecha'], 0, 1)
-    pdf.cell(50, 6, 'VENDEDOR:', 0, 0)
-    pdf.cell(0, 6, pedido_info['Vendedor'], 0, 1)
-    pdf.ln(5)
-    
-    # Detalles del Producto (Tabla simple)
-    pdf.set_fill_color(220, 220, 220) 
-    pdf.set_font('Arial', 'B', 10)
-    pdf.cell(100, 7, 'Producto', 1, 0, 'C', 1)
-    pdf.cell(30, 7, 'Cantidad (Uds)', 1, 0, 'C', 1)
-    pdf.cell(35, 7, 'P. Unitario ($)', 1, 0, 'C', 1)
-    pdf.cell(30, 7, 'Subtotal ($)', 1, 1, 'C', 1)
-    
-    pdf.set_font('Arial', '', 10)
-    
-    # ITERACIÓN DE MÚLTIPLES PRODUCTOS DEL CARRITO
-    for index, item in df_carrito.iterrows():
-        pdf.cell(100, 6, item['Producto'], 1, 0)
-        pdf.cell(30, 6, str(item['Cantidad']), 1, 0, 'C')
-        pdf.cell(35, 6, f"{item['Precio_Unitario']:.2f}", 1, 0, 'R')
-        pdf.cell(30, 6, f"{item['Subtotal_Bruto']:.2f}", 1, 1, 'R')
-        
-    pdf.ln(8)
-    
-    # Resumen de Montos
-    ancho_label = 50
-    ancho_valor = 30
-    margen = 135 
-    
-    pdf.set_x(margen)
-    pdf.cell(ancho_label, 6, 'SUBTOTAL BRUTO:', 0, 0, 'L')
-    pdf.cell(ancho_valor, 6, f"${df_carrito['Subtotal_Bruto'].sum():.2f}", 0, 1, 'R')
-
-    if pedido_info['Descuento'] > 0:
-        pdf.set_x(margen)
-        pdf.cell(ancho_label, 6, 'DESCUENTO (10%):', 0, 0, 'L')
-        pdf.set_font('Arial', 'B', 10)
-        pdf.cell(ancho_valor, 6, f"-${pedido_info['Descuento']:.2f}", 0, 1, 'R')
-        pdf.set_font('Arial', '', 10) 
-    
-    pdf.set_x(margen)
-    pdf.cell(ancho_label, 6, 'SUBTOTAL NETO:', 0, 0, 'L')
-    pdf.cell(ancho_valor, 6, f"${pedido_info['Monto_Neto']:.2f}", 0, 1, 'R')
-    
-    pdf.set_x(margen)
-    pdf.cell(ancho_label, 6, f"ITBMS ({TASA_ITBMS*100:.0f}%):", 0, 0, 'L')
-    pdf.cell(ancho_valor, 6, f"${pedido_info['Monto_ITBMS']:.2f}", 0, 1, 'R')
-
-    pdf.set_font('Arial', 'B', 12)
-    pdf.set_x(margen)
-    pdf.set_fill_color(52, 73, 94) 
-    pdf.set_text_color(255, 255, 255) 
-    pdf.cell(ancho_label, 8, 'TOTAL A PAGAR:', 1, 0, 'L', 1)
-    pdf.cell(ancho_valor, 8, f"${pedido_info['Monto_Total']:.2f}", 1, 1, 'R', 1)
-    
-    pdf.output(ruta_factura)
-    return ruta_factura
 
+# --- LÓGICA DE NEGOCIO Y FLUJO DIGITAL ---
 
-def procesar_venta_multiple(df_carrito, vendedor_id, monto_neto, monto_total_final, descuento_valor, monto_itbms):
+@diagnostico.instrumentar()
+def procesar_venta_multiple(df_carrito, vendedor_id):
     """Maneja el Flujo Digital de Venta, Inventario, Automatización y Facturación para múltiples productos."""
-    
-    # 1. Validación de stock 
-    for index, item in df_carrito.iterrows():
-        stock_actual = st.session_state.df_inventario[st.session_state.df_inventario['ID'] == item['ID']]['Stock_Actual'].iloc[0]
-        if item['Cantidad'] > stock_actual:
-            st.error(f"❌ Venta abortada: Stock insuficiente para {item['Producto']}. Por favor, revise el inventario.")
-            return False
-
-    # 2. Facturación y Pago Digital
-    pedido_info_dict = {
-        'Fecha': datetime.now().strftime('%Y-%m-%d %H:%M'),
-        'Vendedor': vendedor_id,
-        'Monto_Neto': monto_neto,
-        'Monto_ITBMS': monto_itbms,
-        'Monto_Total': monto_total_final,
-        'Descuento': descuento_valor
-    }
-    
-    ruta_factura = generar_documento_factura(pedido_info_dict, df_carrito)
+    reservas = [(item['ID'], item['Reserva']) for item in st.session_state.carrito if item.get('Reserva')]
 
-    # 3. Actualizar Inventario y DataFrames de Pedidos
-    
-    for index, item in df_carrito.iterrows():
-        # Actualiza el stock
-        st.session_state.df_inventario.loc[st.session_state.df_inventario['ID'] == item['ID'], 'Stock_Actual'] -= item['Cantidad'] 
-        
-        # Agrega un registro para CADA ítem vendido (para mantener la trazabilidad en df_pedidos)
-        nuevo_pedido = pd.DataFrame([{
-            'ID_Pedido': f"P{datetime.now().strftime('%Y%m%d%H%M%S')}-{index}", # ID único por ítem
-            'Fecha': pedido_info_dict['Fecha'],
-            'Producto': item['Producto'],
-            'Cantidad': item['Cantidad'],
-            'Monto_Neto': item['Subtotal_Bruto'], # Guarda el subtotal bruto del ítem
-            'Monto_Total': item['Subtotal_Bruto'], # Se actualiza en el reporte
-            'Vendedor': vendedor_id,
-            'Factura_Ruta': ruta_factura 
-        }])
-        st.session_state.df_pedidos = pd.concat([st.session_state.df_pedidos, nuevo_pedido], ignore_index=True)
+    # 1-3. Montos, validación y descuento atómico del stock, persistencia y factura en segundo plano
+    try:
+        venta = motor.vender(df_carrito, vendedor_id, reservas=reservas)
+    except (StockInsuficiente, ConflictoVersion) as e:
+        st.error(f"❌ Venta abortada: {e} Por favor, revise el inventario.")
+        return False
+    except Exception as e:
+        st.error(f"❌ Venta abortada: no se pudo registrar en el almacén. Error: {e}")
+        return False
+    factura_id = venta['factura_id']
+    monto_total_final = venta['pedido_info']['Monto_Total']
+    descuento_valor = venta['pedido_info']['Descuento']
 
     # 4. Comunicación y Feedback
     mensaje_desc = f" (Desc.: ${descuento_valor:.2f})" if descuento_valor > 0 else ""
 
-    st.success(f"✅ VENTA MULTIPLE CERRADA por {vendedor_id}: TOTAL FINAL: ${monto_total_final}{mensaje_desc}")
-    st.info(f"Ruta de Factura (Gestión Documental PDF): {ruta_factura}.")
-    
-    st.markdown(get_binary_file_downloader_html(ruta_factura, 
-                                                file_label='⬇️ Descargar Factura Consolidada PDF',
-                                                file_name=os.path.basename(ruta_factura)), 
-                unsafe_allow_html=True)
-    
-    st.session_state.feed_mensajes.append((f"💰 [VENTAS] Pedido (Múltiple) facturado por {vendedor_id}. Total: ${monto_total_final:.2f}{mensaje_desc}", 'blue'))
-    
-    return True
-
-
-# --- FUNCIÓN DE ALERTA PREDICTIVA (IA BÁSICA) ---
-def obtener_alerta_predictiva(df_inventario, df_pedidos):
-    """Calcula una alerta predictiva del stock restante en días, basado en la velocidad de venta promedio."""
-    
-    if df_pedidos.empty:
-        return pd.DataFrame() 
-
-    df_pedidos['Fecha'] = pd.to_datetime(df_pedidos['Fecha'])
-    dias_operacion = (df_pedidos['Fecha'].max() - df_pedidos['Fecha'].min()).days
-    periodo_dias = max(dias_operacion, 7) 
-    
-    df_ventas = df_pedidos.groupby('Producto')['Cantidad'].sum().reset_index()
-    df_ventas['Velocidad_Venta_Dia'] = df_ventas['Cantidad'] / periodo_dias
-    df_ventas = df_ventas.rename(columns={'Cantidad': 'Total_Vendido'})
-    
-    df_analisis = pd.merge(df_inventario, df_ventas, on='Producto', how='left').fillna(0)
-    
-    # Usa 'Stock_Actual', que es el nombre de columna que llega a esta función
-    df_analisis['Dias_Restantes'] = np.where(
-        df_analisis['Velocidad_Venta_Dia'] > 0.01,
-        df_analisis['Stock_Actual'] / df_analisis['Velocidad_Venta_Dia'], 
-        999 
-    )
+    st.session_state.ultima_venta = {
+        'factura_id': factura_id,
+        'mensaje': f"✅ VENTA MULTIPLE CERRADA por {vendedor_id}: TOTAL FINAL: ${monto_total_final}{mensaje_desc}"
+    }
+    if venta['pendiente']:
+        # El stock ya se descontó y la bitácora guarda la venta: cobrar de nuevo la duplicaría
+        st.session_state.ultima_venta['aviso'] = (
+            f"⚠️ La venta {factura_id} quedó registrada, pero su pedido no llegó al almacén: "
+            f"se completará automáticamente al reiniciar la aplicación. No la vuelva a cobrar.")
+    return factura_id
 
-    df_alerta_final = df_analisis[df_analisis['Dias_Restantes'] <= 14] 
-    
-    return df_alerta_final.sort_values(by='Dias_Restantes')
 
 # --- FUNCIONES DE DASHBOARD Y REPORTES ---
 
+@diagnostico.instrumentar()
 def generar_graficas():
-    """Genera las 4 gráficas requeridas."""
-    df_p = st.session_state.df_pedidos
-    df_i = st.session_state.df_inventario
+    """Genera las 4 gráficas requeridas (PNG cacheados por versión de datos)."""
+    version_ventas = kpis.version
+    version_inventario = inventario.version_global
     
     cols = st.columns(2)
 
     # Gráfica 1: Tendencia de Ventas (KPI Tasa de Conversión)
     with cols[0]:
         st.subheader("📈 Tendencia de Ventas (30 días)")
-        if df_p.shape[0] > 0 and 'Fecha' in df_p.columns:
-            df_p['Fecha_DT'] = pd.to_datetime(df_p['Fecha'])
-            ventas_diarias = df_p.set_index('Fecha_DT')['Monto_Total'].resample('D').sum().fillna(0).tail(30)
-            fig, ax = plt.subplots(figsize=(6, 4))
-            ax.plot(ventas_diarias.index.strftime('%m-%d'), ventas_diarias.values, marker='o', color='#2ecc71')
-            ax.set_title("Ventas por Día", fontsize=10, color=DARK_TEXT)
-            ax.set_ylabel("Monto ($)", color=DARK_TEXT)
-            ax.tick_params(axis='x', rotation=45, colors=DARK_TEXT)
-            ax.tick_params(axis='y', colors=DARK_TEXT)
-            ax.set_facecolor(DARK_BACKGROUND)
-            fig.set_facecolor(DARK_BACKGROUND)
-            st.pyplot(fig)
+        png = cache_graficas.obtener('tendencia', version_ventas, lambda: grafica_tendencia(kpis.ventas_por_dia(30)))
+        if png:
+            st.image(png)
         else:
             st.warning("No hay datos de ventas para Tendencia.")
 
     # Gráfica 2: Ventas por Vendedor (KPI)
     with cols[1]:
         st.subheader("👥 Ventas por Vendedor")
-        if df_p.shape[0] > 0:
-            # Aquí sumamos Monto_Total aunque no sea el valor final exacto, para KPI rápido
-            ventas_vendedor = df_p.groupby('Vendedor')['Monto_Total'].sum().sort_values(ascending=False) 
-            fig, ax = plt.subplots(figsize=(6, 4))
-            ventas_vendedor.plot(kind='bar', ax=ax, color='#3498db')
-            ax.set_title("Total Vendido por Empleado", fontsize=10, color=DARK_TEXT)
-            ax.set_ylabel("Monto Total ($)", color=DARK_TEXT)
-            ax.tick_params(axis='x', rotation=0, colors=DARK_TEXT)
-            ax.tick_params(axis='y', colors=DARK_TEXT)
-            ax.set_facecolor(DARK_BACKGROUND)
-            fig.set_facecolor(DARK_BACKGROUND)
-            st.pyplot(fig)
+        # Aquí sumamos Monto_Total aunque no sea el valor final exacto, para KPI rápido
+        png = cache_graficas.obtener('vendedores', version_ventas, lambda: grafica_vendedores(kpis.ventas_por_vendedor()))
+        if png:
+            st.image(png)
         else:
             st.warning("No hay datos de ventas por vendedor.")
 
@@ -325,88 +285,86 @@ def generar_graficas():
     # Gráfica 3: Stock Valorizado (KPI Inventario)
     with cols2[0]:
         st.subheader("💰 Stock Valorizado (Top 5)")
-        df_i['Valor_Total'] = df_i['Stock_Actual'] * df_i['Precio'] 
-        top_valor = df_i.nlargest(5, 'Valor_Total')
-        if not top_valor.empty:
-            fig, ax = plt.subplots(figsize=(6, 4))
-            ax.pie(top_valor['Valor_Total'], labels=top_valor['ID'] + ' (' + top_valor['Producto'].str[:15] + '...)', autopct='%1.1f%%', startangle=90, colors=plt.cm.Set3.colors, textprops={'color': DARK_TEXT})
-            ax.set_title("Distribución del Valor del Inventario", fontsize=10, color=DARK_TEXT)
-            fig.set_facecolor(DARK_BACKGROUND)
-            st.pyplot(fig)
+        png = cache_graficas.obtener('stock_valorizado', version_inventario, lambda: grafica_stock_valorizado(inventario.snapshot()))
+        if png:
+            st.image(png)
         else:
             st.warning("No hay datos de stock valorizado.")
 
     # Gráfica 4: Stock Actual (KPI Rotación)
     with cols2[1]:
         st.subheader("📦 Stock Actual (Unidades)")
-        top_stock = df_i.nlargest(5, 'Stock_Actual') 
-        if not top_stock.empty:
-            fig, ax = plt.subplots(figsize=(6, 4))
-            colors = ['#e74c3c' if s <= STOCK_ALERTA else '#2ecc71' for s in top_stock['Stock_Actual']]
-            ax.bar(top_stock['ID'] + ' - ' + top_stock['Producto'].str[:10] + '...', top_stock['Stock_Actual'], color=colors)
-            ax.set_title("Top 5 Items con Mayor Stock", fontsize=10, color=DARK_TEXT)
-            ax.set_ylabel("Unidades", color=DARK_TEXT)
-            ax.tick_params(axis='x', rotation=45, labelsize=8, colors=DARK_TEXT)
-            ax.tick_params(axis='y', colors=DARK_TEXT)
-            ax.set_facecolor(DARK_BACKGROUND)
-            fig.set_facecolor(DARK_BACKGROUND)
-            st.pyplot(fig)
+        png = cache_graficas.obtener('stock_actual', version_inventario, lambda: grafica_stock_actual(inventario.snapshot()))
+        if png:
+            st.image(png)
         else:
             st.warning("No hay datos de stock.")
     # ...
 
+@diagnostico.instrumentar()
 def agregar_item_inventario(nuevo_id, nuevo_prod, nuevo_stock, nuevo_precio, nueva_cat):
     """Función para agregar un nuevo ítem al inventario."""
-    if nuevo_id in st.session_state.df_inventario['ID'].values:
-        st.error("❌ Error: ID de producto ya existente.")
-        return
-        
     try:
-        nuevo_stock = int(nuevo_stock)
-        nuevo_precio = float(nuevo_precio)
-    except ValueError:
-        st.error("❌ Error: Stock y Precio deben ser valores numéricos válidos.")
+        motor.agregar_producto(nuevo_id, nuevo_prod, nuevo_stock, nuevo_precio, nueva_cat)
+    except ValueError as e:
+        st.error(f"❌ Error: {e}")
         return
-
-    nuevo_item = pd.DataFrame([{
-        'ID': nuevo_id,
-        'Producto': nuevo_prod,
-        'Stock_Actual': nuevo_stock,
-        'Precio': nuevo_precio,
-        'Categoría': nueva_cat
-    }])
-    st.session_state.df_inventario = pd.concat([st.session_state.df_inventario, nuevo_item], ignore_index=True)
     st.success(f"✅ Ítem **{nuevo_id}** agregado al inventario.")
 
 def enviar_notificacion(area, mensaje):
-    """Simula el envío de una notificación a un área específica."""
-    if 'feed_mensajes' not in st.session_state:
-        st.session_state.feed_mensajes = []
-    
-    color = 'orange'
-    st.session_state.feed_mensajes.append((f"🔔 [{area.upper()}] {mensaje}", color))
+    """Publica una notificación para un área; la ven todas las sesiones en su feed."""
+    bus.publicar(tema_area(area), mensaje=mensaje, sesion=st.session_state.get('id_sesion'))
     st.info(f"Mensaje enviado a '{area}'.")
 
-def generar_reporte_imprimible(tipo_reporte):
-    """Genera un reporte imprimible (CSV/TXT) para descarga."""
-    if tipo_reporte == 'INVENTARIO':
-        reporte_data = st.session_state.df_inventario.copy()
-        titulo = "REPORTE_INVENTARIO_STOCK"
-    elif tipo_reporte == 'VENTAS':
-        reporte_data = st.session_state.df_pedidos.copy()
-        titulo = "REPORTE_VENTAS_DETALLE"
+def mensaje_de_evento(evento):
+    """Texto y color del feed para un evento de venta o de área."""
+    datos = evento['datos']
+    if evento['tema'] == TEMA_VENTAS:
+        if 'factura_id' in datos:
+            mensaje_desc = f" (Desc.: ${datos['descuento']:.2f})" if datos['descuento'] > 0 else ""
+            return (f"💰 [VENTAS] Pedido {datos['factura_id']} facturado por {datos['vendedor']}. "
+                    f"Total: ${datos['total']:.2f}{mensaje_desc}", 'blue')
+        return f"💰 [VENTAS] Lote POS: {datos['ventas']} ventas ({datos['lineas']} líneas) por ${datos['total']:.2f}.", 'blue'
+    return f"🔔 [{evento['tema'][len(PREFIJO_AREA):]}] {datos['mensaje']}", 'orange'
+
+def actualizar_desde_bus():
+    """Aplica a la sesión los eventos publicados desde su última lectura.
+
+    Los de venta y de áreas pasan al feed; los de inventario actualizan el
+    conjunto de productos en stock crítico releyendo solo esos productos. Si
+    el bus ya descartó eventos no vistos (o es la primera lectura) el
+    conjunto se recalcula con el inventario completo.
+    """
+    eventos, cursor, incompleta = bus.leer(TEMAS_SESION, desde=st.session_state.cursor_eventos)
+    st.session_state.cursor_eventos = cursor
+    cambiados = set()
+    for evento in eventos:
+        if evento['tema'] == TEMA_INVENTARIO:
+            cambiados.update(evento['datos']['ids'])
+        else:
+            st.session_state.feed_mensajes.append(mensaje_de_evento(evento))
+    if incompleta or 'stock_critico' not in st.session_state:
+        df_inventario_actual = inventario.snapshot()
+        st.session_state.stock_critico = set(df_inventario_actual.loc[df_inventario_actual['Stock_Actual'] <= STOCK_ALERTA, 'ID'])
+    elif cambiados:
+        ids = list(cambiados)
+        criticos = {i for i, stock in zip(ids, inventario.existencias(ids)) if 0 <= stock <= STOCK_ALERTA}
+        st.session_state.stock_critico = (st.session_state.stock_critico - cambiados) | criticos
+
+@diagnostico.instrumentar()
+def generar_reporte_imprimible(tipo_reporte, formato, desde=None, hasta=None, vendedor=None, categoria=None):
+    """Escribe el reporte por bloques en EXPORTACIONES_DIR; la descarga lo lee solo al hacer clic."""
+    titulo = "REPORTE_INVENTARIO_STOCK" if tipo_reporte == REPORTE_INVENTARIO else "REPORTE_VENTAS_DETALLE"
+    os.makedirs(EXPORTACIONES_DIR, exist_ok=True)
+    destino = os.path.join(EXPORTACIONES_DIR, f"{titulo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    ruta, filas = exportar_reporte(tipo_reporte, almacen, inventario.snapshot(), destino, formato,
+                                   desde=desde, hasta=hasta, vendedor=vendedor, categoria=categoria)
+    if ruta is None:
+        st.info(f"El reporte de {tipo_reporte} no tiene filas con esos filtros.")
+        st.session_state.pop('reporte_imprimible', None)
     else:
-        return
-
-    csv = reporte_data.to_csv(index=False).encode('utf-8')
-    st.download_button(
-        label=f"Descargar {tipo_reporte} (CSV)",
-        data=csv,
-        file_name=f"{titulo}_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-        mime='text/csv',
-        key=f'download_btn_{tipo_reporte}'
-    )
-    st.success(f"Reporte de {tipo_reporte} listo para descarga.")
+        st.session_state.reporte_imprimible = (ruta, filas, tipo_reporte, formato)
+        st.success(f"Reporte de {tipo_reporte} listo para descarga ({filas} filas).")
 
 # --- INTERFAZ STREAMLIT (FLUIDA Y MODERNA) ---
 
@@ -432,13 +390,15 @@ p, label {{ color: {DARK_TEXT}; }}
 
 
 # --- BARRA LATERAL (KPI y Comunicación) ---
-with st.sidebar:
-    st.markdown("<h1 style='text-align: center; color: white;'>⚙️ GESTIÓN PYME</h1>", unsafe_allow_html=True)
-    st.markdown("---")
+COLORES_FEED = {'blue': '#3498db', 'green': '#2ecc71', 'orange': '#f39c12'}
+
+@st.fragment(run_every=INTERVALO_FEED)
+def panel_en_vivo():
+    """Alerta de stock y feed; se vuelve a dibujar solo, con lo nuevo del bus, cada INTERVALO_FEED segundos."""
+    actualizar_desde_bus()
 
     # KPI 1: Alerta de Inventario (KPI)
-    stock_alerta_count = st.session_state.df_inventario[st.session_state.df_inventario['Stock_Actual'] <= STOCK_ALERTA].shape[0]
-    
+    stock_alerta_count = len(st.session_state.stock_critico)
     if stock_alerta_count > 0:
         st.error(f"🚨 {stock_alerta_count} ÍTEMS EN STOCK CRÍTICO")
     else:
@@ -449,16 +409,17 @@ with st.sidebar:
     
     # --- FEED DE COMUNICACIÓN ---
     st.markdown("### 💬 Feed de Comunicación")
-    if 'feed_mensajes' in st.session_state:
-        for mensaje, color in reversed(st.session_state.feed_mensajes[-8:]): 
-            if color == 'blue':
-                st.markdown(f'<p style="color:#3498db; font-size: 14px;">{mensaje}</p>', unsafe_allow_html=True)
-            elif color == 'green':
-                st.markdown(f'<p style="color:#2ecc71; font-size: 14px;">{mensaje}</p>', unsafe_allow_html=True)
-            elif color == 'orange':
-                st.markdown(f'<p style="color:#f39c12; font-size: 14px;">{mensaje}</p>', unsafe_allow_html=True)
-            else:
-                st.markdown(f'<p style="color:white; font-size: 14px;">{mensaje}</p>', unsafe_allow_html=True)
+    for mensaje, color in reversed(st.session_state.feed_mensajes):
+        # Los mensajes traen texto de otras sesiones y procesos: se escapan y en una sola
+        # línea, para que no cierren el bloque HTML ni inyecten etiquetas o Markdown
+        texto = html.escape(' '.join(str(mensaje).split()))
+        st.markdown(f'<p style="color:{COLORES_FEED.get(color, "white")}; font-size: 14px;">{texto}</p>', unsafe_allow_html=True)
+
+with st.sidebar, diagnostico.span('barra_lateral'):
+    st.markdown("<h1 style='text-align: center; color: white;'>⚙️ GESTIÓN PYME</h1>", unsafe_allow_html=True)
+    st.markdown("---")
+
+    panel_en_vivo()
     
     # Botón de Alerta de Tiempos
     if st.button("Simular Alerta Tiempos Muertos (Flujo)", key='btn_alerta_tiempos', type="primary"):
@@ -466,290 +427,546 @@ with st.sidebar:
         st.rerun() 
 
 # --- PESTAÑAS PRINCIPALES ---
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["💵 Venta y Facturación", "📦 Gestión de Inventario", "📈 Dashboard de KPIs", "📑 Reportes y SC", "⭐ **IA: Generación**"])
+nombres_pestanas = ["💵 Venta y Facturación", "📦 Gestión de Inventario", "📈 Dashboard de KPIs", "📑 Reportes y SC", "⭐ **IA: Generación**"]
+if diagnostico.activo:
+    nombres_pestanas.append("🩺 Diagnóstico")  # Solo para administración
+# Navegación perezosa: solo se ejecuta el cuerpo de la pestaña activa; cambiar de
+# pestaña provoca una recarga y las demás vistas no calculan nada
+tab1, tab2, tab3, tab4, tab5, *tab_diagnostico = st.tabs(nombres_pestanas, key='vista', on_change='rerun')
 
 # --- TAB 1: VENTA Y FACTURACIÓN (Flujo Digital) ---
-with tab1:
-    st.header("Flujo Digital: Carrito de Compras y Facturación")
-    
-    # 1. ENTRADA DEL CARRITO
-    st.subheader("🛒 Agregar Productos al Carrito")
-    col_id, col_cant = st.columns([3, 1])
-
-    productos_disponibles = st.session_state.df_inventario.copy()
-    productos_disponibles['Display'] = productos_disponibles['ID'] + ' - ' + productos_disponibles['Producto'] + ' (Stock: ' + productos_disponibles['Stock_Actual'].astype(str) + ')'
-    
-    with col_id:
-        producto_seleccionado = st.selectbox("Producto (ID - Nombre)", productos_disponibles['Display'], key='select_prod')
+with tab1, diagnostico.span('pestana_venta'):
+    if tab1.open:
+        st.header("Flujo Digital: Carrito de Compras y Facturación")
+    
+        # 1. ENTRADA DEL CARRITO
+        st.subheader("🛒 Agregar Productos al Carrito")
+        col_id, col_cant = st.columns([3, 1])
+
+        # El selector solo recibe los mejores resultados del índice, no el catálogo completo
+        with col_id:
+            termino_busqueda = st.text_input("Buscar producto (ID, nombre o categoría)", key='busqueda_prod',
+                                             placeholder="Ej.: E101, cable, accesorio")
+            id_producto = st.selectbox("Producto (ID - Nombre)", indice_productos.buscar(termino_busqueda),
+                                       format_func=etiqueta_producto, key='select_prod')
         
-    with col_cant:
-        cantidad = st.number_input("Cantidad", min_value=1, step=1, value=1, key='input_cant')
-    
-    id_producto = producto_seleccionado.split(' - ')[0] if producto_seleccionado else None
+        with col_cant:
+            cantidad = st.number_input("Cantidad", min_value=1, step=1, value=1, key='input_cant')
     
-    if st.button("➕ Añadir al Carrito", key='btn_add_to_cart', type="secondary"):
+        if st.button("➕ Añadir al Carrito", key='btn_add_to_cart', type="secondary"):
         
-        producto_info = st.session_state.df_inventario[st.session_state.df_inventario['ID'] == id_producto]
+            producto_info = inventario.producto(id_producto) if id_producto else None
         
-        if producto_info.empty:
-            st.error("❌ ID de producto no válido.")
-        else:
-            stock_actual = producto_info['Stock_Actual'].iloc[0]
-            if cantidad > stock_actual:
-                st.warning(f"⚠️ Stock Insuficiente. Solo hay {stock_actual} uds.")
+            if producto_info is None:
+                st.error("❌ ID de producto no válido.")
             else:
-                # Agregar ítem al carrito
-                item_carrito = {
-                    'ID': id_producto,
-                    'Producto': producto_info['Producto'].iloc[0],
-                    'Cantidad': cantidad,
-                    'Precio_Unitario': producto_info['Precio'].iloc[0],
-                    'Subtotal_Bruto': cantidad * producto_info['Precio'].iloc[0]
-                }
-                st.session_state.carrito.append(item_carrito)
-                st.success(f"✅ Añadido: {cantidad} x {item_carrito['Producto']} al carrito.")
-                st.rerun() 
-    
-    st.markdown("---")
-    
-    # 2. VISUALIZACIÓN Y FACTURACIÓN DEL CARRITO
-    st.subheader("🛍️ Carrito Actual")
-
-    if st.session_state.carrito:
-        df_carrito = pd.DataFrame(st.session_state.carrito)
+                try:
+                    # Reserva temporal: las demás cajas no pueden vender estas unidades mientras dure
+                    reserva_id = inventario.reservar(id_producto, cantidad, st.session_state.id_sesion)
+                except StockInsuficiente as e:
+                    st.warning(f"⚠️ Stock Insuficiente. Solo hay {e.disponible} uds. disponibles (sin reservar).")
+                else:
+                    # Agregar ítem al carrito
+                    item_carrito = {
+                        'ID': id_producto,
+                        'Producto': producto_info['Producto'],
+                        'Cantidad': cantidad,
+                        'Precio_Unitario': producto_info['Precio'],
+                        'Subtotal_Bruto': cantidad * producto_info['Precio'],
+                        'Reserva': reserva_id
+                    }
+                    st.session_state.carrito.append(item_carrito)
+                    st.success(f"✅ Añadido: {cantidad} x {item_carrito['Producto']} al carrito.")
+                    st.rerun() 
+    
+        st.markdown("---")
+    
+        # 2. VISUALIZACIÓN Y FACTURACIÓN DEL CARRITO
+        st.subheader("🛍️ Carrito Actual")
+
+        if st.session_state.carrito:
+            df_carrito = pd.DataFrame(st.session_state.carrito)
         
-        # Calcular totales
-        monto_subtotal = df_carrito['Subtotal_Bruto'].sum()
+            # Calcular totales
+            monto_subtotal = df_carrito['Subtotal_Bruto'].sum()
         
-        # Lógica de descuento
-        descuento = 0
-        mensaje_desc = " "
-        if monto_subtotal >= UMBRAL_DESCUENTO:
-            descuento = round(monto_subtotal * 0.10, 2)
-            mensaje_desc = "(10% de descuento aplicado)"
-
-        monto_neto = monto_subtotal - descuento
-        monto_itbms = round(monto_neto * TASA_ITBMS, 2)
-        monto_total_final = round(monto_neto + monto_itbms, 2)
-
-        # Mostrar Carrito y Resumen
-        st.dataframe(df_carrito[['Producto', 'Cantidad', 'Precio_Unitario', 'Subtotal_Bruto']].rename(columns={'Subtotal_Bruto': 'Subtotal'}), hide_index=True, use_container_width=True)
+            # Lógica de descuento e ITBMS (la misma que se usa al reimprimir facturas)
+            montos = calcular_montos(monto_subtotal)
+            descuento = montos['Descuento']
+            mensaje_desc = f"({TASA_DESCUENTO*100:.0f}% de descuento aplicado)" if descuento > 0 else " "
+
+            monto_neto = montos['Monto_Neto']
+            monto_itbms = montos['Monto_ITBMS']
+            monto_total_final = montos['Monto_Total']
+
+            # Mostrar Carrito y Resumen
+            st.dataframe(df_carrito[['Producto', 'Cantidad', 'Precio_Unitario', 'Subtotal_Bruto']].rename(columns={'Subtotal_Bruto': 'Subtotal'}), hide_index=True, use_container_width=True)
+            st.caption(f"Las unidades del carrito quedan reservadas durante {RESERVA_TTL // 60} minutos.")
         
-        col_resumen, col_factura = st.columns([1, 1])
-        with col_resumen:
-            st.markdown(f"""
-                <div style="padding: 10px; border: 1px solid #34495e; border-radius: 5px;">
-                <p>Subtotal Bruto: <b>${monto_subtotal:,.2f}</b></p>
-                <p style="color:#e74c3c;">Descuento {mensaje_desc}: <b>-${descuento:,.2f}</b></p>
-                <p>Subtotal Neto: <b>${monto_neto:,.2f}</b></p>
-                <p>ITBMS ({TASA_ITBMS*100:.0f}%): <b>+${monto_itbms:,.2f}</b></p>
-                <h3 style="color:#2ecc71;">TOTAL FINAL: ${monto_total_final:,.2f}</h3>
-                </div>
-            """, unsafe_allow_html=True)
+            col_resumen, col_factura = st.columns([1, 1])
+            with col_resumen:
+                st.markdown(f"""
+                    <div style="padding: 10px; border: 1px solid #34495e; border-radius: 5px;">
+                    <p>Subtotal Bruto: <b>${monto_subtotal:,.2f}</b></p>
+                    <p style="color:#e74c3c;">Descuento {mensaje_desc}: <b>-${descuento:,.2f}</b></p>
+                    <p>Subtotal Neto: <b>${monto_neto:,.2f}</b></p>
+                    <p>ITBMS ({TASA_ITBMS*100:.0f}%): <b>+${monto_itbms:,.2f}</b></p>
+                    <h3 style="color:#2ecc71;">TOTAL FINAL: ${monto_total_final:,.2f}</h3>
+                    </div>
+                """, unsafe_allow_html=True)
         
-        with col_factura:
-            vendedor_id_factura = st.text_input("Vendedor (ID)", value="V01", key='factura_vendedor')
-            if st.button("PASO FINAL: FACTURAR Y COBRAR", key='btn_facturar_multi', type="primary"):
-                procesar_venta_multiple(df_carrito, vendedor_id_factura, monto_neto, monto_total_final, descuento, monto_itbms)
-                # Limpiar carrito después de facturar
-                st.session_state.carrito = [] 
-                st.rerun()
+            with col_factura:
+                vendedor_id_factura = st.text_input("Vendedor (ID)", value="V01", key='factura_vendedor')
+                if st.button("PASO FINAL: FACTURAR Y COBRAR", key='btn_facturar_multi', type="primary"):
+                    if procesar_venta_multiple(df_carrito, vendedor_id_factura):
+                        # Limpiar carrito después de facturar
+                        st.session_state.carrito = [] 
+                        st.rerun()
                 
-            if st.button("Vaciar Carrito", key='btn_clear_cart', type="secondary"):
-                st.session_state.carrito = []
-                st.rerun()
+                if st.button("Vaciar Carrito", key='btn_clear_cart', type="secondary"):
+                    inventario.liberar([(item['ID'], item['Reserva']) for item in st.session_state.carrito if item.get('Reserva')])
+                    st.session_state.carrito = []
+                    st.rerun()
                 
-    else:
-        st.info("El carrito de compras está vacío.")
-
-    st.markdown("---")
-    st.subheader("📑 Registro de Pedidos (Gestión Documental)")
-    
-    # Lógica para mostrar la tabla con los botones de descarga
-    df_pedidos_display = st.session_state.df_pedidos.copy()
-    
-    if not df_pedidos_display.empty:
-        # 1. Crea la columna del enlace de descarga
-        df_pedidos_display['Descargar'] = df_pedidos_display.apply(create_download_link, axis=1)
-        
-        columnas_a_mostrar = ['ID_Pedido', 'Fecha', 'Producto', 'Cantidad', 'Monto_Total', 'Vendedor', 'Descargar']
-        
-        # 2. Usa st.write con .to_html(escape=False) para renderizar el HTML del botón
-        st.write(
-            df_pedidos_display[columnas_a_mostrar].to_html(escape=False, index=False),
-            unsafe_allow_html=True
-        )
-    else:
-        st.info("No hay pedidos registrados aún.")
+        else:
+            st.info("El carrito de compras está vacío.")
+
+        # Estado de la factura de la última venta (el PDF se genera en segundo plano)
+        if 'ultima_venta' in st.session_state:
+            venta = st.session_state.ultima_venta
+            estado_factura = facturas.estado(venta['factura_id'])
+            st.success(venta['mensaje'])
+            if venta.get('aviso'):
+                st.warning(venta['aviso'])
+            if estado_factura is None:
+                st.warning(f"⚠️ No hay registro de la factura {venta['factura_id']}.")
+            elif estado_factura['estado'] == LISTA:
+                st.info(f"Factura {venta['factura_id']} archivada (Gestión Documental PDF).")
+                boton_descarga_factura(venta['factura_id'], etiqueta='⬇️ Descargar Factura Consolidada PDF',
+                                       key='btn_descarga_ultima_factura')
+            elif estado_factura['estado'] == ERROR:
+                st.error(f"❌ No se pudo generar la factura {venta['factura_id']}: {estado_factura['error']}")
+                if st.button("Reintentar Factura", key='btn_reintentar_factura', type="secondary"):
+                    facturas.reintentar(venta['factura_id'])
+                    st.rerun()
+            else:
+                st.info(f"⏳ Factura {venta['factura_id']} en generación ({estado_factura['estado']}).")
+                if st.button("🔄 Actualizar Estado", key='btn_estado_factura', type="secondary"):
+                    st.rerun()
+
+        st.markdown("---")
+        st.subheader("📑 Registro de Pedidos (Gestión Documental)")
+    
+        with diagnostico.span('registro_pedidos'):
+            # Filtros evaluados sobre los índices del historial: solo se materializa la página visible
+            if len(historial) > 0:
+                with st.expander("🔎 Filtros del Registro", expanded=False):
+                    col_f_desde, col_f_hasta, col_f_vend, col_f_prod, col_f_fact = st.columns(5)
+                    with col_f_desde:
+                        reg_desde = st.date_input("Desde", value=None, key='reg_desde')
+                    with col_f_hasta:
+                        reg_hasta = st.date_input("Hasta", value=None, key='reg_hasta')
+                    with col_f_vend:
+                        reg_vendedor = st.selectbox("Vendedor", [None] + historial.valores('Vendedor'), format_func=lambda v: v or 'Todos', key='reg_vendedor')
+                    with col_f_prod:
+                        reg_producto = st.selectbox("Producto", [None] + historial.valores('Producto'), format_func=lambda v: v or 'Todos', key='reg_producto')
+                    with col_f_fact:
+                        reg_factura = st.text_input("Factura (ID)", key='reg_factura').strip().upper()
+
+                col_pag_tam, col_pag_num, col_pag_info = st.columns([1, 1, 2])
+                with col_pag_tam:
+                    tamano_pagina = st.selectbox("Filas por página", [25, 50, 100], key='reg_tamano')
+                consultar_pagina = functools.partial(
+                    historial.pagina,
+                    desde=reg_desde.strftime('%Y-%m-%d 00:00') if reg_desde else None,
+                    hasta=reg_hasta.strftime('%Y-%m-%d 23:59') if reg_hasta else None,
+                    vendedor=reg_vendedor, producto=reg_producto,
+                    factura_ruta=ruta_de_factura(reg_factura) if reg_factura else None,
+                    tamano_pagina=tamano_pagina
+                )
+                df_pedidos_pagina, total_filtrado = consultar_pagina(numero_pagina=st.session_state.get('reg_pagina', 1) - 1)
+                total_paginas = max((total_filtrado + tamano_pagina - 1) // tamano_pagina, 1)
+                if st.session_state.get('reg_pagina', 1) > total_paginas:
+                    # Los filtros redujeron el resultado: volver a la última página existente
+                    st.session_state.reg_pagina = total_paginas
+                    df_pedidos_pagina, total_filtrado = consultar_pagina(numero_pagina=total_paginas - 1)
+                with col_pag_num:
+                    numero_pagina = st.number_input("Página", min_value=1, max_value=total_paginas, step=1, key='reg_pagina')
+                with col_pag_info:
+                    primera_fila = (numero_pagina - 1) * tamano_pagina
+                    st.caption(f"Mostrando {min(primera_fila + 1, total_filtrado)}–{min(primera_fila + tamano_pagina, total_filtrado)} "
+                               f"de {total_filtrado} líneas de pedido (página {numero_pagina} de {total_paginas}).")
+
+                # La tabla solo lleva el ID de la factura; el PDF se lee al pulsar descargar
+                columnas_a_mostrar = ['ID_Pedido', 'Fecha', 'Producto', 'Cantidad', 'Monto_Total', 'Vendedor']
+                df_pedidos_display = df_pedidos_pagina[columnas_a_mostrar].assign(
+                    Factura=df_pedidos_pagina['Factura_Ruta'].str.extract(r'([^/\\]+)\.pdf$', expand=False)
+                )
+                st.dataframe(df_pedidos_display, hide_index=True, use_container_width=True,
+                             column_config={"Fecha": st.column_config.DatetimeColumn("Fecha", format="YYYY-MM-DD HH:mm")})
+
+                # Descarga bajo demanda de una factura de la página
+                ids_factura = df_pedidos_display['Factura'].dropna().drop_duplicates()
+                col_sel_factura, col_descarga = st.columns([3, 1])
+                with col_sel_factura:
+                    factura_elegida = st.selectbox("Factura", ids_factura, key='select_factura_registro')
+                with col_descarga:
+                    if factura_elegida and archivo_facturas.existe(factura_elegida):
+                        boton_descarga_factura(factura_elegida, key='btn_descarga_factura_registro')
+                    else:
+                        st.caption("PDF no disponible.")
+            else:
+                st.info("No hay pedidos registrados aún.")
 
 
 # --- TAB 2: GESTIÓN DE INVENTARIO ---
-with tab2:
-    st.header("Gestión de Inventario: Agregar y Visualizar Stock")
+with tab2, diagnostico.span('pestana_inventario'):
+    if tab2.open:
+        st.header("Gestión de Inventario: Agregar y Visualizar Stock")
     
-    # Agregar Ítem
-    with st.expander("✅ Agregar Nuevo Ítem al Inventario", expanded=False):
-        col_new_id, col_new_prod, col_new_cat, col_new_stock, col_new_price = st.columns(5)
+        # Agregar Ítem
+        with st.expander("✅ Agregar Nuevo Ítem al Inventario", expanded=False):
+            col_new_id, col_new_prod, col_new_cat, col_new_stock, col_new_price = st.columns(5)
         
-        with col_new_id:
-            new_id = st.text_input("ID de Producto", key='new_id')
-        with col_new_prod:
-            new_prod = st.text_input("Nombre del Producto", key='new_prod')
-        with col_new_cat:
-            new_cat = st.text_input("Categoría", value='General', key='new_cat')
-        with col_new_stock:
-            new_stock = st.text_input("Stock Inicial", value='0', key='new_stock')
-        with col_new_price:
-            new_price = st.text_input("Precio Unitario", value='0.00', key='new_price')
-
-        if st.button("GUARDAR ITEM", key='btn_add_item', type="secondary"):
-            if new_id and new_prod:
-                agregar_item_inventario(new_id.upper(), new_prod, new_stock, new_price, new_cat)
-                st.rerun() 
-            else:
-                st.error("Los campos ID y Producto son obligatorios.")
+            with col_new_id:
+                new_id = st.text_input("ID de Producto", key='new_id')
+            with col_new_prod:
+                new_prod = st.text_input("Nombre del Producto", key='new_prod')
+            with col_new_cat:
+                new_cat = st.text_input("Categoría", value='General', key='new_cat')
+            with col_new_stock:
+                new_stock = st.text_input("Stock Inicial", value='0', key='new_stock')
+            with col_new_price:
+                new_price = st.text_input("Precio Unitario", value='0.00', key='new_price')
+
+            if st.button("GUARDAR ITEM", key='btn_add_item', type="secondary"):
+                if new_id and new_prod:
+                    agregar_item_inventario(new_id.upper(), new_prod, new_stock, new_price, new_cat)
+                    st.rerun() 
+                else:
+                    st.error("Los campos ID y Producto son obligatorios.")
 
-    # Inventario Maestro
-    st.subheader("📦 Inventario Maestro (Stock y Precio)")
+        # Inventario Maestro
+        st.subheader("📦 Inventario Maestro (Stock y Precio)")
     
-    # Función de estilo para stock crítico
-    def color_stock(row):
-        style = [''] * len(row)
-        if 'Stock' in row and row['Stock'] <= STOCK_ALERTA: 
-            style = ['background-color: #8c2525; color: white'] * len(row) 
-        return style
+        # Función de estilo para stock crítico
+        def color_stock(row):
+            style = [''] * len(row)
+            if 'Stock' in row and row['Stock'] <= STOCK_ALERTA: 
+                style = ['background-color: #8c2525; color: white'] * len(row) 
+            return style
 
-    # Se renombra Stock_Actual a Stock para que el estilo funcione y se muestre mejor
-    st.dataframe(st.session_state.df_inventario.rename(columns={'Stock_Actual': 'Stock'}).style.apply(color_stock, axis=1), use_container_width=True)
-    st.caption("Filas resaltadas indican **Stock Crítico** (KPI: <= 50 unidades).")
+        # Se renombra Stock_Actual a Stock para que el estilo funcione y se muestre mejor
+        st.dataframe(inventario.snapshot().rename(columns={'Stock_Actual': 'Stock'}).style.apply(color_stock, axis=1), use_container_width=True)
+        st.caption("Filas resaltadas indican **Stock Crítico** (KPI: <= 50 unidades).")
 
 # --- TAB 3: DASHBOARD DE KPIS ---
-with tab3:
-    st.header("Dashboard de KPIs y Métricas Valiosas")
+with tab3, diagnostico.span('pestana_dashboard'):
+    if tab3.open:
+        st.header("Dashboard de KPIs y Métricas Valiosas")
     
-    # KPIs en cajas
-    total_ventas = st.session_state.df_pedidos['Monto_Total'].sum()
-    promedio_pedido = st.session_state.df_pedidos['Monto_Total'].mean() if st.session_state.df_pedidos.shape[0] > 0 else 0
-    df_i_temp = st.session_state.df_inventario.copy()
-    df_i_temp['Valor_Total'] = df_i_temp['Stock_Actual'] * df_i_temp['Precio']
-    valor_inventario = df_i_temp['Valor_Total'].sum()
+        # KPIs en cajas (agregados incrementales, sin recorrer el historial)
+        col_kpi1, col_kpi2, col_kpi3 = st.columns(3)
+        col_kpi1.metric("Total Ventas", f"${kpis.total_ventas:,.2f}")
+        col_kpi2.metric("Pedido Promedio", f"${kpis.promedio_pedido:,.2f}")
+        col_kpi3.metric("Stock Valorizado", f"${kpis.valor_inventario:,.2f}")
     
-    col_kpi1, col_kpi2, col_kpi3 = st.columns(3)
-    col_kpi1.metric("Total Ventas", f"${total_ventas:,.2f}")
-    col_kpi2.metric("Pedido Promedio", f"${promedio_pedido:,.2f}")
-    col_kpi3.metric("Stock Valorizado", f"${valor_inventario:,.2f}")
+        st.markdown("---")
     
-    st.markdown("---")
-    
-    # Integración de la IA Básica (Predictiva)
-    st.subheader("💡 Alerta Predictiva de Stock (IA Básica)")
+        # Integración de la IA Básica (Predictiva)
+        st.subheader("💡 Alerta Predictiva de Stock (IA Básica)")
     
-    # Llama a la función con el nombre de columna original ('Stock_Actual')
-    df_predictivo = obtener_alerta_predictiva(st.session_state.df_inventario.copy(), st.session_state.df_pedidos.copy())
+        # Velocidad EWMA por producto mantenida por cada venta: una pasada NumPy sobre el catálogo
+        with diagnostico.span('alerta_predictiva'):
+            df_predictivo = velocidades.alerta(inventario.snapshot())
 
-    if not df_predictivo.empty:
-        st.warning(f"🚨 **¡Atención!** {len(df_predictivo)} productos podrían agotarse en menos de 14 días al ritmo actual de venta.")
+        if not df_predictivo.empty:
+            st.warning(f"🚨 **¡Atención!** {len(df_predictivo)} productos podrían agotarse en menos de {DIAS_ALERTA} días al ritmo actual de venta.")
         
-        # Renombrar 'Stock_Actual' a 'Stock' justo antes de mostrar
-        df_predictivo = df_predictivo.rename(columns={'Stock_Actual': 'Stock'})
+            # Renombrar 'Stock_Actual' a 'Stock' justo antes de mostrar
+            df_predictivo = df_predictivo.rename(columns={'Stock_Actual': 'Stock'})
         
-        st.dataframe(
-            df_predictivo[['Producto', 'Stock', 'Velocidad_Venta_Dia', 'Dias_Restantes']],
-            column_config={
-                "Producto": "Producto",
-                "Stock": "Stock Actual",
-                "Velocidad_Venta_Dia": "Venta Promedio (Unidades/Día)",
-                "Dias_Restantes": st.column_config.NumberColumn("Días Estimados Restantes", format="%.1f días")
-            },
-            hide_index=True,
-            use_container_width=True
-        )
-    else:
-        st.success("Inventario estable. Ningún producto está en riesgo de agotarse rápidamente (predicción > 14 días).")
-    
-    st.divider() 
+            st.dataframe(
+                df_predictivo[['Producto', 'Stock', 'Velocidad_Venta_Dia', 'Dias_Restantes']],
+                column_config={
+                    "Producto": "Producto",
+                    "Stock": "Stock Actual",
+                    "Velocidad_Venta_Dia": "Venta Promedio (Unidades/Día)",
+                    "Dias_Restantes": st.column_config.NumberColumn("Días Estimados Restantes", format="%.1f días")
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+        else:
+            st.success(f"Inventario estable. Ningún producto está en riesgo de agotarse rápidamente (predicción > {DIAS_ALERTA} días).")
     
-    generar_graficas()
+        st.divider() 
+
+        # Las gráficas se sirven de la caché mientras sus datos no cambian; se pueden redibujar a mano
+        if st.button("🔄 Actualizar Gráficas", key='btn_refrescar_graficas', type="secondary"):
+            cache_graficas.limpiar()
+        generar_graficas()
 
 # --- TAB 4: REPORTES Y COMUNICACIÓN ---
-with tab4:
-    st.header("Generación de Reportes y Comunicación Inter-Áreas")
+with tab4, diagnostico.span('pestana_reportes'):
+    if tab4.open:
+        st.header("Generación de Reportes y Comunicación Inter-Áreas")
 
-    # Comunicación a Áreas
-    with st.form(key='form_notificacion'):
-        col_area, col_msg = st.columns([1, 3])
+        # Comunicación a Áreas
+        with st.form(key='form_notificacion'):
+            col_area, col_msg = st.columns([1, 3])
         
-        with col_area:
-            area = st.selectbox("Área", ['VENTAS', 'GERENCIA', 'TÉCNICO', 'ADMINISTRACIÓN'], key='notif_area_form')
+            with col_area:
+                area = st.selectbox("Área", ['VENTAS', 'GERENCIA', 'TÉCNICO', 'ADMINISTRACIÓN'], key='notif_area_form')
         
-        with col_msg:
-            mensaje = st.text_input("Mensaje", key='notif_msg_form')
+            with col_msg:
+                mensaje = st.text_input("Mensaje", key='notif_msg_form')
         
-        submit_button = st.form_submit_button(label="ENVIAR", type="secondary")
-
-        if submit_button:
-            if mensaje:
-                enviar_notificacion(area, mensaje)
-                st.rerun() 
-            else:
-                st.error("El mensaje no puede estar vacío.")
+            submit_button = st.form_submit_button(label="ENVIAR", type="secondary")
 
-    st.markdown("---")
+            if submit_button:
+                if mensaje:
+                    enviar_notificacion(area, mensaje)
+                    st.rerun() 
+                else:
+                    st.error("El mensaje no puede estar vacío.")
+
+        st.markdown("---")
+
+        # Reportes Imprimibles
+        st.subheader("🖨️ Reportes Imprimibles (CSV - Gestión Documental)")
+        # El archivo se genera solo al enviar el formulario, por bloques, y se lee al descargar
+        with st.form(key='form_reporte'):
+            col_rep_tipo, col_rep_desde, col_rep_hasta, col_rep_vend, col_rep_cat, col_rep_formato = st.columns(6)
+            with col_rep_tipo:
+                rep_tipo = st.selectbox("Reporte", [REPORTE_VENTAS, REPORTE_INVENTARIO], key='rep_tipo')
+            with col_rep_desde:
+                rep_desde = st.date_input("Desde (ventas)", value=None, key='rep_desde')
+            with col_rep_hasta:
+                rep_hasta = st.date_input("Hasta (ventas)", value=None, key='rep_hasta')
+            with col_rep_vend:
+                rep_vendedor = st.text_input("Vendedor (vacío = todos)", key='rep_vendedor')
+            with col_rep_cat:
+                categorias_reporte = sorted(inventario.snapshot()['Categoría'].dropna().astype(str).unique().tolist())
+                rep_categoria = st.selectbox("Categoría", [None] + categorias_reporte, format_func=lambda c: c or 'Todas',
+                                             key='rep_categoria')
+            with col_rep_formato:
+                rep_formato = st.selectbox("Formato", list(FORMATOS_REPORTE), key='rep_formato')
+            preparar_reporte = st.form_submit_button(label="PREPARAR REPORTE", type="secondary")
+
+        if preparar_reporte:
+            with st.spinner('Generando reporte...'):
+                generar_reporte_imprimible(
+                    rep_tipo, rep_formato,
+                    desde=rep_desde.strftime('%Y-%m-%d 00:00') if rep_desde else None,
+                    hasta=rep_hasta.strftime('%Y-%m-%d 23:59') if rep_hasta else None,
+                    vendedor=rep_vendedor.strip() or None, categoria=rep_categoria
+                )
+
+        col_rep_descarga, col_sc = st.columns(2)
+        with col_rep_descarga:
+            if 'reporte_imprimible' in st.session_state:
+                ruta_reporte, filas_reporte, tipo_reporte, formato_reporte = st.session_state.reporte_imprimible
+                if os.path.exists(ruta_reporte):
+                    st.download_button(
+                        label=f"Descargar {tipo_reporte} ({filas_reporte} filas, {formato_reporte})",
+                        data=pathlib.Path(ruta_reporte).read_bytes, # Se lee solo al hacer clic
+                        file_name=os.path.basename(ruta_reporte),
+                        mime=FORMATOS_REPORTE[formato_reporte][1],
+                        key='download_btn_reporte'
+                    )
+        with col_sc:
+            if st.button("Simular Envío Feedback (Servicio al Cliente)", key='btn_sim_sc'):
+                enviar_notificacion("SERVICIO AL CLIENTE", "Solicitud de Feedback (CSAT) enviada al último cliente.")
+                st.rerun()
 
-    # Reportes Imprimibles
-    st.subheader("🖨️ Reportes Imprimibles (CSV - Gestión Documental)")
-    col_rep1, col_rep2, col_sc = st.columns(3)
-    
-    with col_rep1:
-        generar_reporte_imprimible('INVENTARIO')
-    with col_rep2:
-        generar_reporte_imprimible('VENTAS')
-    with col_sc:
-        if st.button("Simular Envío Feedback (Servicio al Cliente)", key='btn_sim_sc'):
-            enviar_notificacion("SERVICIO AL CLIENTE", "Solicitud de Feedback (CSAT) enviada al último cliente.")
-            st.rerun()
+        st.markdown("---")
+
+        # Reimpresión masiva de facturas (cierre de mes / contabilidad)
+        st.subheader("📦 Exportación Masiva de Facturas")
+        with st.form(key='form_exportar_facturas'):
+            col_desde, col_hasta, col_vend, col_formato = st.columns(4)
+            with col_desde:
+                exp_desde = st.date_input("Desde", value=datetime.now().replace(day=1), key='exp_desde')
+            with col_hasta:
+                exp_hasta = st.date_input("Hasta", value=datetime.now(), key='exp_hasta')
+            with col_vend:
+                exp_vendedor = st.text_input("Vendedor (vacío = todos)", key='exp_vendedor')
+            with col_formato:
+                exp_formato = st.radio("Formato", ['ZIP (por partes)', 'PDF único'], key='exp_formato')
+            exportar = st.form_submit_button(label="GENERAR EXPORTACIÓN", type="secondary")
+
+        if exportar:
+            bloques = almacen.iterar_pedidos(desde=exp_desde.strftime('%Y-%m-%d 00:00'), hasta=exp_hasta.strftime('%Y-%m-%d 23:59'),
+                                             vendedor=exp_vendedor.strip() or None)
+            os.makedirs(EXPORTACIONES_DIR, exist_ok=True)
+            marca = datetime.now().strftime('%Y%m%d_%H%M%S')
+            with st.spinner('Generando facturas...'):
+                if exp_formato == 'PDF único':
+                    # Tope de páginas: la instancia de PDF mantiene todo el documento en memoria
+                    seleccion = itertools.islice(agrupar_facturas(bloques), LIMITE_PDF_UNICO + 1)
+                    ruta_exportacion = os.path.join(EXPORTACIONES_DIR, f"facturas_{marca}.pdf")
+                    total_exportadas = exportar_facturas_pdf(seleccion, ruta_exportacion)
+                    if total_exportadas > LIMITE_PDF_UNICO:
+                        os.remove(ruta_exportacion)
+                        total_exportadas = None
+                        st.error(f"❌ Más de {LIMITE_PDF_UNICO} facturas: use el formato ZIP.")
+                else:
+                    ruta_exportacion = os.path.join(EXPORTACIONES_DIR, f"facturas_{marca}.zip")
+                    total_exportadas = exportar_facturas_zip(agrupar_facturas(bloques), ruta_exportacion)
+            if total_exportadas == 0:
+                st.info("No hay facturas en el rango seleccionado.")
+            elif total_exportadas:
+                st.session_state.exportacion_facturas = (ruta_exportacion, total_exportadas)
+
+        if 'exportacion_facturas' in st.session_state:
+            ruta_exportacion, total_exportadas = st.session_state.exportacion_facturas
+            if os.path.exists(ruta_exportacion):
+                st.download_button(
+                    label=f"Descargar {total_exportadas} facturas ({os.path.basename(ruta_exportacion)})",
+                    data=pathlib.Path(ruta_exportacion).read_bytes, # Se lee solo al hacer clic
+                    file_name=os.path.basename(ruta_exportacion),
+                    mime='application/zip' if ruta_exportacion.endswith('.zip') else 'application/pdf',
+                    key='download_btn_facturas'
+                )
 
 # --- TAB 5: IA REAL (GENERACIÓN DE CONTENIDO) ---
-with tab5:
-    st.header("⭐ Generador de Contenido de Marketing (Gemini)")
-    
-    if client is None:
-        st.error("⚠️ La funcionalidad de IA no está disponible.")
-        st.caption("Verifique: 1) **Instalación** de `google-genai`. 2) **Clave API** en el archivo seguro `.streamlit/secrets.toml`.")
-    else:
-        st.info("Utilice la IA para generar descripciones de producto, publicaciones de redes sociales o ideas de venta usando el modelo Gemini 2.5 Flash (Free Tier).")
-
-        productos = st.session_state.df_inventario['Producto'].unique().tolist()
+with tab5, diagnostico.span('pestana_ia'):
+    if tab5.open:
+        st.header("⭐ Generador de Contenido de Marketing (Gemini)")
+
+        api_key = st.secrets.get("GEMINI_API_KEY")
+        try:
+            client = obtener_cliente_ia(api_key)
+        except Exception as e:
+            st.error(f"Error al inicializar la API de Gemini. Verifique la clave en secrets.toml. Error: {e}")
+            client = None
+    
+        if client is None:
+            st.error("⚠️ La funcionalidad de IA no está disponible.")
+            st.caption("Verifique: 1) **Instalación** de `google-genai`. 2) **Clave API** en el archivo seguro `.streamlit/secrets.toml`.")
+        else:
+            servicio_marketing = obtener_servicio_marketing(api_key)
+            try:
+                from google.genai.errors import APIError
+            except ImportError:  # Cliente local sin google-genai instalado: no hay errores de la API
+                APIError = ()
+            st.info("Utilice la IA para generar descripciones de producto, publicaciones de redes sociales o ideas de venta usando el modelo Gemini 2.5 Flash (Free Tier).")
+
+            df_inventario_ia = inventario.snapshot()
+            productos = df_inventario_ia['Producto'].unique().tolist()
         
-        producto_seleccionado = st.selectbox("Seleccione el Producto a promocionar:", productos)
+            producto_seleccionado = st.selectbox("Seleccione el Producto a promocionar:", productos)
 
-        if producto_seleccionado:
-            detalles = st.session_state.df_inventario[
-                st.session_state.df_inventario['Producto'] == producto_seleccionado
-            ].iloc[0]
+            if producto_seleccionado:
+                detalles = df_inventario_ia[
+                    df_inventario_ia['Producto'] == producto_seleccionado
+                ].iloc[0]
             
-            st.markdown(f"**Detalles:** Stock: {detalles['Stock_Actual']}, Precio: **${detalles['Precio']:.2f}**, Categoría: {detalles['Categoría']}")
-
-            tarea = st.text_area(
-                "Instrucción para la IA (Prompt):",
-                value=f"Genera una publicación de Instagram (máx. 50 palabras y 3 emojis) para promocionar nuestro producto '{producto_seleccionado}'. Menciona su precio de ${detalles['Precio']:.2f} y enfócate en la calidad y la necesidad en Panamá.",
-                height=150
-            )
-
-            if st.button("✨ Generar Mensaje de Marketing", type="primary"):
-                if tarea:
-                    with st.spinner('Contactando con Gemini...'):
-                        try:
-                            response = client.models.generate_content(
-                                model='gemini-2.5-flash',
-                                contents=tarea
-                            )
-                            st.subheader("Resultado de la IA:")
-                            st.success(response.text)
+                st.markdown(f"**Detalles:** Stock: {detalles['Stock_Actual']}, Precio: **${detalles['Precio']:.2f}**, Categoría: {detalles['Categoría']}")
+
+                tarea = st.text_area(
+                    "Instrucción para la IA (Prompt):",
+                    value=prompt_producto(PLANTILLA_PROMPT, producto_seleccionado, detalles['Precio']),
+                    height=150
+                )
+
+                if st.button("✨ Generar Mensaje de Marketing", type="primary"):
+                    if tarea:
+                        with st.spinner('Contactando con Gemini...'):
+                            try:
+                                texto_ia, desde_cache = servicio_marketing.generar(tarea)
+                                st.subheader("Resultado de la IA:")
+                                st.success(texto_ia)
+                                if desde_cache:
+                                    st.caption("♻️ Respuesta reutilizada de la caché (mismo modelo y prompt).")
                             
-                        except APIError as e:
-                            st.error(f"Error de la API: {e}. Puede ser un error de la clave o que se excedió el límite de uso gratuito.")
-                        except Exception as e:
-                            st.error(f"Error inesperado: {e}")
-                else:
-                    st.error("Por favor, escriba una instrucción para la IA.")
\ No newline at end of file
+                            except APIError as e:
+                                st.error(f"Error de la API: {e}. Puede ser un error de la clave o que se excedió el límite de uso gratuito.")
+                            except Exception as e:
+                                st.error(f"Error inesperado: {e}")
+                    else:
+                        st.error("Por favor, escriba una instrucción para la IA.")
+
+            # Generación masiva: varios productos en paralelo, respetando el límite de la API
+            st.markdown("---")
+            with st.expander("📦 Generación Masiva por Categoría", expanded=False):
+                with st.form(key='form_marketing_lote'):
+                    categorias_ia = ['Todo el catálogo'] + sorted(df_inventario_ia['Categoría'].dropna().astype(str).unique().tolist())
+                    categoria_lote = st.selectbox("Categoría", categorias_ia, key='lote_categoria')
+                    max_lote = st.number_input("Máximo de productos", min_value=1, max_value=500, value=20, step=1, key='lote_maximo')
+                    plantilla_lote = st.text_area("Plantilla del prompt (usa {producto}, {precio} y {categoria})",
+                                                  value=PLANTILLA_PROMPT, height=120, key='lote_plantilla')
+                    generar_lote = st.form_submit_button("✨ Generar para la Selección", type="primary")
+
+                if generar_lote:
+                    df_lote = df_inventario_ia if categoria_lote == 'Todo el catálogo' else \
+                        df_inventario_ia[df_inventario_ia['Categoría'].astype(str) == categoria_lote]
+                    df_lote = df_lote.head(int(max_lote))
+                    try:
+                        prompts_lote = {
+                            fila.ID: prompt_producto(plantilla_lote, fila.Producto, fila.Precio, fila.Categoría)
+                            for fila in df_lote.itertuples(index=False)
+                        }
+                    except (KeyError, ValueError, IndexError) as e:
+                        st.error(f"❌ Plantilla inválida: {e}")
+                        prompts_lote = {}
+                    if prompts_lote:
+                        nombres_lote = dict(zip(df_lote['ID'], df_lote['Producto']))
+                        progreso = st.progress(0.0, text="Generando...")
+                        resultados_lote = []
+                        # Cada resultado se muestra en cuanto termina (los de la caché primero)
+                        for i, (id_prod, texto_ia, error, desde_cache) in enumerate(servicio_marketing.generar_lote(prompts_lote), start=1):
+                            if error is not None:
+                                st.error(f"❌ {id_prod} - {nombres_lote[id_prod]}: {error}")
+                            else:
+                                st.markdown(f"**{id_prod} - {nombres_lote[id_prod]}**{' ♻️' if desde_cache else ''}")
+                                st.success(texto_ia)
+                            resultados_lote.append({'ID': id_prod, 'Producto': nombres_lote[id_prod], 'Texto': texto_ia,
+                                                    'Error': str(error) if error else '', 'Desde_Cache': desde_cache})
+                            progreso.progress(i / len(prompts_lote), text=f"{i} de {len(prompts_lote)} productos")
+                        st.session_state.marketing_lote = pd.DataFrame(resultados_lote)
+
+                if 'marketing_lote' in st.session_state:
+                    st.download_button(
+                        label="⬇️ Descargar Resultados del Último Lote (CSV)",
+                        data=st.session_state.marketing_lote.to_csv(index=False).encode('utf-8'),
+                        file_name=f"marketing_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+                        mime='text/csv',
+                        key='btn_descarga_marketing_lote'
+                    )
+
+# --- TAB 6: DIAGNÓSTICO (solo con DIAGNOSTICO_ACTIVO=1) ---
+if diagnostico.activo and tab_diagnostico[0].open:
+    with tab_diagnostico[0]:
+        st.header("🩺 Diagnóstico de Recargas")
+        st.caption(f"Percentiles móviles de las últimas recargas ({diagnostico.recargas} medidas desde el arranque). "
+                   "Los spans anidados incluyen el tiempo de los internos.")
+        st.dataframe(
+            diagnostico.resumen(),
+            column_config={
+                "p50_ms": st.column_config.NumberColumn("p50 (ms)", format="%.1f"),
+                "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.1f"),
+                "p99_ms": st.column_config.NumberColumn("p99 (ms)", format="%.1f"),
+                "Llamadas_Promedio": st.column_config.NumberColumn("Llamadas/Recarga", format="%.1f"),
+                "Memoria_p50_KiB": st.column_config.NumberColumn("Memoria p50 (KiB)", format="%.0f"),
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+        col_diag_log, col_diag_reset = st.columns(2)
+        with col_diag_log:
+            if diagnostico.ruta_log and os.path.exists(diagnostico.ruta_log):
+                st.download_button(
+                    label="⬇️ Descargar Registro (JSON Lines)",
+                    data=pathlib.Path(diagnostico.ruta_log).read_bytes, # Se lee solo al hacer clic
+                    file_name=os.path.basename(diagnostico.ruta_log),
+                    mime='application/x-ndjson',
+                    key='btn_descarga_diagnostico'
+                )
+        with col_diag_reset:
+            if st.button("Reiniciar Estadísticas", key='btn_reiniciar_diagnostico', type="secondary"):
+                diagnostico.reiniciar()
+                st.rerun()
+
+diagnostico.cerrar_rerun()
@@ -0,0 +1,326 @@
+"""Archivo de facturas PDF en segmentos de solo-anexado con índice (Gestión Documental).
+
+En lugar de un archivo por factura en un único directorio, los PDF se anexan
+a segmentos (``facturas/segmentos/000001.seg``) de hasta
+``TAMANO_SEGMENTO`` bytes, opcionalmente comprimidos con zlib. Un índice
+SQLite (``facturas/indice.db``) guarda por factura su segmento, posición,
+longitud y fecha de venta: consultar, descargar o eliminar una factura es una
+búsqueda por clave primaria, sin listar ni tocar el sistema de archivos.
+
+Cada proceso escribe en su propio segmento abierto (los hilos lo comparten
+con un lock), así que la aplicación y los procesos de una importación masiva
+pueden archivar a la vez. El segmento abierto se mantiene bloqueado con
+``flock``: la retención y la compactación solo tocan los segmentos cerrados
+o los de procesos que terminaron sin cerrarlos, nunca el de un proceso vivo
+aunque lleve tiempo sin escribir. Sin ``fcntl`` (Windows) un segmento abierto
+se da por abandonado tras ``ESPERA_SEGMENTO_HUERFANO`` sin escrituras. Volver a guardar una factura (un reintento) anexa
+un registro nuevo y el índice pasa a apuntar a él.
+
+La retención borra entradas del índice; un segmento sin entradas vivas se
+elimina entero y ``compactar`` reescribe los que quedaron casi vacíos. La
+compactación solo mueve una entrada si sigue apuntando adonde la leyó (un
+reintento o una purga concurrentes ganan), y un lector que llega a un
+segmento ya borrado vuelve a buscar la factura en el índice. Los
+PDF sueltos de versiones anteriores (``facturas/F....pdf``) se siguen
+leyendo, y ``migrar`` los incorpora al archivo::
+
+    python archivo_facturas.py migrar
+    python archivo_facturas.py purgar --antes 2020-01-01
+    python archivo_facturas.py compactar
+"""
+import argparse
+import atexit
+import functools
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: los segmentos abandonados se detectan por antigüedad
+    fcntl = None
+
+FACTURAS_DIR = "facturas"
+TAMANO_SEGMENTO = 64 * 1024 * 1024  # Bytes por segmento antes de abrir uno nuevo
+NIVEL_COMPRESION = 6  # zlib; None guarda los PDF tal cual
+UMBRAL_COMPACTACION_SEGMENTO = 0.5  # Fracción viva por debajo de la cual se reescribe un segmento
+ESPERA_SEGMENTO_HUERFANO = 24 * 3600  # Sin fcntl: segundos sin escrituras para dar por cerrado un segmento abierto
+REINTENTOS_LECTURA = 3  # Búsquedas en el índice si el segmento desaparece al leer (compactación concurrente)
+
+# Cabecera de cada registro: marca, longitud del ID, longitud de los datos, comprimido, CRC32 de los datos.
+# Con la cabecera y el ID, un segmento se puede recorrer sin el índice.
+_CABECERA = struct.Struct('>4sHIBI')
+_MARCA = b'FACT'
+
+
+class Archivo:
+    """Segmentos de PDF y su índice; una instancia por proceso (se reabre sola tras un ``fork``)."""
+
+    def __init__(self, directorio=FACTURAS_DIR, tamano_segmento=TAMANO_SEGMENTO, nivel_compresion=NIVEL_COMPRESION):
+        self.directorio = directorio
+        self.directorio_segmentos = os.path.join(directorio, 'segmentos')
+        self.tamano_segmento = tamano_segmento
+        self.nivel_compresion = nivel_compresion
+        self._lock = threading.Lock()
+        self._pid = None
+        os.makedirs(self.directorio_segmentos, exist_ok=True)
+        self._abrir()
+        conn = self._conn
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS facturas (
+            id TEXT PRIMARY KEY, segmento INTEGER NOT NULL, desplazamiento INTEGER NOT NULL,
+            longitud INTEGER NOT NULL, comprimido INTEGER NOT NULL, fecha TEXT) WITHOUT ROWID""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_facturas_fecha ON facturas (fecha)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_facturas_segmento ON facturas (segmento)")
+        conn.execute("CREATE TABLE IF NOT EXISTS segmentos (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "cerrado INTEGER NOT NULL DEFAULT 0)")
+        atexit.register(self.cerrar)
+
+    def _abrir(self):
+        """Conexión y segmento propios del proceso actual."""
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(os.path.join(self.directorio, 'indice.db'), timeout=30,
+                                     isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # El PDF se puede regenerar desde el libro de pedidos
+        self._segmento = None  # (id, archivo abierto en modo anexado)
+
+    def _verificar_proceso(self):
+        # Un proceso hijo no debe escribir en el segmento ni usar la conexión del padre
+        if self._pid != os.getpid():
+            self._abrir()
+
+    def ruta_segmento(self, segmento):
+        return os.path.join(self.directorio_segmentos, f"{segmento:06d}.seg")
+
+    def _ruta_suelta(self, factura_id):
+        return os.path.join(self.directorio, f"{factura_id}.pdf")
+
+    # --- ESCRITURA ---
+
+    def _segmento_abierto(self, tamano):
+        """Segmento donde cabe un registro de ``tamano`` bytes. Requiere el lock."""
+        if self._segmento is not None and self._segmento[1].tell() + tamano > self.tamano_segmento:
+            self._cerrar_segmento()
+        if self._segmento is None:
+            # Alta y bloqueo en la misma transacción: ningún otro proceso ve el segmento sin su dueño
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                segmento = self._conn.execute("INSERT INTO segmentos DEFAULT VALUES").lastrowid
+                archivo = open(self.ruta_segmento(segmento), 'ab')
+                if fcntl is not None:
+                    fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)  # Se libera al cerrarlo o al terminar el proceso
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._segmento = (segmento, archivo)
+        return self._segmento
+
+    def _cerrar_segmento(self):
+        segmento, archivo = self._segmento
+        archivo.close()
+        self._conn.execute("UPDATE segmentos SET cerrado = 1 WHERE id = ?", (segmento,))
+        self._segmento = None
+
+    def _anexar(self, factura_id, cuerpo, comprimido):
+        """Anexa un registro al segmento abierto y devuelve ``(segmento, desplazamiento)``. Requiere el lock."""
+        clave = factura_id.encode('utf-8')
+        registro = _CABECERA.pack(_MARCA, len(clave), len(cuerpo), comprimido, zlib.crc32(cuerpo)) + clave + cuerpo
+        segmento, archivo = self._segmento_abierto(len(registro))
+        desplazamiento = archivo.tell() + _CABECERA.size + len(clave)
+        archivo.write(registro)
+        archivo.flush()  # Los datos llegan al segmento antes que la entrada al índice
+        return segmento, desplazamiento
+
+    def guardar(self, factura_id, datos, fecha=None):
+        """Anexa el PDF ``datos`` (bytes) de ``factura_id``; ``fecha`` es la de la venta (para la retención)."""
+        comprimido = self.nivel_compresion is not None
+        cuerpo = zlib.compress(datos, self.nivel_compresion) if comprimido else datos
+        with self._lock:
+            self._verificar_proceso()
+            segmento, desplazamiento = self._anexar(factura_id, cuerpo, comprimido)
+            self._conn.execute("INSERT OR REPLACE INTO facturas VALUES (?, ?, ?, ?, ?, ?)",
+                               (factura_id, segmento, desplazamiento, len(cuerpo), comprimido, fecha))
+
+    def cerrar(self):
+        with self._lock:
+            if self._segmento is not None and self._pid == os.getpid():
+                self._cerrar_segmento()
+
+    # --- LECTURA ---
+
+    def ubicar(self, factura_id):
+        """``(segmento, desplazamiento, longitud, comprimido)`` de la factura, o ``None``."""
+        with self._lock:
+            self._verificar_proceso()
+            return self._conn.execute("SELECT segmento, desplazamiento, longitud, comprimido FROM facturas WHERE id = ?",
+                                      (factura_id,)).fetchone()
+
+    def existe(self, factura_id):
+        return self.ubicar(factura_id) is not None or os.path.exists(self._ruta_suelta(factura_id))
+
+    def _leer_cuerpo(self, segmento, desplazamiento, longitud):
+        with open(self.ruta_segmento(segmento), 'rb') as f:
+            f.seek(desplazamiento)
+            return f.read(longitud)
+
+    def leer(self, factura_id, ubicacion=None):
+        """Bytes del PDF; lanza ``FileNotFoundError`` si la factura no está archivada."""
+        ubicacion = ubicacion or self.ubicar(factura_id)
+        if ubicacion is None:
+            with open(self._ruta_suelta(factura_id), 'rb') as f:  # PDF de una versión anterior
+                return f.read()
+        for intento in range(REINTENTOS_LECTURA):
+            segmento, desplazamiento, longitud, comprimido = ubicacion
+            try:
+                cuerpo = self._leer_cuerpo(segmento, desplazamiento, longitud)
+            except FileNotFoundError:
+                # Una compactación movió la factura y borró el segmento después de la búsqueda
+                nueva = self.ubicar(factura_id)
+                if nueva is None or tuple(nueva) == tuple(ubicacion) or intento == REINTENTOS_LECTURA - 1:
+                    raise
+                ubicacion = nueva
+                continue
+            return zlib.decompress(cuerpo) if comprimido else cuerpo
+
+    # --- RETENCIÓN ---
+
+    def eliminar(self, factura_ids):
+        """Quita facturas del índice; su espacio se libera al eliminar o compactar el segmento."""
+        with self._lock:
+            self._verificar_proceso()
+            self._conn.executemany("DELETE FROM facturas WHERE id = ?", [(f,) for f in factura_ids])
+        return self.liberar_segmentos()
+
+    def purgar(self, antes_de):
+        """Elimina las facturas con fecha de venta anterior a ``antes_de`` (``'YYYY-MM-DD'``). Devuelve cuántas."""
+        with self._lock:
+            self._verificar_proceso()
+            eliminadas = self._conn.execute("DELETE FROM facturas WHERE fecha < ?", (antes_de,)).rowcount
+        self.liberar_segmentos()
+        return eliminadas
+
+    def _abandonado(self, segmento):
+        """Si un segmento sin cerrar ya no tiene dueño: nadie mantiene su ``flock`` (el proceso terminó)."""
+        try:
+            fd = os.open(self.ruta_segmento(segmento), os.O_RDONLY)
+        except FileNotFoundError:
+            return True
+        try:
+            if fcntl is None:
+                return os.fstat(fd).st_mtime < time.time() - ESPERA_SEGMENTO_HUERFANO
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False  # Lo tiene abierto un proceso vivo
+            return True
+        finally:
+            os.close(fd)
+
+    def _segmentos_cerrados(self):
+        """Segmentos que ya no recibirán escrituras: cerrados, o abandonados por un proceso que terminó sin cerrarlos."""
+        propio = self._segmento[0] if self._segmento is not None else None
+        return [segmento for segmento, cerrado in self._conn.execute("SELECT id, cerrado FROM segmentos").fetchall()
+                if segmento != propio and (cerrado or self._abandonado(segmento))]
+
+    def liberar_segmentos(self):
+        """Borra los segmentos cerrados sin ninguna factura viva. Devuelve cuántos."""
+        with self._lock:
+            self._verificar_proceso()
+            vivos = {s for (s,) in self._conn.execute("SELECT DISTINCT segmento FROM facturas")}
+            vacios = [s for s in self._segmentos_cerrados() if s not in vivos]
+            for segmento in vacios:
+                if os.path.exists(self.ruta_segmento(segmento)):
+                    os.remove(self.ruta_segmento(segmento))
+                self._conn.execute("DELETE FROM segmentos WHERE id = ?", (segmento,))
+        return len(vacios)
+
+    def compactar(self, umbral=UMBRAL_COMPACTACION_SEGMENTO):
+        """Reescribe en el segmento actual las facturas de los segmentos cerrados con poca parte viva."""
+        with self._lock:
+            self._verificar_proceso()
+            vivos = dict(self._conn.execute("SELECT segmento, SUM(longitud) FROM facturas GROUP BY segmento").fetchall())
+            candidatos = [s for s in self._segmentos_cerrados() if s in vivos and os.path.exists(self.ruta_segmento(s))
+                          and vivos[s] < umbral * os.path.getsize(self.ruta_segmento(s))]
+        for segmento in candidatos:
+            with self._lock:
+                filas = self._conn.execute("SELECT id, desplazamiento, longitud, comprimido "
+                                           "FROM facturas WHERE segmento = ?", (segmento,)).fetchall()
+            for factura_id, desplazamiento, longitud, comprimido in filas:
+                try:
+                    cuerpo = self._leer_cuerpo(segmento, desplazamiento, longitud)
+                except FileNotFoundError:
+                    break  # Otro proceso ya lo compactó y liberó
+                with self._lock:
+                    self._verificar_proceso()
+                    nuevo, posicion = self._anexar(factura_id, cuerpo, comprimido)
+                    # Solo si la entrada sigue donde se leyó: un reintento o una purga
+                    # posteriores no se pisan (el registro copiado queda como espacio muerto)
+                    self._conn.execute("UPDATE facturas SET segmento = ?, desplazamiento = ? "
+                                       "WHERE id = ? AND segmento = ? AND desplazamiento = ?",
+                                       (nuevo, posicion, factura_id, segmento, desplazamiento))
+        return len(candidatos), self.liberar_segmentos()
+
+    def migrar(self, eliminar_sueltos=True):
+        """Incorpora los PDF sueltos del directorio (un archivo por factura) al archivo."""
+        migradas = 0
+        with os.scandir(self.directorio) as entradas:
+            for entrada in entradas:
+                if not (entrada.is_file() and entrada.name.endswith('.pdf')):
+                    continue
+                with open(entrada.path, 'rb') as f:
+                    datos = f.read()
+                fecha = datetime.fromtimestamp(entrada.stat().st_mtime).strftime('%Y-%m-%d %H:%M')
+                self.guardar(entrada.name[:-len('.pdf')], datos, fecha)
+                if eliminar_sueltos:
+                    os.remove(entrada.path)
+                migradas += 1
+        return migradas
+
+    def estadisticas(self):
+        with self._lock:
+            self._verificar_proceso()
+            facturas, vivos = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(longitud), 0) FROM facturas").fetchone()
+            segmentos = [s for (s,) in self._conn.execute("SELECT id FROM segmentos")]
+        tamano = sum(os.path.getsize(self.ruta_segmento(s)) for s in segmentos if os.path.exists(self.ruta_segmento(s)))
+        return {'facturas': facturas, 'segmentos': len(segmentos), 'bytes_vivos': vivos, 'bytes_segmentos': tamano}
+
+
+@functools.lru_cache(maxsize=None)
+def archivo_por_defecto():
+    """Archivo del proceso sobre ``FACTURAS_DIR``, creado al primer uso."""
+    return Archivo()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archivo de facturas PDF.")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    migrar_cmd = subcomandos.add_parser('migrar', help="Incorpora los PDF sueltos de facturas/ al archivo.")
+    migrar_cmd.add_argument('--conservar', action='store_true', help="No borrar los PDF sueltos migrados.")
+    purgar_cmd = subcomandos.add_parser('purgar', help="Elimina las facturas anteriores a una fecha.")
+    purgar_cmd.add_argument('--antes', required=True, help="Fecha de venta límite (YYYY-MM-DD).")
+    subcomandos.add_parser('compactar', help="Reescribe los segmentos con poca parte viva.")
+    subcomandos.add_parser('estadisticas', help="Facturas, segmentos y bytes del archivo.")
+    args = parser.parse_args(argv)
+
+    archivo = Archivo()
+    if args.comando == 'migrar':
+        print(f"Migradas {archivo.migrar(eliminar_sueltos=not args.conservar)} facturas al archivo.")
+    elif args.comando == 'purgar':
+        print(f"Eliminadas {archivo.purgar(args.antes)} facturas anteriores a {args.antes}.")
+    elif args.comando == 'compactar':
+        reescritos, liberados = archivo.compactar()
+        print(f"Reescritos {reescritos} segmentos; liberados {liberados}.")
+    else:
+        print(archivo.estadisticas())
+    archivo.cerrar()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
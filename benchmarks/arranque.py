@@ -0,0 +1,81 @@
+"""Mide el arranque del almacén CSV con y sin instantáneas Arrow.
+
+Cada caso corre en un proceso nuevo para que el tiempo y la memoria (RSS) no
+se contaminen entre sí. La memoria es la de un proceso servidor: todas las
+sesiones de Streamlit comparten el mismo historial (``st.cache_resource``).
+
+Uso::
+
+    python -m benchmarks.arranque --pedidos 2000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import datos_sinteticos
+
+
+def rss_mb():
+    """Memoria residente actual del proceso en MB (Linux), o la máxima si no hay /proc."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def medir_carga(destino, solo_csv=False):
+    """Carga inventario y pedidos como al arrancar la aplicación; imprime el resultado en JSON."""
+    import almacenamiento
+    from almacenamiento import AlmacenCSV, INVENTARIO_FILE, PEDIDOS_FILE, MOVIMIENTOS_FILE
+    if solo_csv:
+        almacenamiento.pa = None  # Comportamiento anterior: parsear todo el texto
+    base = rss_mb()
+    inicio = time.perf_counter()
+    almacen = AlmacenCSV(os.path.join(destino, INVENTARIO_FILE), os.path.join(destino, PEDIDOS_FILE),
+                         os.path.join(destino, MOVIMIENTOS_FILE))
+    almacen.cargar_inventario()
+    pedidos = almacen.cargar_pedidos()
+    print(json.dumps({'segundos': time.perf_counter() - inicio, 'rss_mb': rss_mb() - base, 'filas': len(pedidos)}))
+
+
+def _caso(destino, solo_csv=False):
+    salida = subprocess.run([sys.executable, '-m', 'benchmarks.arranque', '--medir', destino] + (['--solo-csv'] if solo_csv else []),
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Arranque del almacén CSV: texto frente a instantánea Arrow.")
+    parser.add_argument('--pedidos', type=int, default=2_000_000)
+    parser.add_argument('--productos', type=int, default=5_000)
+    parser.add_argument('--medir', help=argparse.SUPPRESS)
+    parser.add_argument('--solo-csv', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.medir:
+        medir_carga(args.medir, args.solo_csv)
+        return
+
+    from almacenamiento import AlmacenCSV, ruta_instantanea, INVENTARIO_FILE, PEDIDOS_FILE, MOVIMIENTOS_FILE
+    with tempfile.TemporaryDirectory() as destino:
+        datos_sinteticos.escribir(destino, args.pedidos, args.productos)
+        ruta_arrow = ruta_instantanea(os.path.join(destino, PEDIDOS_FILE))
+        resultados = {'csv': _caso(destino, solo_csv=True)}
+        inicio = time.perf_counter()
+        AlmacenCSV(*(os.path.join(destino, f) for f in (INVENTARIO_FILE, PEDIDOS_FILE, MOVIMIENTOS_FILE))).regenerar_instantaneas()
+        resultados['escritura_instantanea_segundos'] = time.perf_counter() - inicio
+        resultados['instantanea'] = _caso(destino)
+        resultados['tamano_mb'] = {
+            'csv': os.path.getsize(os.path.join(destino, PEDIDOS_FILE)) / 2**20,
+            'arrow': os.path.getsize(ruta_arrow) / 2**20 if os.path.exists(ruta_arrow) else None,
+        }
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Mide el costo de la bitácora de ventas (WAL) con varias cajas cobrando a la vez.
+
+Cada caja es un hilo que confirma carritos de 3 productos al azar con
+``MotorVentas.vender`` sobre el mismo almacén; se corre sin bitácora y con
+ella, en directorios separados:
+
+* ``ventas_s``: ventas confirmadas por segundo entre todas las cajas.
+* ``latencia_ms``: p50/p99 de cada ``vender``.
+* ``fsync_por_venta``: sincronizaciones de la bitácora por venta; por debajo
+  de 1 cuando el group commit junta ventas de varias cajas.
+
+Uso::
+
+    python -m benchmarks.bitacora --cajas 1 8 32 --ventas 200 --backend sqlite
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import datos_sinteticos
+
+
+def medir_cajas(directorio, cajas, ventas_por_caja, backend, con_bitacora, semilla=0):
+    """Corre ``cajas`` hilos vendiendo en ``directorio`` y devuelve las métricas."""
+    from almacenamiento import AlmacenCSV, AlmacenSQLite, guardar_datos
+    from bitacora_ventas import BitacoraVentas
+    from esquema import tipar_inventario
+    from inventario_compartido import InventarioCompartido
+    from motor_ventas import MotorVentas
+    from numeracion import Numerador
+
+    os.makedirs(directorio, exist_ok=True)
+    os.chdir(directorio)
+    df_inventario = tipar_inventario(datos_sinteticos.generar_inventario(5000, semilla))
+    df_inventario['Stock_Actual'] = np.int32(10**6)  # Las ventas nunca agotan el stock
+    guardar_datos(df_inventario, 'inventario.csv')
+    if backend == 'sqlite':
+        almacen = AlmacenSQLite('ventas.db')
+        almacen.migrar_desde(AlmacenCSV('inventario.csv', 'pedidos.csv', 'inventario_movimientos.csv'))
+    else:
+        almacen = AlmacenCSV('inventario.csv', 'pedidos.csv', 'inventario_movimientos.csv', umbral_compactacion=10**9)
+    bitacora = BitacoraVentas('bitacora', sincronizar=almacen.sincronizar) if con_bitacora else None
+    motor = MotorVentas(almacen, InventarioCompartido(almacen.cargar_inventario()),
+                        numerador=Numerador('numeracion.db'), bitacora=bitacora)
+
+    latencias = [[] for _ in range(cajas)]
+    barrera = threading.Barrier(cajas + 1)
+
+    def caja(numero):
+        rng = np.random.default_rng(semilla + numero)
+        carritos = []
+        for _ in range(ventas_por_caja):
+            filas = df_inventario.iloc[rng.choice(len(df_inventario), 3, replace=False)]
+            cantidades = rng.integers(1, 5, 3)
+            carritos.append(pd.DataFrame({'ID': filas['ID'].to_numpy(), 'Producto': filas['Producto'].to_numpy(),
+                                          'Cantidad': cantidades, 'Precio_Unitario': filas['Precio'].to_numpy(),
+                                          'Subtotal_Bruto': cantidades * filas['Precio'].to_numpy()}))
+        barrera.wait()
+        for df_carrito in carritos:
+            inicio = time.perf_counter()
+            motor.vender(df_carrito, f"V{numero:02d}")
+            latencias[numero].append(time.perf_counter() - inicio)
+
+    hilos = [threading.Thread(target=caja, args=(n,)) for n in range(cajas)]
+    for hilo in hilos:
+        hilo.start()
+    barrera.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+
+    ms = np.concatenate([np.asarray(l) for l in latencias]) * 1000
+    ventas = len(ms)
+    resultado = {'cajas': cajas, 'ventas': ventas, 'ventas_s': ventas / segundos,
+                 'latencia_ms': {'p50': float(np.percentile(ms, 50)), 'p99': float(np.percentile(ms, 99))}}
+    if bitacora is not None:
+        resultado['fsync_por_venta'] = bitacora.sincronizaciones / ventas
+        bitacora.cerrar()
+    return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Costo de la bitácora de ventas con cajas concurrentes.")
+    parser.add_argument('--cajas', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--ventas', type=int, default=200, help="Ventas por caja.")
+    parser.add_argument('--backend', choices=['csv', 'sqlite'], default='sqlite')
+    args = parser.parse_args(argv)
+
+    origen = os.getcwd()
+    resultados = []
+    try:
+        with tempfile.TemporaryDirectory() as destino:
+            for cajas in args.cajas:
+                for con_bitacora in (False, True):
+                    directorio = os.path.join(destino, f"{cajas}-{int(con_bitacora)}")
+                    resultado = medir_cajas(directorio, cajas, args.ventas, args.backend, con_bitacora)
+                    resultados.append({'bitacora': con_bitacora, **resultado})
+                    os.chdir(origen)
+    finally:
+        os.chdir(origen)
+    print(json.dumps({'backend': args.backend, 'resultados': resultados}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
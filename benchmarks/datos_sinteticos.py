@@ -0,0 +1,75 @@
+"""Genera un inventario y un historial de pedidos sintéticos para las mediciones.
+
+Uso::
+
+    python -m benchmarks.datos_sinteticos --pedidos 2000000 --productos 5000 --destino /tmp/bench
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from almacenamiento import COLUMNAS_PEDIDOS, INVENTARIO_FILE, PEDIDOS_FILE
+
+VENDEDORES = ['V01', 'V02', 'V03', 'V04', 'V05', 'V06']
+CATEGORIAS = ['Material', 'Accesorio', 'Equipo', 'Componente']
+
+
+def generar_inventario(num_productos, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame({
+        'ID': [f"S{i:06d}" for i in range(num_productos)],
+        'Producto': [f"Producto Sintético {i}" for i in range(num_productos)],
+        'Stock_Actual': rng.integers(0, 5000, num_productos),
+        'Precio': np.round(rng.uniform(0.5, 500.0, num_productos), 2),
+        'Categoría': rng.choice(CATEGORIAS, num_productos),
+    })
+
+
+def generar_pedidos(num_lineas, df_inventario, dias=365, semilla=0):
+    """Líneas de pedido en orden cronológico, como las anexa la aplicación."""
+    rng = np.random.default_rng(semilla)
+    productos = rng.integers(0, len(df_inventario), num_lineas)
+    cantidades = rng.integers(1, 20, num_lineas)
+    montos = np.round(cantidades * df_inventario['Precio'].to_numpy()[productos], 2)
+    inicio = pd.Timestamp('2025-01-01')
+    minutos = np.sort(rng.integers(0, dias * 24 * 60, num_lineas))
+    fechas = (inicio + pd.to_timedelta(minutos, unit='min')).strftime('%Y-%m-%d %H:%M')
+    facturas = np.char.add(np.char.add('facturas/F', (np.arange(num_lineas) // 3).astype(str)), '.pdf')
+    return pd.DataFrame({
+        'ID_Pedido': np.char.add('P', np.arange(num_lineas).astype(str)),
+        'Fecha': fechas,
+        'Producto': df_inventario['Producto'].to_numpy()[productos],
+        'Cantidad': cantidades,
+        'Monto_Neto': montos,
+        'Monto_Total': montos,
+        'Vendedor': rng.choice(VENDEDORES, num_lineas),
+        'Factura_Ruta': facturas,
+    })[COLUMNAS_PEDIDOS]
+
+
+def escribir(destino, num_lineas, num_productos, semilla=0):
+    """Escribe inventario.csv y pedidos.csv sintéticos en ``destino``; devuelve sus rutas."""
+    os.makedirs(destino, exist_ok=True)
+    inventario = generar_inventario(num_productos, semilla)
+    ruta_inventario = os.path.join(destino, INVENTARIO_FILE)
+    ruta_pedidos = os.path.join(destino, PEDIDOS_FILE)
+    inventario.to_csv(ruta_inventario, index=False)
+    generar_pedidos(num_lineas, inventario, semilla=semilla).to_csv(ruta_pedidos, index=False)
+    return ruta_inventario, ruta_pedidos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Datos sintéticos para las mediciones de rendimiento.")
+    parser.add_argument('--pedidos', type=int, default=2_000_000)
+    parser.add_argument('--productos', type=int, default=5_000)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--destino', default='datos_bench')
+    args = parser.parse_args(argv)
+    rutas = escribir(args.destino, args.pedidos, args.productos, args.semilla)
+    print(f"Escritos {args.productos} productos y {args.pedidos} líneas de pedido: {', '.join(rutas)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Mide el tiempo hasta la primera pantalla y el costo de cada recarga de ``app.py``.
+
+Cada corrida es un proceso nuevo (arranque en frío) que ejecuta la aplicación
+con ``streamlit.testing.v1.AppTest`` sobre datos sintéticos:
+
+* ``importar_streamlit_s``: importar Streamlit, igual para cualquier versión de la app.
+* ``primera_recarga_s``: primera ejecución completa del script (imports de la
+  app, recursos compartidos y la pestaña de venta), es decir, el tiempo hasta
+  la primera pantalla.
+* ``recarga_ms``: p50/p95 de las recargas siguientes sin interacción, según
+  el span ``rerun`` del diagnóstico (solo el script, sin la espera de AppTest).
+* ``modulos_pesados``: cuáles de matplotlib, fpdf y google.genai quedaron
+  cargados tras la primera pantalla.
+
+Uso::
+
+    python -m benchmarks.interfaz --pedidos 100000 --corridas 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks import datos_sinteticos
+from benchmarks.arranque import rss_mb
+from diagnostico import TOTAL_RERUN
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULOS_PESADOS = ['matplotlib', 'fpdf', 'google.genai']
+
+
+def medir_interfaz(destino, recargas):
+    """Arranca la app en ``destino`` e imprime el resultado en JSON."""
+    os.chdir(destino)
+    os.environ.setdefault('MARKETING_IA_CLIENTE', 'local')
+    ruta_log = os.path.join(destino, 'diagnostico_interfaz.jsonl')
+    if os.path.exists(ruta_log):
+        os.remove(ruta_log)
+    os.environ.update(DIAGNOSTICO_ACTIVO='1', DIAGNOSTICO_LOG=ruta_log)
+    inicio = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    importar_streamlit = time.perf_counter() - inicio
+
+    at = AppTest.from_file(os.path.join(RAIZ, 'app.py'), default_timeout=600)
+    at.secrets['GEMINI_API_KEY'] = ''  # Sin clave: la IA usa el cliente local
+    inicio = time.perf_counter()
+    at.run()
+    primera = time.perf_counter() - inicio
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    cargados = {m: m in sys.modules for m in MODULOS_PESADOS}
+
+    for _ in range(recargas):
+        at.run()
+    with open(ruta_log, encoding='utf-8') as f:
+        tiempos = [json.loads(linea)['spans'][TOTAL_RERUN]['ms'] for linea in f][1:]  # Sin la primera pantalla
+    p50, p95 = np.percentile(tiempos, [50, 95])
+    print(json.dumps({'importar_streamlit_s': importar_streamlit, 'primera_recarga_s': primera,
+                      'recarga_ms': {'p50': p50, 'p95': p95}, 'modulos_pesados': cargados, 'rss_mb': rss_mb()}))
+
+
+def _corrida(destino, recargas):
+    salida = subprocess.run([sys.executable, '-m', 'benchmarks.interfaz', '--medir', destino, '--recargas', str(recargas)],
+                            check=True, capture_output=True, text=True, cwd=RAIZ).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tiempo hasta la primera pantalla y costo por recarga de la app.")
+    parser.add_argument('--pedidos', type=int, default=100_000)
+    parser.add_argument('--productos', type=int, default=1_000)
+    parser.add_argument('--corridas', type=int, default=3, help="Procesos nuevos medidos (se informa la mediana).")
+    parser.add_argument('--recargas', type=int, default=20)
+    parser.add_argument('--medir', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.medir:
+        medir_interfaz(args.medir, args.recargas)
+        return
+
+    with tempfile.TemporaryDirectory() as destino:
+        datos_sinteticos.escribir(destino, args.pedidos, args.productos)
+        corridas = [_corrida(destino, args.recargas) for _ in range(args.corridas)]
+    resultados = {
+        'corridas': corridas,
+        'mediana': {
+            'importar_streamlit_s': float(np.median([c['importar_streamlit_s'] for c in corridas])),
+            'primera_recarga_s': float(np.median([c['primera_recarga_s'] for c in corridas])),
+            'recarga_p50_ms': float(np.median([c['recarga_ms']['p50'] for c in corridas])),
+        },
+        'modulos_pesados': corridas[-1]['modulos_pesados'],
+    }
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""Suite de rendimiento de las funciones críticas sobre datos sintéticos.
+
+Para cada tamaño (productos × líneas de pedido) mide latencia (p50/p90/p99),
+rendimiento y memoria pico (``tracemalloc``) de:
+
+* ``cargar_datos`` / ``guardar_datos`` del historial de pedidos.
+* ``procesar_venta``: ``MotorVentas.vender``, el núcleo de ``procesar_venta_multiple``
+  (confirmación en el inventario compartido, libro de pedidos, historial, KPIs y velocidades).
+* ``generar_documento_factura``.
+* ``alerta_predictiva``: ``VelocidadVentas.alerta`` (sucesora de ``obtener_alerta_predictiva``).
+* ``generar_graficas``: render de las cuatro gráficas sin caché.
+* ``generar_reporte_imprimible``: exportación del historial completo a CSV por bloques.
+* ``numerar_facturas``: números de factura de ``Numerador.siguiente`` (reservas por bloque incluidas).
+
+El resultado es JSON con los metadatos del entorno (commit incluido) para
+comparar corridas; ``--comparar base.json`` marca regresiones y termina con
+código 1 si alguna supera el umbral.
+
+Uso::
+
+    python -m benchmarks.suite --tamanos 1000:10000 10000:100000 --salida bench.json
+    python -m benchmarks.suite --tamanos 1000:10000 --comparar bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import datos_sinteticos
+
+TAMANOS_POR_DEFECTO = ['1000:10000', '10000:100000', '100000:1000000']
+REPETICIONES = 20
+UMBRAL_REGRESION = 0.20  # p50 un 20 % más lento que la base
+
+
+def _percentiles(latencias):
+    ms = np.asarray(latencias) * 1000
+    return {'p50': float(np.percentile(ms, 50)), 'p90': float(np.percentile(ms, 90)),
+            'p99': float(np.percentile(ms, 99)), 'min': float(ms.min()), 'max': float(ms.max())}
+
+
+def medir(nombre, funcion, repeticiones, unidades=1, unidad='operaciones', preparar=None):
+    """Ejecuta ``funcion`` ``repeticiones`` veces; ``preparar`` corre antes de cada una fuera del cronómetro.
+
+    Las latencias se toman sin ``tracemalloc`` (lo hace varias veces más
+    lento); la memoria pico sale de una ejecución adicional instrumentada.
+    """
+    def ejecutar():
+        argumento = preparar() if preparar else None
+        inicio = time.perf_counter()
+        funcion(argumento) if preparar else funcion()
+        return time.perf_counter() - inicio
+
+    latencias = [ejecutar() for _ in range(repeticiones)]
+    tracemalloc.start()
+    try:
+        ejecutar()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'caso': nombre,
+        'repeticiones': repeticiones,
+        'latencia_ms': _percentiles(latencias),
+        'rendimiento': {'unidad': unidad, 'por_segundo': unidades / float(np.median(latencias))},
+        'memoria_pico_mb': pico / 2**20,
+    }
+
+
+def correr_tamano(num_productos, num_lineas, repeticiones, semilla, directorio):
+    """Mide todos los casos para un tamaño; trabaja dentro de ``directorio``."""
+    from archivo_facturas import Archivo
+    from almacenamiento import AlmacenCSV, HistorialPedidos, cargar_datos, guardar_datos
+    from esquema import tipar_inventario, tipar_pedidos
+    from facturacion import generar_documento_factura, calcular_montos
+    from graficas import (grafica_tendencia, grafica_vendedores, grafica_stock_valorizado, grafica_stock_actual,
+                          figura_a_png)
+    from inventario_compartido import InventarioCompartido
+    from kpis import AgregadosKPI
+    from motor_ventas import MotorVentas
+    from numeracion import Numerador, SECUENCIA_FACTURAS
+    from prediccion import VelocidadVentas
+    from reportes import exportar_reporte, REPORTE_VENTAS
+
+    os.chdir(directorio)
+    rng = np.random.default_rng(semilla)
+    df_inventario = tipar_inventario(datos_sinteticos.generar_inventario(num_productos, semilla))
+    df_inventario['Stock_Actual'] = np.int32(10**6)  # Las ventas repetidas nunca agotan el stock
+    df_pedidos = tipar_pedidos(datos_sinteticos.generar_pedidos(num_lineas, df_inventario, semilla=semilla))
+    guardar_datos(df_inventario, 'inventario.csv')
+    guardar_datos(df_pedidos, 'pedidos.csv')
+    resultados = []
+    rep_pesadas = max(3, repeticiones // 5)
+
+    # 1. Persistencia
+    resultados.append(medir('cargar_datos', lambda: cargar_datos('pedidos.csv'), rep_pesadas, num_lineas, 'filas'))
+    resultados.append(medir('guardar_datos', lambda: guardar_datos(df_pedidos, 'pedidos_copia.csv'), rep_pesadas, num_lineas, 'filas'))
+
+    # 2. Venta completa de un carrito de 5 líneas
+    almacen = AlmacenCSV('inventario.csv', 'pedidos.csv', 'inventario_movimientos.csv', umbral_compactacion=10**9)
+    inventario = InventarioCompartido(almacen.cargar_inventario())
+    historial = HistorialPedidos(almacen.cargar_pedidos())
+    kpis = AgregadosKPI(historial.dataframe(), inventario.snapshot())
+    velocidades = VelocidadVentas(inventario.snapshot(), historial.dataframe())
+    numerador = Numerador('numeracion.db')
+    motor = MotorVentas(almacen, inventario, historial=historial, kpis=kpis, velocidades=velocidades, numerador=numerador)
+
+    def carrito():
+        filas = df_inventario.iloc[rng.integers(0, num_productos, 5)]
+        cantidades = rng.integers(1, 5, 5)
+        return pd.DataFrame({'ID': filas['ID'].to_numpy(), 'Producto': filas['Producto'].to_numpy(), 'Cantidad': cantidades,
+                             'Precio_Unitario': filas['Precio'].to_numpy(), 'Subtotal_Bruto': cantidades * filas['Precio'].to_numpy()})
+
+    resultados.append(medir('procesar_venta', lambda df_carrito: motor.vender(df_carrito, 'V01'),
+                            repeticiones, 1, 'ventas', preparar=carrito))
+
+    # 3. Factura PDF (render y guardado en el archivo)
+    archivo = Archivo('facturas')
+    df_factura = carrito()
+    info = {'Fecha': '2026-01-01 10:00', 'Vendedor': 'V01', **calcular_montos(df_factura['Subtotal_Bruto'].sum())}
+    resultados.append(medir('generar_documento_factura', lambda: generar_documento_factura(info, df_factura, 'FBENCH', archivo),
+                            repeticiones, 1, 'facturas'))
+
+    # 4. Alerta predictiva sobre todo el catálogo
+    snapshot = inventario.snapshot()
+    resultados.append(medir('alerta_predictiva', lambda: velocidades.alerta(snapshot), repeticiones, num_productos, 'productos'))
+
+    # 5. Gráficas (sin caché: el costo de una versión nueva de los datos)
+    def graficas():
+        for figura in (grafica_tendencia(kpis.ventas_por_dia(30)), grafica_vendedores(kpis.ventas_por_vendedor()),
+                       grafica_stock_valorizado(snapshot), grafica_stock_actual(snapshot)):
+            if figura is not None:
+                figura_a_png(figura)
+
+    resultados.append(medir('generar_graficas', graficas, rep_pesadas, 4, 'gráficas'))
+
+    # 6. Reporte imprimible de ventas
+    resultados.append(medir('generar_reporte_imprimible',
+                            lambda: exportar_reporte(REPORTE_VENTAS, almacen, snapshot, 'reporte', 'csv'),
+                            rep_pesadas, len(historial), 'filas'))
+
+    # 7. Numeración de facturas
+    def numerar():
+        for _ in range(1000):
+            numerador.siguiente(SECUENCIA_FACTURAS)
+
+    resultados.append(medir('numerar_facturas', numerar, repeticiones, 1000, 'números'))
+
+    for resultado in resultados:
+        resultado.update({'productos': num_productos, 'lineas': num_lineas})
+    return resultados
+
+
+def metadatos(semilla):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'fecha': datetime.now().isoformat(timespec='seconds'), 'semilla': semilla,
+            'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+            'plataforma': platform.platform()}
+
+
+def comparar(actual, base, umbral=UMBRAL_REGRESION):
+    """Regresiones de p50 frente a una corrida anterior: lista de ``(caso, productos, lineas, razon)``."""
+    anteriores = {(r['caso'], r['productos'], r['lineas']): r for r in base['resultados']}
+    regresiones = []
+    for r in actual['resultados']:
+        previo = anteriores.get((r['caso'], r['productos'], r['lineas']))
+        if previo is None:
+            continue
+        razon = r['latencia_ms']['p50'] / max(previo['latencia_ms']['p50'], 1e-9)
+        r['frente_a_base'] = razon
+        if razon > 1 + umbral:
+            regresiones.append((r['caso'], r['productos'], r['lineas'], razon))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suite de rendimiento con datos sintéticos.")
+    parser.add_argument('--tamanos', nargs='+', default=TAMANOS_POR_DEFECTO, metavar='PRODUCTOS:LINEAS')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', help="Archivo JSON de resultados (por defecto, salida estándar).")
+    parser.add_argument('--comparar', help="JSON de una corrida anterior para detectar regresiones.")
+    parser.add_argument('--umbral', type=float, default=UMBRAL_REGRESION)
+    args = parser.parse_args(argv)
+
+    informe = {'metadatos': metadatos(args.semilla), 'resultados': []}
+    directorio_original = os.getcwd()
+    for tamano in args.tamanos:
+        num_productos, num_lineas = (int(x) for x in tamano.split(':'))
+        with tempfile.TemporaryDirectory() as directorio:
+            try:
+                informe['resultados'] += correr_tamano(num_productos, num_lineas, args.repeticiones, args.semilla, directorio)
+            finally:
+                os.chdir(directorio_original)
+        print(f"✓ {num_productos} productos × {num_lineas} líneas", file=sys.stderr)
+
+    regresiones = []
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            regresiones = comparar(informe, json.load(f), args.umbral)
+        informe['regresiones'] = [dict(zip(('caso', 'productos', 'lineas', 'razon'), r)) for r in regresiones]
+
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+    for caso, productos, lineas, razon in regresiones:
+        print(f"⚠ Regresión en {caso} ({productos}×{lineas}): p50 ×{razon:.2f}", file=sys.stderr)
+    return 1 if regresiones else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""Bitácora de escritura anticipada (WAL) de las ventas.
+
+Antes de tocar el almacén, cada venta (sus líneas de pedido y movimientos de
+stock) se anexa a la bitácora y se sincroniza con ``fsync``. Las escrituras
+se agrupan (*group commit*): mientras un hilo sincroniza, las ventas que
+llegan se acumulan y el siguiente ``fsync`` las lleva a disco todas juntas.
+En una ráfaga de cobros cada venta espera como mucho dos sincronizaciones,
+sin importar cuántas cajas cobren a la vez.
+
+Si la venta no llega a aplicarse en el almacén (el ``persistir`` falla), se
+anota su anulación, salvo que el almacén avise con ``VentaIncompleta`` que
+una parte quedó en disco: esa venta sigue pendiente. Al arrancar,
+``recuperar`` aplica las ventas de la bitácora que el almacén no tenga
+completas, omitiendo las partes que sí llegaron, y descarta la bitácora. Mientras el proceso corre, la bitácora se
+rota al superar ``TAMANO_BITACORA``: los archivos viejos se borran en cuanto
+sus ventas están aplicadas y el almacén sincronizado.
+
+Cada proceso escribe sus propios archivos (``bitacora/ventas-<pid>-....wal``)
+y los mantiene bloqueados con ``flock``; la recuperación solo toma los de
+procesos que ya terminaron. Sin ``fcntl`` (Windows) se recuperan todos, así
+que allí solo debe escribir un proceso a la vez.
+"""
+import atexit
+import contextlib
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+
+import pandas as pd
+
+from almacenamiento import StockInsuficiente, VentaIncompleta, COLUMNAS_PEDIDOS, COLUMNAS_MOVIMIENTOS
+from esquema import FORMATO_FECHA, tipar_pedidos, concatenar
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo de archivos entre procesos
+    fcntl = None
+
+BITACORA_DIR = 'bitacora'
+TAMANO_BITACORA = 16 * 1024 * 1024  # Bytes antes de rotar a un archivo nuevo
+
+_MARCO = struct.Struct('>II')  # Longitud y CRC32 de cada registro
+
+
+def _columnas(df):
+    """DataFrame como dict de listas nativas (JSON), con las fechas como texto."""
+    return {c: (df[c].dt.strftime(FORMATO_FECHA) if pd.api.types.is_datetime64_any_dtype(df[c]) else df[c]).tolist()
+            for c in df.columns}
+
+
+def _sincronizar_directorio(directorio):
+    """fsync del directorio para que un archivo recién creado sobreviva a un corte (solo POSIX)."""
+    try:
+        fd = os.open(directorio, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class BitacoraVentas:
+    """WAL de ventas del proceso con group commit. ``sincronizar`` lleva el almacén a disco (p. ej. ``Almacen.sincronizar``)."""
+
+    def __init__(self, directorio=BITACORA_DIR, sincronizar=None, tamano_maximo=TAMANO_BITACORA):
+        self.directorio = directorio
+        self.tamano_maximo = tamano_maximo
+        self._sincronizar_almacen = sincronizar
+        self._prefijo = f"ventas-{os.getpid()}-{time.time_ns()}"
+        self._cond = threading.Condition()
+        self._lote = {'datos': [], 'hecho': False, 'error': None, 'generacion': None}
+        self._escribiendo = False
+        self._pendientes = Counter()  # generación -> ventas escritas y aún no aplicadas
+        self._archivos = {}  # generación -> descriptor abierto
+        self._generacion = -1
+        self.eventos = 0
+        self.sincronizaciones = 0
+        os.makedirs(directorio, exist_ok=True)
+        self._rotar()
+        atexit.register(self.cerrar)
+
+    def _ruta(self, generacion):
+        return os.path.join(self.directorio, f"{self._prefijo}-{generacion:06d}.wal")
+
+    def _rotar(self):
+        """Abre el archivo de la generación siguiente. Solo lo llama quien escribe."""
+        generacion = self._generacion + 1
+        fd = os.open(self._ruta(generacion), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)  # Marca el archivo como de un proceso vivo
+        _sincronizar_directorio(self.directorio)
+        with self._cond:
+            self._archivos[generacion] = fd
+            self._generacion = generacion
+
+    # --- GROUP COMMIT ---
+
+    def _escribir(self, registro):
+        """Anexa ``registro`` (dict) y vuelve cuando está en disco. Devuelve la generación donde quedó."""
+        carga = json.dumps(registro, ensure_ascii=False).encode('utf-8')
+        datos = _MARCO.pack(len(carga), zlib.crc32(carga)) + carga
+        with self._cond:
+            lote = self._lote
+            lote['datos'].append(datos)
+            while not lote['hecho']:
+                if self._escribiendo:
+                    self._cond.wait()
+                    continue
+                # Este hilo escribe y sincroniza todo lo acumulado, incluidas ventas de otros hilos
+                self._escribiendo = True
+                actual, self._lote = self._lote, {'datos': [], 'hecho': False, 'error': None, 'generacion': None}
+                generacion = self._generacion
+                fd = self._archivos[generacion]
+                self._cond.release()
+                try:
+                    os.write(fd, b''.join(actual['datos']))
+                    os.fsync(fd)
+                    if os.fstat(fd).st_size >= self.tamano_maximo:
+                        self._rotar()
+                except BaseException as e:
+                    actual['error'] = e
+                finally:
+                    self._cond.acquire()
+                    actual.update(hecho=True, generacion=generacion)
+                    if actual['error'] is None:
+                        self._pendientes[generacion] += len(actual['datos'])
+                        self.eventos += len(actual['datos'])
+                        self.sincronizaciones += 1
+                    self._escribiendo = False
+                    self._cond.notify_all()
+            if lote['error'] is not None:
+                raise lote['error']
+            return lote['generacion']
+
+    def _terminar(self, generacion):
+        """Marca aplicada una venta; si su generación ya rotó y no quedan pendientes, hace el punto de control."""
+        with self._cond:
+            self._pendientes[generacion] -= 1
+            viejas = [g for g in self._archivos if g < self._generacion]
+            if not viejas or any(self._pendientes[g] > 0 for g in viejas):
+                return
+            descriptores = [(g, self._archivos.pop(g)) for g in viejas]
+        if self._sincronizar_almacen is not None:
+            self._sincronizar_almacen()
+        for g, fd in descriptores:
+            os.close(fd)
+            os.remove(self._ruta(g))
+            del self._pendientes[g]
+
+    # --- VENTAS ---
+
+    @contextlib.contextmanager
+    def transaccion(self, lineas_pedido, df_movimientos):
+        """Registra la venta en disco y luego ejecuta el bloque que la aplica al almacén.
+
+        Si el bloque lanza una excepción la venta se anota como anulada y no
+        se recupera al arrancar. Con ``VentaIncompleta`` queda pendiente: la
+        bitácora se conserva al cerrar y la recuperación completa la venta.
+        """
+        evento = uuid.uuid4().hex
+        generacion = self._escribir({'id': evento, 'lineas': _columnas(lineas_pedido[COLUMNAS_PEDIDOS]),
+                                     'movimientos': _columnas(df_movimientos[COLUMNAS_MOVIMIENTOS])})
+        try:
+            yield
+        except VentaIncompleta:
+            raise
+        except BaseException:
+            try:
+                self._terminar(self._escribir({'id': evento, 'anulada': True}))
+            finally:
+                self._terminar(generacion)
+            raise
+        self._terminar(generacion)
+
+    def cerrar(self):
+        """Cierra la bitácora; sus archivos se borran si todas las ventas quedaron aplicadas.
+
+        Si alguna venta sigue en curso los archivos se conservan y la próxima
+        recuperación los revisa.
+        """
+        with self._cond:
+            descriptores, self._archivos = self._archivos, {}
+            aplicadas = not any(n > 0 for n in self._pendientes.values())
+        if not descriptores:
+            return
+        if aplicadas and self._sincronizar_almacen is not None:
+            self._sincronizar_almacen()
+        for g, fd in descriptores.items():
+            os.close(fd)
+            if aplicadas:
+                os.remove(self._ruta(g))
+
+
+# --- RECUPERACIÓN ---
+
+def _leer_registros(ruta):
+    """Registros completos del archivo; se detiene en el primero cortado o corrupto (una escritura interrumpida)."""
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    posicion = 0
+    while posicion + _MARCO.size <= len(contenido):
+        longitud, crc = _MARCO.unpack_from(contenido, posicion)
+        carga = contenido[posicion + _MARCO.size:posicion + _MARCO.size + longitud]
+        if len(carga) < longitud or zlib.crc32(carga) != crc:
+            break
+        yield json.loads(carga)
+        posicion += _MARCO.size + longitud
+
+
+def _abandonada(ruta):
+    """Descriptor bloqueado de una bitácora cuyo proceso terminó, o ``None`` si su dueño sigue vivo."""
+    fd = os.open(ruta, os.O_RDONLY)
+    if fcntl is None:
+        return fd
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def recuperar(almacen, directorio=BITACORA_DIR):
+    """Aplica al almacén las ventas de las bitácoras de procesos terminados y las descarta.
+
+    Devuelve ``(lineas, resumen)``: las líneas de pedido de las ventas de esas
+    bitácoras que el almacén ya tenía completas o que se acaban de aplicar
+    (para regenerar facturas que no llegaron a crearse; las rechazadas no se
+    incluyen) y un dict con ``ventas``, ``aplicadas`` y ``rechazadas``.
+    """
+    resumen = {'ventas': 0, 'aplicadas': 0, 'rechazadas': 0}
+    abiertas = [(ruta, fd) for ruta in sorted(glob.glob(os.path.join(directorio, '*.wal')))
+                for fd in [_abandonada(ruta)] if fd is not None]
+    try:
+        eventos, anuladas = {}, set()
+        for ruta, _ in abiertas:
+            for registro in _leer_registros(ruta):
+                if registro.get('anulada'):
+                    anuladas.add(registro['id'])
+                else:
+                    eventos[registro['id']] = registro
+        vigentes = [(tipar_pedidos(pd.DataFrame(e['lineas'], columns=COLUMNAS_PEDIDOS)),
+                     pd.DataFrame(e['movimientos'], columns=COLUMNAS_MOVIMIENTOS))
+                    for evento_id, e in eventos.items() if evento_id not in anuladas]
+        resumen['ventas'] = len(vigentes)
+        registradas = []
+        if vigentes:
+            existentes = almacen.pedidos_existentes(concatenar([l for l, _ in vigentes])['ID_Pedido'].astype(str))
+            con_movimientos = almacen.referencias_con_movimientos(
+                pd.concat([m['Referencia'] for _, m in vigentes]).astype(str).unique())
+            for lineas_venta, movimientos in vigentes:
+                faltantes = lineas_venta[~lineas_venta['ID_Pedido'].astype(str).isin(existentes)]
+                if len(faltantes):
+                    movimientos = movimientos[~movimientos['Referencia'].astype(str).isin(con_movimientos)]
+                    try:
+                        almacen.registrar_lote(faltantes, movimientos)
+                    except StockInsuficiente:
+                        resumen['rechazadas'] += 1
+                        continue  # Sin pedido en el almacén no debe emitirse su factura
+                    resumen['aplicadas'] += 1
+                registradas.append(lineas_venta)
+            almacen.sincronizar()
+        lineas = concatenar(registradas) if registradas else tipar_pedidos(pd.DataFrame(columns=COLUMNAS_PEDIDOS))
+    finally:
+        for ruta, fd in abiertas:
+            os.close(fd)
+    for ruta, _ in abiertas:
+        os.remove(ruta)
+    return lineas, resumen
@@ -0,0 +1,198 @@
+"""Bus de eventos compartido entre sesiones (publicación/suscripción).
+
+Cada tema (``ventas``, ``inventario``, ``area/<ÁREA>``) guarda sus últimos
+``CAPACIDAD_TEMA`` eventos en un búfer circular. Todos los eventos llevan una
+``secuencia`` global creciente: una sesión recuerda la última que vio y en
+cada recarga pide solo lo nuevo con ``leer(temas, desde=cursor)``. Si el
+búfer ya descartó eventos posteriores al cursor, ``leer`` lo indica para que
+la sesión reconstruya su estado desde cero.
+
+Dos implementaciones con la misma interfaz:
+
+* ``BusMemoria``: en el proceso; lo comparten las sesiones de un servidor.
+* ``BusSQLite``: en ``eventos.db``; lo comparten también otros procesos
+  (p. ej. la importación POS publica sus lotes y la aplicación los muestra).
+
+El backend se elige con la variable de entorno ``BUS_EVENTOS`` (``memoria``
+o ``sqlite``).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from heapq import merge
+
+BUS_FILE = 'eventos.db'
+CAPACIDAD_TEMA = 200  # Eventos retenidos por tema
+
+TEMA_VENTAS = 'ventas'
+TEMA_INVENTARIO = 'inventario'
+PREFIJO_AREA = 'area/'  # Suscribirse a un prefijo terminado en '/' recibe todos sus temas
+
+
+def tema_area(area):
+    return f"{PREFIJO_AREA}{area.upper()}"
+
+
+def _coincide(tema, temas):
+    return any(tema == t or (t.endswith('/') and tema.startswith(t)) for t in temas)
+
+
+class BusEventos:
+    """Interfaz común de los buses de eventos."""
+
+    def publicar(self, tema, **datos):
+        """Añade un evento a ``tema`` y devuelve su secuencia. ``datos`` debe ser serializable en JSON."""
+        raise NotImplementedError
+
+    def leer(self, temas, desde=0):
+        """Eventos de ``temas`` con secuencia mayor que ``desde``, en orden.
+
+        Devuelve ``(eventos, cursor, incompleta)``: cada evento es un dict
+        ``{'secuencia', 'tema', 'momento', 'datos'}``, ``cursor`` es el valor
+        para la próxima lectura e ``incompleta`` indica que el búfer descartó
+        eventos que quien lee no llegó a ver.
+        """
+        raise NotImplementedError
+
+    def ultimo(self):
+        """Secuencia del último evento publicado (0 si no hay ninguno)."""
+        raise NotImplementedError
+
+
+class BusMemoria(BusEventos):
+    """Búferes circulares en memoria, compartidos por los hilos del proceso."""
+
+    def __init__(self, capacidad=CAPACIDAD_TEMA, reloj=time.time):
+        self.capacidad = capacidad
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self._temas = {}  # tema -> deque de eventos
+        self._descartados = {}  # tema -> secuencia del último evento descartado
+        self._secuencia = 0
+
+    def publicar(self, tema, **datos):
+        with self._lock:
+            self._secuencia += 1
+            cola = self._temas.setdefault(tema, deque(maxlen=self.capacidad))
+            if len(cola) == self.capacidad:
+                self._descartados[tema] = cola[0]['secuencia']
+            cola.append({'secuencia': self._secuencia, 'tema': tema, 'momento': self._reloj(), 'datos': datos})
+            return self._secuencia
+
+    def leer(self, temas, desde=0):
+        with self._lock:
+            nombres = [t for t in self._temas if _coincide(t, temas)]
+            incompleta = any(self._descartados.get(t, 0) > desde for t in nombres)
+            nuevos = []
+            for tema in nombres:
+                # Solo se recorre lo posterior al cursor, desde el final del búfer
+                recientes = []
+                for evento in reversed(self._temas[tema]):
+                    if evento['secuencia'] <= desde:
+                        break
+                    recientes.append(evento)
+                nuevos.append(reversed(recientes))
+            cursor = self._secuencia
+        eventos = list(merge(*nuevos, key=lambda e: e['secuencia']))
+        return eventos, max(cursor, desde), incompleta
+
+    def ultimo(self):
+        return self._secuencia
+
+
+class BusSQLite(BusEventos):
+    """Búferes circulares en una tabla SQLite; sirven a varios procesos a la vez."""
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS eventos (
+            secuencia INTEGER PRIMARY KEY AUTOINCREMENT,
+            tema TEXT NOT NULL,
+            momento REAL NOT NULL,
+            datos TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_eventos_tema ON eventos(tema, secuencia);
+        CREATE TABLE IF NOT EXISTS temas (
+            tema TEXT PRIMARY KEY,
+            descartados_hasta INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, ruta=BUS_FILE, capacidad=CAPACIDAD_TEMA, reloj=time.time):
+        self.ruta = ruta
+        self.capacidad = capacidad
+        self._reloj = reloj
+        self._local = threading.local()
+        self._conexion().executescript(self.ESQUEMA)
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Un corte puede perder los últimos avisos, no corromper la base
+            self._local.conn = conn
+        return conn
+
+    def publicar(self, tema, **datos):
+        conn = self._conexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            secuencia = conn.execute("INSERT INTO eventos (tema, momento, datos) VALUES (?, ?, ?)",
+                                     (tema, self._reloj(), json.dumps(datos, ensure_ascii=False))).lastrowid
+            fila = conn.execute("SELECT secuencia FROM eventos WHERE tema = ? ORDER BY secuencia DESC LIMIT 1 OFFSET ?",
+                                (tema, self.capacidad)).fetchone()
+            if fila is not None:
+                conn.execute("DELETE FROM eventos WHERE tema = ? AND secuencia <= ?", (tema, fila[0]))
+                conn.execute("INSERT INTO temas (tema, descartados_hasta) VALUES (?, ?) "
+                             "ON CONFLICT(tema) DO UPDATE SET descartados_hasta = excluded.descartados_hasta",
+                             (tema, fila[0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return secuencia
+
+    @staticmethod
+    def _filtro(temas):
+        exactos = [t for t in temas if not t.endswith('/')]
+        prefijos = [t for t in temas if t.endswith('/')]
+        condiciones = [f"tema IN ({', '.join('?' * len(exactos))})"] if exactos else []
+        condiciones += ["substr(tema, 1, ?) = ?"] * len(prefijos)
+        parametros = exactos + [v for p in prefijos for v in (len(p), p)]
+        return ' OR '.join(condiciones) or '0', parametros
+
+    def leer(self, temas, desde=0):
+        conn = self._conexion()
+        filtro, parametros = self._filtro(list(temas))
+        conn.execute("BEGIN")  # Eventos y descartes de la misma instantánea
+        try:
+            filas = conn.execute(f"SELECT secuencia, tema, momento, datos FROM eventos "
+                                 f"WHERE ({filtro}) AND secuencia > ? ORDER BY secuencia",
+                                 parametros + [desde]).fetchall()
+            descartados = conn.execute(f"SELECT MAX(descartados_hasta) FROM temas WHERE {filtro}", parametros).fetchone()[0]
+            cursor = self._ultimo(conn)
+        finally:
+            conn.execute("COMMIT")
+        eventos = [{'secuencia': s, 'tema': t, 'momento': m, 'datos': json.loads(d)} for s, t, m, d in filas]
+        return eventos, max(cursor, desde), (descartados or 0) > desde
+
+    @staticmethod
+    def _ultimo(conn):
+        fila = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'eventos'").fetchone()
+        return fila[0] if fila else 0
+
+    def ultimo(self):
+        return self._ultimo(self._conexion())
+
+
+def crear_bus(backend=None):
+    """Crea el bus configurado en ``BUS_EVENTOS`` (``memoria`` por defecto)."""
+    backend = (backend or os.environ.get('BUS_EVENTOS', 'memoria')).lower()
+    if backend == 'sqlite':
+        return BusSQLite(os.environ.get('BUS_EVENTOS_SQLITE', BUS_FILE))
+    if backend == 'memoria':
+        return BusMemoria()
+    raise ValueError(f"Backend del bus de eventos desconocido: {backend}")
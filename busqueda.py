@@ -0,0 +1,133 @@
+"""Índice de búsqueda de productos para el selector del carrito.
+
+Indexa ID, nombre y categoría de cada producto una sola vez; cada consulta
+devuelve los mejores N resultados sin recorrer el catálogo:
+
+* Índice invertido ``token -> posiciones`` (coincidencia exacta).
+* Vocabulario ordenado para coincidencias por prefijo (búsqueda binaria).
+* Índice de trigramas sobre las palabras del vocabulario para coincidencias
+  aproximadas (errores de tipeo), usado solo cuando un término no tiene
+  coincidencias exactas ni por prefijo.
+
+Las altas de productos se indexan de forma incremental. El stock no forma
+parte del índice: la etiqueta de cada resultado se arma al mostrarlo.
+"""
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+RESULTADOS_BUSQUEDA = 25
+MAX_EXPANSION_PREFIJO = 50  # Tokens del vocabulario considerados por prefijo
+SIMILITUD_MINIMA = 0.3  # Jaccard de trigramas para aceptar una coincidencia aproximada
+
+PUNTAJE_ID = 100.0
+PUNTAJE_EXACTO = 10.0
+PUNTAJE_PREFIJO = 5.0
+PUNTAJE_APROXIMADO = 2.0
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes."""
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    return re.findall(r'[a-z0-9]+', normalizar(texto))
+
+
+def trigramas(token):
+    relleno = f"  {token} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class IndiceProductos:
+    """Búsqueda por prefijo, token y aproximada sobre ID, nombre y categoría."""
+
+    def __init__(self, df_inventario):
+        self._lock = threading.Lock()
+        self._ids = []
+        self._id_normalizado = {}  # ID normalizado -> posición
+        self._postings = defaultdict(list)  # token -> posiciones
+        self._vocabulario = []  # Tokens ordenados
+        self._por_trigrama = defaultdict(set)  # trigrama -> tokens
+        for id_producto, producto, categoria in zip(df_inventario['ID'], df_inventario['Producto'], df_inventario['Categoría']):
+            self._indexar(id_producto, producto, categoria, ordenar=False)
+        self._vocabulario = sorted(self._postings)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _indexar(self, id_producto, producto, categoria, ordenar=True):
+        posicion = len(self._ids)
+        self._ids.append(id_producto)
+        self._id_normalizado[normalizar(id_producto)] = posicion
+        for token in set(tokenizar(id_producto) + tokenizar(producto) + tokenizar(categoria)):
+            if token not in self._postings:
+                if ordenar:
+                    bisect.insort(self._vocabulario, token)
+                if token.isalpha():  # Códigos y medidas no se buscan de forma aproximada
+                    for trigrama in trigramas(token):
+                        self._por_trigrama[trigrama].add(token)
+            self._postings[token].append(posicion)
+
+    def agregar(self, id_producto, producto, categoria):
+        """Indexa un producto nuevo (alta de inventario)."""
+        with self._lock:
+            self._indexar(id_producto, producto, categoria)
+
+    # --- CONSULTAS ---
+
+    def _coincidencias(self, termino):
+        """Puntaje por posición para un término de la consulta."""
+        puntajes = {}
+
+        def sumar(posiciones, puntaje):
+            for posicion in posiciones:
+                if puntajes.get(posicion, 0.0) < puntaje:
+                    puntajes[posicion] = puntaje
+
+        inicio = bisect.bisect_left(self._vocabulario, termino)
+        for token in self._vocabulario[inicio:inicio + MAX_EXPANSION_PREFIJO]:
+            if not token.startswith(termino):
+                break
+            sumar(self._postings[token], PUNTAJE_EXACTO if token == termino else PUNTAJE_PREFIJO)
+
+        if not puntajes and len(termino) >= 3:
+            buscados = trigramas(termino)
+            compartidos = defaultdict(int)
+            for trigrama in buscados:
+                for token in self._por_trigrama.get(trigrama, ()):
+                    compartidos[token] += 1
+            for token, comunes in compartidos.items():
+                similitud = comunes / (len(buscados) + len(trigramas(token)) - comunes)
+                if similitud >= SIMILITUD_MINIMA:
+                    sumar(self._postings[token], PUNTAJE_APROXIMADO * similitud)
+        return puntajes
+
+    def buscar(self, consulta, limite=RESULTADOS_BUSQUEDA):
+        """IDs de los ``limite`` mejores productos para ``consulta`` (todos sus términos deben coincidir).
+
+        Con la consulta vacía devuelve los primeros productos del catálogo.
+        """
+        with self._lock:
+            terminos = tokenizar(consulta)
+            if not terminos:
+                return self._ids[:limite]
+            total = None
+            for termino in terminos:
+                puntajes = self._coincidencias(termino)
+                if total is None:
+                    total = puntajes
+                else:
+                    total = {p: total[p] + s for p, s in puntajes.items() if p in total}
+                if not total:
+                    return []
+            exacto = self._id_normalizado.get(normalizar(consulta).strip())
+            if exacto is not None:
+                total[exacto] = total.get(exacto, 0.0) + PUNTAJE_ID
+            mejores = heapq.nsmallest(limite, total.items(), key=lambda par: (-par[1], par[0]))
+            return [self._ids[posicion] for posicion, _ in mejores]
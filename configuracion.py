@@ -0,0 +1,12 @@
+"""Parámetros de negocio y de tema compartidos por la interfaz y los servicios."""
+
+STOCK_ALERTA = 50 
+TASA_ITBMS = 0.07 
+UMBRAL_DESCUENTO = 1000 
+TASA_DESCUENTO = 0.10
+
+
+# --- TEMA VISUAL (interfaz y gráficas) ---
+DEFAULT_COLOR = '#34495e' 
+DARK_BACKGROUND = '#2c3e50' 
+DARK_TEXT = '#ecf0f1' 
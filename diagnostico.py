@@ -0,0 +1,151 @@
+"""Instrumentación ligera de cada recarga (rerun) de la interfaz.
+
+Cada interacción vuelve a ejecutar ``app.py`` completo; para saber qué bloque
+hace lenta una recarga, las secciones de la página y las funciones de negocio
+se envuelven en *spans* con nombre:
+
+* ``span(nombre)``: administrador de contexto para un bloque.
+* ``instrumentar(nombre)``: decorador para una función.
+
+Por recarga se acumulan, por span, el tiempo de pared, el número de llamadas
+y la variación de memoria (``tracemalloc``, opcional porque hace más lenta
+toda la ejecución). Al cerrar la recarga los totales pasan a ventanas móviles
+(p50/p95/p99 en ``resumen``) y, si hay ``ruta_log``, se anexan como una línea
+JSON al registro estructurado.
+
+Desactivado, ``span`` devuelve un contexto nulo compartido e ``instrumentar``
+devuelve la función sin envolver: el costo es prácticamente cero.
+"""
+import contextlib
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+VENTANA_DIAGNOSTICO = 200  # Recargas consideradas en los percentiles
+DIAGNOSTICO_LOG = 'diagnostico.jsonl'
+TOTAL_RERUN = 'rerun'  # Span implícito con la duración completa de la recarga
+
+_NULO = contextlib.nullcontext()
+
+
+class Diagnostico:
+    """Colector de spans del proceso; cada hilo (sesión de Streamlit) lleva su propia recarga."""
+
+    def __init__(self, activo=False, memoria=False, ruta_log=None, ventana=VENTANA_DIAGNOSTICO):
+        self.activo = activo
+        self.memoria = activo and memoria
+        self.ruta_log = ruta_log
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tiempos = defaultdict(lambda: deque(maxlen=ventana))  # span -> ms por recarga
+        self._llamadas = defaultdict(lambda: deque(maxlen=ventana))
+        self._memoria = defaultdict(lambda: deque(maxlen=ventana))  # span -> KiB por recarga
+        self.recargas = 0
+        if self.memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # --- CICLO DE LA RECARGA ---
+
+    def iniciar_rerun(self, sesion=None):
+        """Abre la recarga del hilo actual; una anterior sin cerrar (``st.rerun``) se cierra como interrumpida."""
+        if not self.activo:
+            return
+        if getattr(self._local, 'rerun', None) is not None:
+            self.cerrar_rerun(interrumpido=True)
+        self._local.rerun = {'sesion': sesion, 'inicio': time.perf_counter(), 'memoria': self._memoria_actual(),
+                             'spans': defaultdict(lambda: [0.0, 0, 0])}
+
+    def cerrar_rerun(self, interrumpido=False):
+        """Vuelca los spans de la recarga a las ventanas móviles y al registro."""
+        rerun = getattr(self._local, 'rerun', None)
+        if not self.activo or rerun is None:
+            return
+        self._local.rerun = None
+        spans = rerun['spans']
+        spans[TOTAL_RERUN] = [time.perf_counter() - rerun['inicio'], 1, self._memoria_actual() - rerun['memoria']]
+        with self._lock:
+            self.recargas += 1
+            for nombre, (segundos, llamadas, memoria) in spans.items():
+                self._tiempos[nombre].append(segundos * 1000)
+                self._llamadas[nombre].append(llamadas)
+                self._memoria[nombre].append(memoria / 1024)
+            if self.ruta_log:
+                registro = {
+                    'fecha': datetime.now().isoformat(timespec='milliseconds'),
+                    'sesion': rerun['sesion'],
+                    'interrumpido': interrumpido,
+                    'spans': {nombre: {'ms': round(s * 1000, 3), 'llamadas': n,
+                                       'memoria_kib': round(m / 1024, 1) if self.memoria else None}
+                              for nombre, (s, n, m) in spans.items()},
+                }
+                with open(self.ruta_log, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+    # --- SPANS ---
+
+    def _memoria_actual(self):
+        return tracemalloc.get_traced_memory()[0] if self.memoria else 0
+
+    @contextlib.contextmanager
+    def _span(self, nombre):
+        rerun = getattr(self._local, 'rerun', None)
+        if rerun is None:  # Fuera de una recarga (p. ej. hilos de fondo): no se mide
+            yield
+            return
+        memoria = self._memoria_actual()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            acumulado = rerun['spans'][nombre]
+            acumulado[0] += time.perf_counter() - inicio
+            acumulado[1] += 1
+            acumulado[2] += self._memoria_actual() - memoria
+
+    def span(self, nombre):
+        """Mide el bloque ``with`` bajo ``nombre`` (se acumula si se repite en la recarga)."""
+        return self._span(nombre) if self.activo else _NULO
+
+    def instrumentar(self, nombre=None):
+        """Decorador: mide cada llamada a la función como un span."""
+        def decorador(funcion):
+            if not self.activo:
+                return funcion
+            nombre_span = nombre or funcion.__name__
+
+            @functools.wraps(funcion)
+            def envoltura(*args, **kwargs):
+                with self._span(nombre_span):
+                    return funcion(*args, **kwargs)
+            return envoltura
+        return decorador
+
+    # --- LECTURAS PARA EL PANEL ---
+
+    def resumen(self):
+        """Percentiles móviles por span (ms), llamadas y memoria por recarga, del más lento al más rápido."""
+        with self._lock:
+            datos = {nombre: (np.array(self._tiempos[nombre]), np.array(self._llamadas[nombre]),
+                              np.array(self._memoria[nombre])) for nombre in self._tiempos}
+        filas = []
+        for nombre, (tiempos, llamadas, memoria) in datos.items():
+            p50, p95, p99 = np.percentile(tiempos, [50, 95, 99])
+            filas.append({'Span': nombre, 'Recargas': len(tiempos), 'Llamadas_Promedio': llamadas.mean(),
+                          'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+                          'Memoria_p50_KiB': np.median(memoria) if self.memoria else np.nan})
+        columnas = ['Span', 'Recargas', 'Llamadas_Promedio', 'p50_ms', 'p95_ms', 'p99_ms', 'Memoria_p50_KiB']
+        return pd.DataFrame(filas, columns=columnas).sort_values('p50_ms', ascending=False, ignore_index=True)
+
+    def reiniciar(self):
+        with self._lock:
+            self._tiempos.clear()
+            self._llamadas.clear()
+            self._memoria.clear()
+            self.recargas = 0
@@ -0,0 +1,87 @@
+"""Esquema tipado de los DataFrames de inventario y pedidos.
+
+Todo DataFrame que entra al sistema (CSV, instantánea Arrow, SQLite o una
+venta nueva) pasa por ``tipar_inventario`` o ``tipar_pedidos``:
+
+* ``Producto``, ``Vendedor``, ``Factura_Ruta`` y ``Categoría`` son categóricas:
+  cada línea guarda un código entero en lugar de repetir el texto.
+* ``Fecha`` es ``datetime64[ns]``, parseada una sola vez al ingresar.
+* Cantidades y stock son enteros de 32 bits.
+* Los montos son ``float64`` redondeados a centavos al ingresar. Cada valor
+  guardado queda al centavo, pero el binario no representa exactamente la
+  mayoría de los centavos: una suma de muchas líneas puede diferir en
+  fracciones de centavo y debe redondearse al mostrarla. Es el mismo tipo
+  que la columna ``REAL`` de SQLite y que los montos de la factura.
+
+Los CSV conservan su formato de texto (``FORMATO_FECHA``).
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+FORMATO_FECHA = '%Y-%m-%d %H:%M'
+
+TIPOS_INVENTARIO = {
+    'Stock_Actual': 'int32',
+    'Categoría': 'category',
+}
+TIPOS_PEDIDOS = {
+    'Producto': 'category',
+    'Cantidad': 'int32',
+    'Vendedor': 'category',
+    'Factura_Ruta': 'category',
+}
+COLUMNAS_DINERO = ('Precio', 'Monto_Neto', 'Monto_Total')
+
+
+def parsear_fechas(valores):
+    """Convierte a ``datetime64[ns]``; prueba primero el formato de la aplicación."""
+    if pd.api.types.is_datetime64_any_dtype(valores):
+        return valores.astype('datetime64[ns]')
+    fechas = pd.to_datetime(valores, format=FORMATO_FECHA, errors='coerce')
+    fallidas = fechas.isna() & valores.notna()
+    if fallidas.any():
+        fechas[fallidas] = pd.to_datetime(valores[fallidas], format='mixed', errors='coerce')
+    return fechas.astype('datetime64[ns]')
+
+
+def formatear_fecha(valor):
+    """Fecha como texto ``FORMATO_FECHA`` (para CSV, SQLite y facturas)."""
+    return pd.Timestamp(valor).strftime(FORMATO_FECHA) if not isinstance(valor, str) else valor
+
+
+def _tipar(df, tipos):
+    conversiones = {}
+    for columna, tipo in tipos.items():
+        if columna in df.columns and df[columna].dtype != tipo:
+            conversiones[columna] = df[columna].astype(tipo)
+    for columna in COLUMNAS_DINERO:
+        if columna in df.columns:
+            conversiones[columna] = df[columna].astype(np.float64).round(2)
+    return df.assign(**conversiones) if conversiones else df
+
+
+def tipar_inventario(df):
+    return _tipar(df, TIPOS_INVENTARIO)
+
+
+def tipar_pedidos(df):
+    df = _tipar(df, TIPOS_PEDIDOS)
+    if 'Fecha' in df.columns and df['Fecha'].dtype != 'datetime64[ns]':
+        df = df.assign(Fecha=parsear_fechas(df['Fecha']))
+    return df
+
+
+def concatenar(frames):
+    """``pd.concat`` que conserva las columnas categóricas uniendo sus categorías.
+
+    ``pd.concat`` convierte a texto las categóricas con categorías distintas.
+    """
+    frames = [df for df in frames if len(df)] or list(frames[:1])
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    df = pd.concat(frames, ignore_index=True)
+    for columna, tipo in frames[0].dtypes.items():
+        if isinstance(tipo, pd.CategoricalDtype) and all(isinstance(f[columna].dtype, pd.CategoricalDtype) for f in frames):
+            df[columna] = union_categoricals([f[columna] for f in frames])
+    return df
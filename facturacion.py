@@ -0,0 +1,379 @@
+"""Gestión Documental: facturas PDF y su generación en segundo plano.
+
+``ServicioFacturas`` mantiene una cola acotada y un grupo de hilos que
+renderizan los PDF fuera del hilo del script de Streamlit. La venta se
+confirma de inmediato y la interfaz consulta el estado de la factura con su ID.
+Los PDF se guardan en el archivo de facturas (``archivo_facturas``). fpdf se
+importa con la primera factura que se dibuja, no al importar el módulo.
+"""
+import os
+import queue
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from functools import lru_cache
+
+import pandas as pd
+
+from configuracion import TASA_ITBMS, TASA_DESCUENTO, UMBRAL_DESCUENTO
+from esquema import formatear_fecha
+from archivo_facturas import archivo_por_defecto, FACTURAS_DIR
+from numeracion import numerador_por_defecto, formatear_factura, SECUENCIA_FACTURAS
+
+NUM_TRABAJADORES = 2
+CAPACIDAD_COLA = 256
+REINTENTOS_FACTURA = 3
+ESPERA_REINTENTO = 0.5  # Segundos, se duplica en cada reintento
+ESPERA_COLA = 0.1  # Segundos máximos que la caja espera si la cola está llena
+CACHE_FACTURAS_BYTES = 32 * 1024 * 1024  # PDF recientes que se conservan en memoria
+FACTURAS_POR_PARTE = 200  # Facturas por documento al exportar en ZIP (acota la memoria)
+
+# Estados de una factura
+PENDIENTE = 'pendiente'
+GENERANDO = 'generando'
+LISTA = 'lista'
+ERROR = 'error'
+
+
+def ruta_de_factura(factura_id):
+    """Referencia de la factura en el libro de pedidos (``Factura_Ruta``); el PDF vive en el archivo."""
+    return f"{FACTURAS_DIR}/{factura_id}.pdf"
+
+
+@lru_cache(maxsize=None)
+def clase_pdf():
+    """Clase del PDF de factura; se define (e importa fpdf) la primera vez que se usa."""
+    from fpdf import FPDF
+
+    class PDF(FPDF):
+        """Clase personalizada para el diseño del PDF (Factura)."""
+        def header(self):
+            self.set_font('Arial', 'B', 15)
+            self.cell(0, 10, 'ElectroPanamá Solutions - Factura Electrónica', 0, 1, 'C')
+            self.ln(5)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Arial', 'I', 8)
+            self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+
+    return PDF
+
+
+def calcular_montos(monto_subtotal):
+    """Aplica el descuento automático y el ITBMS al subtotal bruto de una venta."""
+    descuento = 0
+    if monto_subtotal >= UMBRAL_DESCUENTO:
+        descuento = round(monto_subtotal * TASA_DESCUENTO, 2)
+    monto_neto = monto_subtotal - descuento
+    monto_itbms = round(monto_neto * TASA_ITBMS, 2)
+    return {
+        'Descuento': descuento,
+        'Monto_Neto': monto_neto,
+        'Monto_ITBMS': monto_itbms,
+        'Monto_Total': round(monto_neto + monto_itbms, 2)
+    }
+
+
+def generar_documento_factura(pedido_info, df_carrito, factura_id=None, archivo=None):
+    """Crea un .pdf detallado que simula la factura electrónica y lo guarda en el archivo (Gestión Documental)."""
+    
+    factura_id = factura_id or formatear_factura(numerador_por_defecto().siguiente(SECUENCIA_FACTURAS))
+    archivo = archivo or archivo_por_defecto()
+    
+    pdf = nuevo_pdf()
+    dibujar_factura(pdf, factura_id, pedido_info, df_carrito)
+
+    # El índice apunta al PDF solo cuando está completo: nunca se sirve uno a medio escribir
+    archivo.guardar(factura_id, bytes(pdf.output()), fecha=pedido_info.get('Fecha'))
+    return ruta_de_factura(factura_id)
+
+
+def nuevo_pdf():
+    """Documento vacío con el diseño de factura; admite varias facturas (una por página)."""
+    pdf = clase_pdf()('P', 'mm', 'Letter')
+    pdf.set_auto_page_break(auto=True, margin=15)
+    return pdf
+
+
+def dibujar_factura(pdf, factura_id, pedido_info, df_carrito):
+    """Dibuja una factura en una página nueva de ``pdf``."""
+    pdf.add_page()
+    
+    # Colores y fuentes
+    pdf.set_fill_color(52, 73, 94) 
+    pdf.set_text_color(255, 255, 255) 
+    pdf.set_font('Arial', 'B', 12)
+    
+    pdf.cell(0, 8, 'DATOS DE LA TRANSACCIÓN', 1, 1, 'C', 1)
+    
+    pdf.set_text_color(0, 0, 0) 
+    pdf.set_font('Arial', '', 10)
+    pdf.cell(50, 6, 'FACTURA ID:', 0, 0)
+    pdf.cell(0, 6, factura_id, 0, 1)
+    pdf.cell(50, 6, 'FECHA:', 0, 0)
+    pdf.cell(0, 6, pedido_info['Fecha'], 0, 1)
+    pdf.cell(50, 6, 'VENDEDOR:', 0, 0)
+    pdf.cell(0, 6, pedido_info['Vendedor'], 0, 1)
+    pdf.ln(5)
+    
+    # Detalles del Producto (Tabla simple)
+    pdf.set_fill_color(220, 220, 220) 
+    pdf.set_font('Arial', 'B', 10)
+    pdf.cell(100, 7, 'Producto', 1, 0, 'C', 1)
+    pdf.cell(30, 7, 'Cantidad (Uds)', 1, 0, 'C', 1)
+    pdf.cell(35, 7, 'P. Unitario ($)', 1, 0, 'C', 1)
+    pdf.cell(30, 7, 'Subtotal ($)', 1, 1, 'C', 1)
+    
+    pdf.set_font('Arial', '', 10)
+    
+    # ITERACIÓN DE MÚLTIPLES PRODUCTOS DEL CARRITO
+    for index, item in df_carrito.iterrows():
+        pdf.cell(100, 6, item['Producto'], 1, 0)
+        pdf.cell(30, 6, str(item['Cantidad']), 1, 0, 'C')
+        pdf.cell(35, 6, f"{item['Precio_Unitario']:.2f}", 1, 0, 'R')
+        pdf.cell(30, 6, f"{item['Subtotal_Bruto']:.2f}", 1, 1, 'R')
+        
+    pdf.ln(8)
+    
+    # Resumen de Montos
+    ancho_label = 50
+    ancho_valor = 30
+    margen = 135 
+    
+    pdf.set_x(margen)
+    pdf.cell(ancho_label, 6, 'SUBTOTAL BRUTO:', 0, 0, 'L')
+    pdf.cell(ancho_valor, 6, f"${df_carrito['Subtotal_Bruto'].sum():.2f}", 0, 1, 'R')
+
+    if pedido_info['Descuento'] > 0:
+        pdf.set_x(margen)
+        pdf.cell(ancho_label, 6, f'DESCUENTO ({TASA_DESCUENTO*100:.0f}%):', 0, 0, 'L')
+        pdf.set_font('Arial', 'B', 10)
+        pdf.cell(ancho_valor, 6, f"-${pedido_info['Descuento']:.2f}", 0, 1, 'R')
+        pdf.set_font('Arial', '', 10) 
+    
+    pdf.set_x(margen)
+    pdf.cell(ancho_label, 6, 'SUBTOTAL NETO:', 0, 0, 'L')
+    pdf.cell(ancho_valor, 6, f"${pedido_info['Monto_Neto']:.2f}", 0, 1, 'R')
+    
+    pdf.set_x(margen)
+    pdf.cell(ancho_label, 6, f"ITBMS ({TASA_ITBMS*100:.0f}%):", 0, 0, 'L')
+    pdf.cell(ancho_valor, 6, f"${pedido_info['Monto_ITBMS']:.2f}", 0, 1, 'R')
+
+    pdf.set_font('Arial', 'B', 12)
+    pdf.set_x(margen)
+    pdf.set_fill_color(52, 73, 94) 
+    pdf.set_text_color(255, 255, 255) 
+    pdf.cell(ancho_label, 8, 'TOTAL A PAGAR:', 1, 0, 'L', 1)
+    pdf.cell(ancho_valor, 8, f"${pedido_info['Monto_Total']:.2f}", 1, 1, 'R', 1)
+
+
+class CacheFacturas:
+    """Caché LRU de los PDF abiertos recientemente, acotada en bytes.
+
+    Una factura compartida por varias líneas de pedido se lee una sola vez.
+    Cada entrada guarda la ubicación en el archivo: una factura regenerada
+    reemplaza a su copia vieja en lugar de convivir con ella.
+    """
+
+    def __init__(self, capacidad_bytes=CACHE_FACTURAS_BYTES, archivo=None):
+        self.capacidad_bytes = capacidad_bytes
+        self.archivo = archivo or archivo_por_defecto()
+        self._lock = threading.Lock()
+        self._datos = OrderedDict()  # factura_id -> (ubicación, bytes)
+        self._bytes = 0
+
+    def leer(self, factura_id):
+        ubicacion = self.archivo.ubicar(factura_id)
+        with self._lock:
+            entrada = self._datos.get(factura_id)
+            if entrada is not None and entrada[0] == ubicacion:
+                self._datos.move_to_end(factura_id)
+                return entrada[1]
+        datos = self.archivo.leer(factura_id, ubicacion)
+        with self._lock:
+            anterior = self._datos.pop(factura_id, None)
+            if anterior is not None:
+                self._bytes -= len(anterior[1])
+            self._datos[factura_id] = (ubicacion, datos)
+            self._bytes += len(datos)
+            while self._bytes > self.capacidad_bytes and len(self._datos) > 1:
+                _, (_, expulsado) = self._datos.popitem(last=False)
+                self._bytes -= len(expulsado)
+        return datos
+
+
+# --- REIMPRESIÓN Y EXPORTACIÓN MASIVA ---
+
+def agrupar_facturas(bloques_pedidos):
+    """Reconstruye las facturas a partir de bloques de líneas de pedido.
+
+    Las líneas de una misma factura son consecutivas en el libro de pedidos,
+    así que basta retener el último grupo de cada bloque hasta ver el
+    siguiente. Produce tuplas ``(factura_id, pedido_info, df_carrito)``.
+    """
+    pendiente = None
+    for bloque in bloques_pedidos:
+        if pendiente is not None:
+            bloque = pd.concat([pendiente, bloque], ignore_index=True)
+        rutas = bloque['Factura_Ruta']
+        ultima = rutas.iloc[-1] if len(bloque) else None
+        completos = bloque[rutas != ultima]
+        pendiente = bloque[rutas == ultima]
+        for ruta, lineas in completos.groupby('Factura_Ruta', sort=False):
+            yield _factura_desde_lineas(ruta, lineas)
+    if pendiente is not None and len(pendiente):
+        yield _factura_desde_lineas(pendiente['Factura_Ruta'].iloc[0], pendiente)
+
+
+def _factura_desde_lineas(ruta, lineas):
+    df_carrito = pd.DataFrame({
+        'Producto': lineas['Producto'].to_numpy(),
+        'Cantidad': lineas['Cantidad'].to_numpy(),
+        'Precio_Unitario': (lineas['Monto_Neto'] / lineas['Cantidad']).to_numpy(),
+        'Subtotal_Bruto': lineas['Monto_Neto'].to_numpy()
+    })
+    pedido_info = {
+        'Fecha': formatear_fecha(lineas['Fecha'].iloc[0]),
+        'Vendedor': str(lineas['Vendedor'].iloc[0]),
+        **calcular_montos(df_carrito['Subtotal_Bruto'].sum())
+    }
+    factura_id = os.path.splitext(os.path.basename(str(ruta)))[0]
+    return factura_id, pedido_info, df_carrito
+
+
+def exportar_facturas_pdf(facturas, destino):
+    """Escribe todas las facturas en un único PDF de varias páginas.
+
+    Usa una sola instancia de ``PDF``; su memoria crece con el número de
+    páginas, por lo que para selecciones grandes conviene ``exportar_facturas_zip``.
+    Devuelve el número de facturas exportadas.
+    """
+    pdf = nuevo_pdf()
+    total = 0
+    for factura_id, pedido_info, df_carrito in facturas:
+        dibujar_factura(pdf, factura_id, pedido_info, df_carrito)
+        total += 1
+    if total:
+        pdf.output(destino)
+    return total
+
+
+def exportar_facturas_zip(facturas, destino, facturas_por_parte=FACTURAS_POR_PARTE):
+    """Escribe las facturas en un ZIP, en documentos de ``facturas_por_parte`` páginas.
+
+    Cada parte reutiliza una instancia de ``PDF`` y se vuelca al ZIP en cuanto
+    se completa, de modo que la memoria queda acotada por el tamaño de la parte
+    sin importar cuántas facturas se seleccionen. Devuelve el número de facturas.
+    """
+    total = 0
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+        pdf, en_parte, parte = None, 0, 0
+        for factura_id, pedido_info, df_carrito in facturas:
+            if pdf is None:
+                pdf, en_parte, primera = nuevo_pdf(), 0, factura_id
+            dibujar_factura(pdf, factura_id, pedido_info, df_carrito)
+            en_parte += 1
+            total += 1
+            if en_parte == facturas_por_parte:
+                parte += 1
+                archivo_zip.writestr(f"facturas_{parte:04d}_{primera}_{factura_id}.pdf", bytes(pdf.output()))
+                pdf = None
+        if pdf is not None:
+            parte += 1
+            archivo_zip.writestr(f"facturas_{parte:04d}_{primera}_{factura_id}.pdf", bytes(pdf.output()))
+    return total
+
+
+class ServicioFacturas:
+    """Cola acotada de facturas pendientes atendida por un grupo de hilos."""
+
+    def __init__(self, num_trabajadores=NUM_TRABAJADORES, capacidad_cola=CAPACIDAD_COLA,
+                 reintentos=REINTENTOS_FACTURA, espera_reintento=ESPERA_REINTENTO,
+                 renderizar=generar_documento_factura, archivo=None):
+        self.reintentos = reintentos
+        self.archivo = archivo or archivo_por_defecto()
+        self.espera_reintento = espera_reintento
+        self._renderizar = renderizar
+        self._cola = queue.Queue(maxsize=capacidad_cola)
+        self._lock = threading.Lock()
+        self._trabajos = {}  # factura_id -> {'estado', 'ruta', 'intentos', 'error', 'datos'}
+        self._hilos = [threading.Thread(target=self._trabajador, name=f"facturas-{n}", daemon=True)
+                       for n in range(num_trabajadores)]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def encolar(self, factura_id, pedido_info, df_carrito):
+        """Programa el PDF de una venta ya confirmada y devuelve su ID (el handle de la factura).
+
+        Si la cola sigue llena tras ``ESPERA_COLA`` segundos la factura queda en
+        estado de error y puede reintentarse con ``reintentar``.
+        """
+        with self._lock:
+            self._trabajos[factura_id] = {'estado': PENDIENTE, 'ruta': ruta_de_factura(factura_id),
+                                          'intentos': 0, 'error': None, 'datos': (pedido_info, df_carrito)}
+        self._poner_en_cola(factura_id)
+        return factura_id
+
+    def _poner_en_cola(self, factura_id):
+        try:
+            self._cola.put(factura_id, timeout=ESPERA_COLA)
+        except queue.Full:
+            self._actualizar(factura_id, estado=ERROR, error="Cola de facturas llena.")
+
+    def reintentar(self, factura_id):
+        """Vuelve a encolar una factura en estado de error."""
+        with self._lock:
+            trabajo = self._trabajos.get(factura_id)
+            if trabajo is None or trabajo['estado'] != ERROR:
+                return False
+            trabajo.update(estado=PENDIENTE, intentos=0, error=None)
+        self._poner_en_cola(factura_id)
+        return True
+
+    def estado(self, factura_id):
+        """Estado de la factura (sin los datos de la venta), o ``None`` si no se conoce."""
+        with self._lock:
+            trabajo = self._trabajos.get(factura_id)
+            if trabajo is not None:
+                return {k: v for k, v in trabajo.items() if k != 'datos'}
+        # Facturas de sesiones o arranques anteriores
+        if not self.archivo.existe(factura_id):
+            return None
+        return {'estado': LISTA, 'ruta': ruta_de_factura(factura_id), 'intentos': 0, 'error': None}
+
+    def pendientes(self):
+        """Facturas en cola o en proceso."""
+        with self._lock:
+            return sum(1 for t in self._trabajos.values() if t['estado'] in (PENDIENTE, GENERANDO))
+
+    def _actualizar(self, factura_id, **cambios):
+        with self._lock:
+            self._trabajos[factura_id].update(cambios)
+
+    def _trabajador(self):
+        while True:
+            factura_id = self._cola.get()
+            try:
+                with self._lock:
+                    trabajo = self._trabajos[factura_id]
+                    trabajo['estado'] = GENERANDO
+                    pedido_info, df_carrito = trabajo['datos']
+                for intento in range(1, self.reintentos + 1):
+                    try:
+                        self._renderizar(pedido_info, df_carrito, factura_id, archivo=self.archivo)
+                    except Exception as e:
+                        self._actualizar(factura_id, intentos=intento, error=str(e))
+                        if intento < self.reintentos:
+                            time.sleep(self.espera_reintento * 2 ** (intento - 1))
+                    else:
+                        # Una factura lista se reconoce por el índice del archivo: se olvida el trabajo
+                        # para que el registro de estados no crezca con cada venta
+                        with self._lock:
+                            del self._trabajos[factura_id]
+                        break
+                else:
+                    self._actualizar(factura_id, estado=ERROR)
+            finally:
+                self._cola.task_done()
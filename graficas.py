@@ -0,0 +1,134 @@
+"""Gráficas del dashboard renderizadas a PNG y cacheadas por versión de datos.
+
+Cada gráfica se identifica por su nombre y la versión de los datos que la
+alimentan (``AgregadosKPI.version`` o ``InventarioCompartido.version_global``).
+Una recarga sin cambios reutiliza la imagen ya renderizada; la caché es LRU
+con un número fijo de entradas.
+
+Las figuras se crean con ``matplotlib.figure.Figure`` en lugar de ``pyplot``:
+no quedan registradas en el estado global de pyplot (que no es seguro entre
+hilos de sesiones distintas) y se liberan en cuanto se guardan a PNG, así la
+memoria del servidor no crece con los días de uso.
+
+matplotlib se importa con la primera gráfica que se dibuja, no al importar
+este módulo: una sesión que solo vende no lo carga.
+"""
+import io
+import threading
+from collections import OrderedDict
+
+from configuracion import STOCK_ALERTA, DARK_BACKGROUND, DARK_TEXT
+
+CACHE_GRAFICAS_ENTRADAS = 16  # Imágenes PNG guardadas como máximo
+DPI_GRAFICAS = 200  # Mismo render que st.pyplot
+
+
+def figura_a_png(fig):
+    """Renderiza la figura a PNG y la libera."""
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format='png', dpi=DPI_GRAFICAS, bbox_inches='tight', facecolor=fig.get_facecolor())
+    finally:
+        fig.clear()
+    return buffer.getvalue()
+
+
+class CacheGraficas:
+    """LRU de imágenes PNG por ``(nombre, version)``."""
+
+    def __init__(self, max_entradas=CACHE_GRAFICAS_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._imagenes = OrderedDict()
+
+    def obtener(self, nombre, version, dibujar):
+        """PNG de la gráfica; ``dibujar()`` solo se llama si la versión no está en caché.
+
+        ``dibujar`` devuelve una ``Figure`` o ``None`` si no hay datos.
+        """
+        clave = (nombre, version)
+        with self._lock:
+            if clave in self._imagenes:
+                self._imagenes.move_to_end(clave)
+                return self._imagenes[clave]
+        fig = dibujar()
+        png = figura_a_png(fig) if fig is not None else None
+        with self._lock:
+            # Las versiones anteriores de la misma gráfica ya no se volverán a pedir
+            for obsoleta in [c for c in self._imagenes if c[0] == nombre and c[1] != version]:
+                del self._imagenes[obsoleta]
+            self._imagenes[clave] = png
+            while len(self._imagenes) > self.max_entradas:
+                self._imagenes.popitem(last=False)
+        return png
+
+    def limpiar(self):
+        """Descarta todas las imágenes (actualización manual del dashboard)."""
+        with self._lock:
+            self._imagenes.clear()
+
+
+# --- GRÁFICAS DEL DASHBOARD ---
+
+def _nueva_figura():
+    from matplotlib.figure import Figure  # Diferido: es el import más pesado del dashboard
+    fig = Figure(figsize=(6, 4))
+    fig.set_facecolor(DARK_BACKGROUND)
+    return fig, fig.subplots()
+
+
+def grafica_tendencia(ventas_diarias):
+    """Gráfica 1: ventas por día (serie indexada por fecha)."""
+    if ventas_diarias.empty:
+        return None
+    fig, ax = _nueva_figura()
+    ax.plot(ventas_diarias.index.strftime('%m-%d'), ventas_diarias.values, marker='o', color='#2ecc71')
+    ax.set_title("Ventas por Día", fontsize=10, color=DARK_TEXT)
+    ax.set_ylabel("Monto ($)", color=DARK_TEXT)
+    ax.tick_params(axis='x', rotation=45, colors=DARK_TEXT)
+    ax.tick_params(axis='y', colors=DARK_TEXT)
+    ax.set_facecolor(DARK_BACKGROUND)
+    return fig
+
+
+def grafica_vendedores(ventas_vendedor):
+    """Gráfica 2: total vendido por empleado."""
+    if ventas_vendedor.empty:
+        return None
+    fig, ax = _nueva_figura()
+    ventas_vendedor.plot(kind='bar', ax=ax, color='#3498db')
+    ax.set_title("Total Vendido por Empleado", fontsize=10, color=DARK_TEXT)
+    ax.set_ylabel("Monto Total ($)", color=DARK_TEXT)
+    ax.tick_params(axis='x', rotation=0, colors=DARK_TEXT)
+    ax.tick_params(axis='y', colors=DARK_TEXT)
+    ax.set_facecolor(DARK_BACKGROUND)
+    return fig
+
+
+def grafica_stock_valorizado(df_inventario):
+    """Gráfica 3: distribución del valor del inventario (Top 5)."""
+    top_valor = df_inventario.assign(Valor_Total=df_inventario['Stock_Actual'] * df_inventario['Precio']).nlargest(5, 'Valor_Total')
+    if top_valor.empty:
+        return None
+    from matplotlib import colormaps
+    fig, ax = _nueva_figura()
+    ax.pie(top_valor['Valor_Total'], labels=top_valor['ID'] + ' (' + top_valor['Producto'].str[:15] + '...)', autopct='%1.1f%%',
+           startangle=90, colors=colormaps['Set3'].colors, textprops={'color': DARK_TEXT})
+    ax.set_title("Distribución del Valor del Inventario", fontsize=10, color=DARK_TEXT)
+    return fig
+
+
+def grafica_stock_actual(df_inventario):
+    """Gráfica 4: Top 5 ítems con mayor stock, en rojo los críticos."""
+    top_stock = df_inventario.nlargest(5, 'Stock_Actual')
+    if top_stock.empty:
+        return None
+    fig, ax = _nueva_figura()
+    colors = ['#e74c3c' if s <= STOCK_ALERTA else '#2ecc71' for s in top_stock['Stock_Actual']]
+    ax.bar(top_stock['ID'] + ' - ' + top_stock['Producto'].str[:10] + '...', top_stock['Stock_Actual'], color=colors)
+    ax.set_title("Top 5 Items con Mayor Stock", fontsize=10, color=DARK_TEXT)
+    ax.set_ylabel("Unidades", color=DARK_TEXT)
+    ax.tick_params(axis='x', rotation=45, labelsize=8, colors=DARK_TEXT)
+    ax.tick_params(axis='y', colors=DARK_TEXT)
+    ax.set_facecolor(DARK_BACKGROUND)
+    return fig
@@ -0,0 +1,247 @@
+"""Inventario compartido por todas las sesiones de caja del proceso.
+
+El stock y las versiones viven en arreglos NumPy indexados por ``ID`` (un
+``pd.Index`` da la posición de cada producto), de modo que validar y
+descontar un carrito completo es una única operación vectorizada.
+
+Las ventas se confirman con control optimista: se leen stock y versión sin
+bloquear, se valida, y al confirmar se bloquean solo los segmentos de los
+productos del carrito para comprobar que ninguna versión cambió antes de
+descontar. Dos cajas que venden productos distintos no se bloquean entre sí.
+
+El botón "➕ Añadir al Carrito" crea reservas de corta duración que descuentan
+del disponible de las demás sesiones y caducan solas si no se factura.
+
+Limitación: el ``persistir`` de ``confirmar_venta`` corre con los segmentos
+bloqueados, para que almacén y memoria cambien juntos. Mientras dura, las
+cajas que venden esos productos esperan; y con ``AlmacenCSV``, cuyo bloqueo
+es global, la escritura de todas las ventas queda en serie aunque sus
+productos no compartan segmento.
+"""
+import itertools
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from almacenamiento import COLUMNAS_INVENTARIO, StockInsuficiente, VentaIncompleta
+from esquema import tipar_inventario, concatenar
+
+RESERVA_TTL = 300  # Segundos que dura una reserva de carrito
+NUM_SEGMENTOS = 64  # Bloqueos por segmento de productos (lock striping)
+REINTENTOS_CONFIRMACION = 5
+
+
+class ConflictoVersion(Exception):
+    """La venta no pudo confirmarse porque el stock cambió en todos los reintentos."""
+
+
+class InventarioCompartido:
+    """Stock en memoria con reservas que expiran y confirmación atómica de ventas."""
+
+    def __init__(self, df_inventario, ttl_reserva=RESERVA_TTL, num_segmentos=NUM_SEGMENTOS, reloj=time.monotonic):
+        self.ttl_reserva = ttl_reserva
+        self._reloj = reloj
+        self._segmentos = [threading.Lock() for _ in range(num_segmentos)]
+        self._lock_catalogo = threading.Lock()  # Solo para altas de productos
+        self._ids_reserva = itertools.count(1)
+        self._contador_cambios = itertools.count(1)
+        self.version_global = 0
+        self._snapshot = None
+
+        df = df_inventario[COLUMNAS_INVENTARIO].reset_index(drop=True)
+        self._indice = pd.Index(df['ID'])
+        self._catalogo = df[['ID', 'Producto', 'Precio', 'Categoría']].copy()
+        self._stock = df['Stock_Actual'].to_numpy(dtype=np.int64, copy=True)
+        self._version = np.zeros(len(df), dtype=np.int64)
+        self._reservas = {}  # posición -> {reserva_id: (cantidad, expira, sesion)}
+
+    def _posicion(self, id_producto):
+        posicion = self._indice.get_indexer([id_producto])[0]
+        return None if posicion < 0 else posicion
+
+    def _segmento(self, posicion):
+        return self._segmentos[posicion % len(self._segmentos)]
+
+    def _marcar_cambio(self):
+        self.version_global = next(self._contador_cambios)
+
+    def _reservado(self, posicion, ahora, excluir=()):
+        """Unidades reservadas vigentes (purga las caducadas). Requiere el segmento bloqueado."""
+        reservas = self._reservas.get(posicion)
+        if not reservas:
+            return 0
+        for reserva_id in [r for r, (_, expira, _) in reservas.items() if expira <= ahora]:
+            del reservas[reserva_id]
+        return sum(cantidad for r, (cantidad, _, _) in reservas.items() if r not in excluir)
+
+    # --- CONSULTAS ---
+
+    def existe(self, id_producto):
+        return self._posicion(id_producto) is not None
+
+    def producto(self, id_producto):
+        """Datos del producto con su stock actual, o ``None`` si no existe."""
+        posicion = self._posicion(id_producto)
+        if posicion is None:
+            return None
+        return {**self._catalogo.iloc[posicion].to_dict(), 'Stock_Actual': int(self._stock[posicion])}
+
+    def disponible(self, id_producto):
+        """Stock menos las reservas vigentes de todas las sesiones; ``KeyError`` si el ID no existe."""
+        posicion = self._posicion(id_producto)
+        if posicion is None:
+            raise KeyError(id_producto)
+        with self._segmento(posicion):
+            return int(self._stock[posicion]) - self._reservado(posicion, self._reloj())
+
+    def consultar(self, ids):
+        """Nombre, precio y disponible de varios productos en una pasada (lectura optimista, sin bloqueo).
+
+        Devuelve un DataFrame alineado con ``ids``; los IDs inexistentes
+        quedan con ``Disponible`` igual a -1. La confirmación vuelve a validar.
+        """
+        posiciones = self._indice.get_indexer(ids)
+        existe = posiciones >= 0
+        seguras = np.where(existe, posiciones, 0)
+        disponible = np.where(existe, self._stock[seguras], -1)
+        ahora = self._reloj()
+        for posicion in set(self._reservas).intersection(posiciones[existe].tolist()):
+            with self._segmento(posicion):
+                disponible[posiciones == posicion] -= self._reservado(posicion, ahora)
+        catalogo = self._catalogo
+        return pd.DataFrame({
+            'Producto': np.where(existe, catalogo['Producto'].to_numpy()[seguras], None),
+            'Precio': np.where(existe, catalogo['Precio'].to_numpy()[seguras], np.nan),
+            'Disponible': disponible,
+        })
+
+    def existencias(self, ids):
+        """Stock físico (sin descontar reservas) de varios productos; -1 para los IDs inexistentes."""
+        posiciones = self._indice.get_indexer(ids)
+        existe = posiciones >= 0
+        return np.where(existe, self._stock[np.where(existe, posiciones, 0)], -1)
+
+    def snapshot(self):
+        """DataFrame del inventario, reconstruido solo cuando hubo cambios. Es de solo lectura."""
+        version = self.version_global
+        if self._snapshot is None or self._snapshot[0] != version:
+            with self._lock_catalogo:
+                df = self._catalogo.assign(Stock_Actual=self._stock.copy())[COLUMNAS_INVENTARIO]
+            self._snapshot = (version, df)
+        return self._snapshot[1]
+
+    # --- RESERVAS ---
+
+    def reservar(self, id_producto, cantidad, sesion):
+        """Aparta ``cantidad`` unidades para ``sesion`` durante ``ttl_reserva`` segundos.
+
+        Devuelve el ID de la reserva o lanza ``StockInsuficiente``.
+        """
+        posicion = self._posicion(id_producto)
+        if posicion is None:
+            raise KeyError(id_producto)
+        with self._segmento(posicion):
+            ahora = self._reloj()
+            disponible = int(self._stock[posicion]) - self._reservado(posicion, ahora)
+            if cantidad > disponible:
+                raise StockInsuficiente(id_producto, cantidad, disponible)
+            reserva_id = next(self._ids_reserva)
+            self._reservas.setdefault(posicion, {})[reserva_id] = (cantidad, ahora + self.ttl_reserva, sesion)
+            return reserva_id
+
+    def liberar(self, reservas):
+        """Libera reservas dadas como pares ``(id_producto, reserva_id)``."""
+        for id_producto, reserva_id in reservas:
+            posicion = self._posicion(id_producto)
+            if posicion is None:
+                continue
+            with self._segmento(posicion):
+                self._reservas.get(posicion, {}).pop(reserva_id, None)
+
+    # --- VENTAS Y ALTAS ---
+
+    def confirmar_venta(self, ids, cantidades, reservas=(), persistir=None, reintentos=REINTENTOS_CONFIRMACION):
+        """Valida y descuenta el carrito completo en una sola operación vectorizada.
+
+        ``ids`` y ``cantidades`` son secuencias paralelas (pueden repetir ID).
+        Las ``reservas`` propias ``(id_producto, reserva_id)`` no cuentan contra
+        el disponible y se consumen al confirmar. ``persistir`` se invoca con los
+        segmentos bloqueados, de modo que almacén y memoria cambian juntos; si
+        lanza una excepción la venta no se aplica, salvo ``VentaIncompleta``
+        (el stock ya se descontó en disco), que se relanza tras descontar.
+        """
+        ids = np.asarray(ids)
+        posiciones = self._indice.get_indexer(ids)
+        if (posiciones < 0).any():
+            raise StockInsuficiente(ids[posiciones < 0][0], int(np.asarray(cantidades)[posiciones < 0][0]), 0)
+        # Una entrada por producto: las líneas repetidas se suman
+        posiciones, inverso = np.unique(posiciones, return_inverse=True)
+        solicitado = np.bincount(inverso, weights=cantidades, minlength=len(posiciones)).astype(np.int64)
+        propias = {reserva_id for _, reserva_id in reservas}
+        # Orden fijo de segmentos para evitar interbloqueos entre cajas
+        segmentos = [self._segmentos[s] for s in np.unique(posiciones % len(self._segmentos))]
+
+        for _ in range(reintentos):
+            # 1. Lectura optimista sin bloqueo
+            leidas = self._version[posiciones].copy()
+            faltante = np.flatnonzero(solicitado > self._stock[posiciones])
+            if faltante.size:
+                f = faltante[0]
+                raise StockInsuficiente(self._indice[posiciones[f]], int(solicitado[f]), int(self._stock[posiciones[f]]))
+
+            # 2. Confirmación: solo los segmentos implicados
+            for lock in segmentos:
+                lock.acquire()
+            try:
+                if not np.array_equal(self._version[posiciones], leidas):
+                    continue  # Otra caja vendió estos productos: reintentar con datos frescos
+                ahora = self._reloj()
+                reservado = np.fromiter((self._reservado(p, ahora, excluir=propias) for p in posiciones),
+                                        dtype=np.int64, count=len(posiciones))
+                disponible = self._stock[posiciones] - reservado
+                faltante = np.flatnonzero(solicitado > disponible)
+                if faltante.size:
+                    f = faltante[0]
+                    raise StockInsuficiente(self._indice[posiciones[f]], int(solicitado[f]), int(disponible[f]))
+                incompleta = None
+                if persistir is not None:
+                    try:
+                        persistir()
+                    except VentaIncompleta as e:
+                        incompleta = e
+                self._stock[posiciones] -= solicitado
+                self._version[posiciones] += 1
+                for posicion in posiciones:
+                    reservas_producto = self._reservas.get(posicion)
+                    if reservas_producto:
+                        for reserva_id in propias:
+                            reservas_producto.pop(reserva_id, None)
+                self._marcar_cambio()
+                if incompleta is not None:
+                    raise incompleta
+                return dict(zip(self._indice[posiciones], self._version[posiciones].tolist()))
+            finally:
+                for lock in reversed(segmentos):
+                    lock.release()
+        raise ConflictoVersion(f"No se pudo confirmar la venta tras {reintentos} intentos.")
+
+    def agregar_producto(self, fila):
+        """Da de alta un producto (dict con las columnas del inventario)."""
+        with self._lock_catalogo:
+            if self._posicion(fila['ID']) is not None:
+                raise KeyError(f"ID de producto ya existente: {fila['ID']}")
+            # Los arreglos se reemplazan: ninguna venta puede estar escribiendo mientras tanto
+            for lock in self._segmentos:
+                lock.acquire()
+            try:
+                nueva = tipar_inventario(pd.DataFrame([{c: fila[c] for c in self._catalogo.columns}]))
+                self._catalogo = concatenar([self._catalogo, nueva])
+                self._stock = np.append(self._stock, np.int64(fila['Stock_Actual']))
+                self._version = np.append(self._version, np.int64(0))
+                self._indice = self._indice.append(pd.Index([fila['ID']]))
+            finally:
+                for lock in reversed(self._segmentos):
+                    lock.release()
+            self._marcar_cambio()
@@ -0,0 +1,63 @@
+"""Agregados de KPI mantenidos de forma incremental.
+
+El dashboard ya no recorre el historial de pedidos en cada recarga: los totales
+se calculan una vez al arrancar y luego cada venta o alta de inventario los
+actualiza en tiempo proporcional al tamaño del carrito.
+"""
+import threading
+from collections import defaultdict
+
+import pandas as pd
+
+
+class AgregadosKPI:
+    """Totales de ventas, por vendedor y por día, y valor del stock."""
+
+    def __init__(self, df_pedidos, df_inventario):
+        self._lock = threading.Lock()
+        self.version = 0
+        self.total_ventas = float(df_pedidos['Monto_Total'].sum())
+        self.num_pedidos = len(df_pedidos)
+        self._por_vendedor = defaultdict(float, df_pedidos.groupby('Vendedor', observed=True)['Monto_Total'].sum().to_dict())
+        self._por_dia = defaultdict(float, df_pedidos.groupby(df_pedidos['Fecha'].dt.normalize())['Monto_Total'].sum().to_dict())
+        self.valor_inventario = float((df_inventario['Stock_Actual'] * df_inventario['Precio']).sum())
+
+    @property
+    def promedio_pedido(self):
+        return self.total_ventas / self.num_pedidos if self.num_pedidos else 0.0
+
+    # --- ACTUALIZACIONES (O(tamaño del carrito)) ---
+
+    def registrar_venta(self, lineas_pedido, valor_salida):
+        """Suma las líneas de una venta y descuenta ``valor_salida`` (costo a precio de lista) del stock."""
+        montos = lineas_pedido['Monto_Total'].to_numpy(dtype=float)
+        with self._lock:
+            for vendedor, fecha, monto in zip(lineas_pedido['Vendedor'], lineas_pedido['Fecha'], montos):
+                self._por_vendedor[vendedor] += monto
+                self._por_dia[pd.Timestamp(fecha).normalize()] += monto
+            self.total_ventas += float(montos.sum())
+            self.num_pedidos += len(montos)
+            self.valor_inventario -= float(valor_salida)
+            self.version += 1
+
+    def registrar_producto(self, stock, precio):
+        """Alta de inventario: suma el valor del nuevo ítem."""
+        with self._lock:
+            self.valor_inventario += stock * precio
+            self.version += 1
+
+    # --- LECTURAS PARA EL DASHBOARD ---
+
+    def ventas_por_vendedor(self):
+        with self._lock:
+            return pd.Series(dict(self._por_vendedor), name='Monto_Total', dtype=float).sort_values(ascending=False)
+
+    def ventas_por_dia(self, dias=30):
+        """Ventas diarias de los últimos ``dias`` días con ventas registradas (días sin ventas en 0)."""
+        with self._lock:
+            por_dia = dict(self._por_dia)
+        if not por_dia:
+            return pd.Series(dtype=float, name='Monto_Total')
+        serie = pd.Series(por_dia, dtype=float, name='Monto_Total')
+        rango = pd.date_range(serie.index.min(), serie.index.max(), freq='D')
+        return serie.reindex(rango, fill_value=0.0).tail(dias)
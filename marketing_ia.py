@@ -0,0 +1,179 @@
+"""Servicio de generación de contenido de marketing con IA (Gemini).
+
+* ``CacheRespuestas``: caché persistente en SQLite de prompt -> respuesta, con
+  clave ``sha256(modelo, prompt)``, caducidad (TTL) y expulsión LRU.
+* ``LimitadorTasa``: cubeta de fichas que respeta las solicitudes por minuto
+  del plan de la API, compartida por todas las sesiones.
+* ``ServicioMarketing``: generación individual y por lotes en un grupo de
+  hilos con concurrencia acotada; los resultados se entregan a medida que
+  terminan.
+* ``ClienteLocal``: cliente de prueba sin red con la misma interfaz que
+  ``genai.Client`` (``client.models.generate_content``). Se activa con
+  ``MARKETING_IA_CLIENTE=local``.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import SimpleNamespace
+
+MODELO_IA = 'gemini-2.5-flash'
+CACHE_IA_FILE = 'marketing_cache.db'
+TTL_CACHE_IA = 7 * 24 * 3600  # Segundos que una respuesta sigue vigente
+MAX_ENTRADAS_CACHE_IA = 5000
+SOLICITUDES_POR_MINUTO = 10  # Límite del plan gratuito de Gemini
+CONCURRENCIA_IA = 4
+
+PLANTILLA_PROMPT = ("Genera una publicación de Instagram (máx. 50 palabras y 3 emojis) para promocionar nuestro "
+                    "producto '{producto}'. Menciona su precio de ${precio:.2f} y enfócate en la calidad y la necesidad en Panamá.")
+
+
+def prompt_producto(plantilla, producto, precio, categoria=''):
+    """Rellena la plantilla con los datos del producto (``{producto}``, ``{precio}``, ``{categoria}``)."""
+    return plantilla.format(producto=producto, precio=float(precio), categoria=categoria)
+
+
+class CacheRespuestas:
+    """Respuestas de la IA persistidas en SQLite (una conexión por hilo)."""
+
+    def __init__(self, ruta=CACHE_IA_FILE, ttl=TTL_CACHE_IA, max_entradas=MAX_ENTRADAS_CACHE_IA, reloj=time.time):
+        self.ruta = ruta
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._reloj = reloj
+        self._local = threading.local()
+        with self._conexion() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS respuestas (
+                    clave TEXT PRIMARY KEY,
+                    modelo TEXT NOT NULL,
+                    respuesta TEXT NOT NULL,
+                    creado REAL NOT NULL,
+                    usado REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_respuestas_usado ON respuestas(usado)")
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def clave(modelo, prompt):
+        return hashlib.sha256(f"{modelo}\0{prompt}".encode('utf-8')).hexdigest()
+
+    def obtener(self, modelo, prompt):
+        """Respuesta vigente o ``None``."""
+        clave = self.clave(modelo, prompt)
+        ahora = self._reloj()
+        with self._conexion() as conn:
+            fila = conn.execute("SELECT respuesta, creado FROM respuestas WHERE clave = ?", (clave,)).fetchone()
+            if fila is None:
+                return None
+            if ahora - fila[1] > self.ttl:
+                conn.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+                return None
+            conn.execute("UPDATE respuestas SET usado = ? WHERE clave = ?", (ahora, clave))
+            return fila[0]
+
+    def guardar(self, modelo, prompt, respuesta):
+        ahora = self._reloj()
+        with self._conexion() as conn:
+            conn.execute("INSERT OR REPLACE INTO respuestas (clave, modelo, respuesta, creado, usado) VALUES (?, ?, ?, ?, ?)",
+                         (self.clave(modelo, prompt), modelo, respuesta, ahora, ahora))
+            # Caducadas primero; luego las menos usadas recientemente si se excede el máximo
+            conn.execute("DELETE FROM respuestas WHERE creado < ?", (ahora - self.ttl,))
+            conn.execute("DELETE FROM respuestas WHERE clave IN "
+                         "(SELECT clave FROM respuestas ORDER BY usado DESC LIMIT -1 OFFSET ?)", (self.max_entradas,))
+
+
+class LimitadorTasa:
+    """Cubeta de fichas: como máximo ``por_minuto`` solicitudes por minuto (con ráfaga de ``por_minuto``)."""
+
+    def __init__(self, por_minuto=SOLICITUDES_POR_MINUTO, reloj=time.monotonic, dormir=time.sleep):
+        self.capacidad = float(por_minuto)
+        self.tasa = por_minuto / 60.0
+        self._fichas = self.capacidad
+        self._ultimo = reloj()
+        self._reloj = reloj
+        self._dormir = dormir
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        """Bloquea hasta que haya una ficha disponible."""
+        while True:
+            with self._lock:
+                ahora = self._reloj()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.tasa
+            self._dormir(espera)
+
+
+class ClienteLocal:
+    """Cliente sin red para pruebas: responde con un texto determinista derivado del prompt."""
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.models = self
+
+    def generate_content(self, model, contents):
+        if self.latencia:
+            time.sleep(self.latencia)
+        resumen = contents if len(contents) <= 80 else contents[:77] + '...'
+        return SimpleNamespace(text=f"[{model} · local] ✨ {resumen}")
+
+
+class ServicioMarketing:
+    """Generación con caché, límite de tasa y lotes concurrentes."""
+
+    def __init__(self, cliente, cache=None, limitador=None, concurrencia=CONCURRENCIA_IA, modelo=MODELO_IA):
+        self.cliente = cliente
+        self.cache = cache if cache is not None else CacheRespuestas()
+        self.limitador = limitador if limitador is not None else LimitadorTasa()
+        self.modelo = modelo
+        self._hilos = ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix='marketing-ia')
+
+    def _llamar(self, prompt):
+        self.limitador.adquirir()
+        texto = self.cliente.models.generate_content(model=self.modelo, contents=prompt).text
+        self.cache.guardar(self.modelo, prompt, texto)
+        return texto
+
+    def generar(self, prompt):
+        """Devuelve ``(texto, desde_cache)``. Las excepciones de la API se propagan."""
+        texto = self.cache.obtener(self.modelo, prompt)
+        if texto is not None:
+            return texto, True
+        return self._llamar(prompt), False
+
+    def generar_lote(self, prompts):
+        """Genera varios prompts (dict ``clave -> prompt``) y produce resultados a medida que terminan.
+
+        Cada resultado es ``(clave, texto, error, desde_cache)``; los que ya
+        están en caché se entregan primero, sin consumir cuota de la API.
+        """
+        pendientes = {}
+        for clave, prompt in prompts.items():
+            texto = self.cache.obtener(self.modelo, prompt)
+            if texto is not None:
+                yield clave, texto, None, True
+            else:
+                pendientes[self._hilos.submit(self._llamar, prompt)] = clave
+        try:
+            for futuro in as_completed(pendientes):
+                try:
+                    yield pendientes[futuro], futuro.result(), None, False
+                except Exception as e:
+                    yield pendientes[futuro], None, e, False
+        finally:
+            # Si la interfaz deja de consumir (nueva recarga), no seguir gastando cuota
+            for futuro in pendientes:
+                futuro.cancel()
@@ -0,0 +1,399 @@
+"""Motor de ventas sin interfaz: la lógica de negocio de la caja, independiente de Streamlit.
+
+La interfaz (``app.py``) y la importación masiva desde terminales POS usan el
+mismo motor:
+
+* ``vender``: un carrito confirmado de forma atómica contra el inventario
+  compartido, con descuento e ITBMS (``calcular_montos``) y factura en cola.
+* ``vender_lote``: muchas ventas validadas en orden contra el stock y
+  confirmadas en una sola operación del almacén; las que no alcanzan stock se
+  rechazan sin afectar a las demás.
+* ``agregar_producto``: alta de inventario.
+
+Los servicios derivados (historial, KPIs, velocidades, índice de búsqueda y
+facturas) son opcionales: la línea de comandos trabaja solo con almacén e
+inventario. Los números de factura y de línea de pedido salen de
+``numeracion.Numerador``, sin colisiones entre cajas ni procesos. Los errores
+se informan con excepciones (``StockInsuficiente``, ``ConflictoVersion``,
+``ValueError``); mostrarlos es tarea de quien llama. Una venta cuyo pedido no
+llegó al almacén pero cuyo stock sí se descontó (``VentaIncompleta``) no es
+un error: está hecha, se publica y se factura, y la recuperación de la
+bitácora completa su pedido al próximo arranque.
+
+Con una ``bitacora_ventas.BitacoraVentas`` cada venta se escribe en la
+bitácora (WAL) antes de aplicarse al almacén; al arrancar,
+``bitacora_ventas.recuperar`` completa las que un corte dejó a medias.
+Con un ``bus_eventos.BusEventos`` cada confirmación publica la venta (tema
+``ventas``) y los productos cuyo stock cambió (tema ``inventario``) para las
+demás sesiones.
+
+Importación de ventas de terminales POS (CSV o JSONL, una fila por producto
+vendido con ``Venta``, ``ID``, ``Cantidad``, ``Vendedor`` y opcionalmente
+``Fecha``)::
+
+    python motor_ventas.py importar ventas_pos.csv --lote 5000 --rechazos rechazos.csv
+
+Con el backend CSV, importar mientras la aplicación está abierta deja su
+inventario en memoria desactualizado hasta reiniciarla; con SQLite el stock
+se valida también en la base.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from almacenamiento import crear_almacen, StockInsuficiente, VentaIncompleta, COLUMNAS_PEDIDOS, COLUMNAS_MOVIMIENTOS
+from archivo_facturas import archivo_por_defecto
+from bitacora_ventas import BitacoraVentas, recuperar
+from bus_eventos import crear_bus, TEMA_VENTAS, TEMA_INVENTARIO
+from esquema import tipar_pedidos, parsear_fechas
+from facturacion import ruta_de_factura, calcular_montos, agrupar_facturas, generar_documento_factura
+from inventario_compartido import InventarioCompartido, ConflictoVersion
+from numeracion import (numerador_por_defecto, formatear_factura, formatear_pedido,
+                        SECUENCIA_FACTURAS, SECUENCIA_PEDIDOS)
+
+LINEAS_POR_LOTE = 5000  # Líneas del archivo POS confirmadas por operación del almacén
+COLUMNAS_POS = ['Venta', 'ID', 'Cantidad', 'Vendedor']
+
+
+class MotorVentas:
+    """Ventas y altas de inventario sobre el almacén y el inventario compartido."""
+
+    def __init__(self, almacen, inventario, historial=None, kpis=None, velocidades=None,
+                 indice_productos=None, facturas=None, numerador=None, bitacora=None, bus=None, reloj=datetime.now):
+        self.almacen = almacen
+        self.inventario = inventario
+        self.historial = historial
+        self.kpis = kpis
+        self.velocidades = velocidades
+        self.indice_productos = indice_productos
+        self.facturas = facturas
+        self.numerador = numerador if numerador is not None else numerador_por_defecto()
+        self.bitacora = bitacora
+        self.bus = bus
+        self._reloj = reloj
+        self.confirmaciones_pendientes = 0  # Confirmaciones con el pedido pendiente de la recuperación
+
+    def _persistir(self, lineas, df_movimientos):
+        """Registra la venta en el almacén, pasando antes por la bitácora si la hay."""
+        if self.bitacora is None:
+            self.almacen.registrar_lote(lineas, df_movimientos)
+            return
+        with self.bitacora.transaccion(lineas, df_movimientos):
+            self.almacen.registrar_lote(lineas, df_movimientos)
+
+    def _confirmar(self, ids, cantidades, lineas, df_movimientos, reservas=()):
+        """Descuenta y persiste la venta; devuelve ``False`` si su pedido quedó pendiente en la bitácora."""
+        try:
+            self.inventario.confirmar_venta(ids, cantidades, reservas=reservas,
+                                            persistir=lambda: self._persistir(lineas, df_movimientos))
+        except VentaIncompleta:
+            # El stock ya se descontó en memoria y en disco: la venta sigue adelante
+            self.confirmaciones_pendientes += 1
+            return False
+        return True
+
+    def _publicar(self, lineas, ids, cantidades, valor_salida):
+        """Actualiza los servicios en memoria tras una confirmación."""
+        if self.historial is not None:
+            self.historial.anexar(lineas)
+        if self.kpis is not None:
+            self.kpis.registrar_venta(lineas, valor_salida=valor_salida)
+        if self.velocidades is not None:
+            self.velocidades.registrar_venta(ids, cantidades)
+        if self.bus is not None:
+            self.bus.publicar(TEMA_INVENTARIO, ids=[str(i) for i in pd.unique(np.asarray(ids))])
+
+    # --- VENTA DE CAJA ---
+
+    def vender(self, df_carrito, vendedor_id, reservas=(), factura_id=None):
+        """Confirma un carrito (``ID``, ``Producto``, ``Cantidad``, ``Subtotal_Bruto``) y encola su factura.
+
+        Devuelve ``{'factura_id', 'pedido_info', 'lineas', 'pendiente'}``;
+        ``pendiente`` indica que el pedido se completará en el almacén al
+        recuperar la bitácora. Si no hay stock lanza ``StockInsuficiente`` o
+        ``ConflictoVersion`` y nada se persiste.
+        """
+        ahora = self._reloj()
+        factura_id = factura_id or formatear_factura(self.numerador.siguiente(SECUENCIA_FACTURAS))
+        montos = calcular_montos(df_carrito['Subtotal_Bruto'].sum())
+        pedido_info = {'Fecha': ahora.strftime('%Y-%m-%d %H:%M'), 'Vendedor': vendedor_id, **montos}
+
+        # Líneas de pedido de todo el carrito en un solo bloque: un registro por
+        # CADA ítem vendido (para mantener la trazabilidad en el historial)
+        lineas = tipar_pedidos(pd.DataFrame({
+            'ID_Pedido': [formatear_pedido(n) for n in self.numerador.siguientes(SECUENCIA_PEDIDOS, len(df_carrito))], # ID único por ítem
+            'Fecha': pd.Timestamp(ahora).floor('min'),
+            'Producto': df_carrito['Producto'].to_numpy(),
+            'Cantidad': df_carrito['Cantidad'].to_numpy(),
+            'Monto_Neto': df_carrito['Subtotal_Bruto'].to_numpy(), # Guarda el subtotal bruto del ítem
+            'Monto_Total': df_carrito['Subtotal_Bruto'].to_numpy(), # Se actualiza en el reporte
+            'Vendedor': vendedor_id,
+            'Factura_Ruta': ruta_de_factura(factura_id)
+        }))
+        deltas = (-df_carrito.groupby('ID', sort=False)['Cantidad'].sum()).astype(int)
+        df_movimientos = pd.DataFrame({'ID': deltas.index, 'Delta': deltas.to_numpy(), 'Referencia': factura_id})
+        ids, cantidades = df_carrito['ID'].to_numpy(), df_carrito['Cantidad'].to_numpy()
+
+        # Validación y descuento vectorizado y atómico; la persistencia ocurre dentro de la confirmación
+        completa = self._confirmar(ids, cantidades, lineas, df_movimientos, reservas=reservas)
+        self._publicar(lineas, ids, cantidades, df_carrito['Subtotal_Bruto'].sum())
+        if self.bus is not None:
+            self.bus.publicar(TEMA_VENTAS, factura_id=factura_id, vendedor=str(vendedor_id),
+                              total=float(pedido_info['Monto_Total']), descuento=float(pedido_info['Descuento']))
+        if self.facturas is not None:
+            # El PDF se genera en segundo plano: la venta queda cerrada sin esperar al render
+            self.facturas.encolar(factura_id, pedido_info, df_carrito)
+        return {'factura_id': factura_id, 'pedido_info': pedido_info, 'lineas': lineas, 'pendiente': not completa}
+
+    # --- IMPORTACIÓN MASIVA ---
+
+    def vender_lote(self, df_lineas):
+        """Confirma un lote de ventas POS (columnas ``COLUMNAS_POS`` y opcionalmente ``Fecha``).
+
+        Las ventas se validan en el orden del archivo contra el disponible y
+        las aceptadas se confirman juntas. Devuelve ``(lineas, rechazos)``:
+        las líneas de pedido registradas (agrupadas por venta) y un DataFrame
+        ``Venta``/``Motivo``. Las facturas no se encolan: se generan a partir
+        de ``lineas``.
+        """
+        df = df_lineas.reset_index(drop=True)
+        ventas, referencias = pd.factorize(df['Venta'].astype(str))
+        cantidades = pd.to_numeric(df['Cantidad'], errors='coerce').to_numpy(dtype=float)
+        info = self.inventario.consultar(df['ID'].to_numpy())
+        disponible = info['Disponible'].to_numpy()
+        productos, ids_unicos = pd.factorize(df['ID'])
+        restante = np.zeros(len(ids_unicos), dtype=np.int64)
+        restante[productos] = disponible
+        restante = restante.tolist()  # Acceso por elemento más rápido en el bucle
+
+        motivos = {}
+        for venta in ventas[disponible < 0]:
+            motivos.setdefault(venta, "Producto inexistente.")
+        for venta in ventas[~(cantidades > 0) | (cantidades != np.floor(cantidades))]:
+            motivos.setdefault(venta, "Cantidad inválida.")
+
+        # Validación secuencial del stock: cada venta ve lo que dejaron las anteriores del lote
+        orden = np.argsort(ventas, kind='stable')  # Filas agrupadas por venta, en orden de aparición
+        aceptada = np.zeros(len(df), dtype=bool)
+        for venta, filas in enumerate(np.split(orden, np.cumsum(np.bincount(ventas))[:-1])):
+            if venta in motivos:
+                continue
+            pedido = {}
+            for producto, cantidad in zip(productos[filas].tolist(), cantidades[filas].tolist()):
+                pedido[producto] = pedido.get(producto, 0) + int(cantidad)
+            faltante = next((p for p, q in pedido.items() if q > restante[p]), None)
+            if faltante is not None:
+                motivos[venta] = f"Stock insuficiente para {ids_unicos[faltante]}."
+                continue
+            for producto, cantidad in pedido.items():
+                restante[producto] -= cantidad
+            aceptada[filas] = True
+
+        rechazos = pd.DataFrame({'Venta': referencias[list(motivos)], 'Motivo': list(motivos.values())})
+        seleccion = orden[aceptada[orden]]
+        if not len(seleccion):
+            return tipar_pedidos(pd.DataFrame(columns=COLUMNAS_PEDIDOS)), rechazos
+        df, info, cantidades = df.iloc[seleccion], info.iloc[seleccion], cantidades[seleccion].astype(np.int64)
+        try:
+            lineas = self._confirmar_lote(df, info, cantidades)
+        except (StockInsuficiente, ConflictoVersion):
+            # Otra caja vendió o reservó durante el lote: se confirman las ventas de una en una
+            return self._confirmar_por_venta(df, info, cantidades, rechazos)
+        return lineas, rechazos
+
+    def _confirmar_lote(self, df, info, cantidades):
+        """Registra ventas ya validadas (filas agrupadas por venta) en una sola confirmación."""
+        # Un número de factura por venta (en orden de aparición) y uno de pedido por línea
+        ventas, unicas = pd.factorize(df['Venta'])
+        numeros = self.numerador.siguientes(SECUENCIA_FACTURAS, len(unicas))
+        facturas = np.array([formatear_factura(n) for n in numeros], dtype=object)[ventas]
+        ids = df['ID'].to_numpy()
+        subtotales = np.round(cantidades * info['Precio'].to_numpy(dtype=float), 2)
+        if 'Fecha' in df.columns:
+            fechas = parsear_fechas(df['Fecha']).dt.floor('min').to_numpy()
+        else:
+            fechas = pd.Timestamp(self._reloj()).floor('min')
+        lineas = tipar_pedidos(pd.DataFrame({
+            'ID_Pedido': [formatear_pedido(n) for n in self.numerador.siguientes(SECUENCIA_PEDIDOS, len(df))],
+            'Fecha': fechas,
+            'Producto': info['Producto'].to_numpy(),
+            'Cantidad': cantidades,
+            'Monto_Neto': subtotales, # Subtotal bruto del ítem, como en la caja
+            'Monto_Total': subtotales,
+            'Vendedor': df['Vendedor'].astype(str).to_numpy(),
+            'Factura_Ruta': [ruta_de_factura(f) for f in facturas],
+        }))
+        df_movimientos = (pd.DataFrame({'ID': ids, 'Delta': -cantidades, 'Referencia': facturas})
+                          .groupby(['Referencia', 'ID'], sort=False, as_index=False)['Delta'].sum()[COLUMNAS_MOVIMIENTOS])
+        self._confirmar(ids, cantidades, lineas, df_movimientos)
+        self._publicar(lineas, ids, cantidades, float(subtotales.sum()))
+        if self.bus is not None:
+            self.bus.publicar(TEMA_VENTAS, ventas=len(unicas), lineas=len(lineas), total=float(subtotales.sum()))
+        return lineas
+
+    def _confirmar_por_venta(self, df, info, cantidades, rechazos):
+        confirmadas, nuevos_rechazos = [], []
+        for venta, filas in pd.Series(np.arange(len(df))).groupby(df['Venta'].astype(str).to_numpy(), sort=False).indices.items():
+            try:
+                confirmadas.append(self._confirmar_lote(df.iloc[filas], info.iloc[filas], cantidades[filas]))
+            except (StockInsuficiente, ConflictoVersion) as e:
+                nuevos_rechazos.append({'Venta': venta, 'Motivo': str(e)})
+        rechazos = pd.concat([rechazos, pd.DataFrame(nuevos_rechazos, columns=['Venta', 'Motivo'])], ignore_index=True)
+        lineas = pd.concat(confirmadas, ignore_index=True) if confirmadas else pd.DataFrame(columns=COLUMNAS_PEDIDOS)
+        return tipar_pedidos(lineas), rechazos
+
+    # --- INVENTARIO ---
+
+    def agregar_producto(self, id_producto, producto, stock, precio, categoria):
+        """Da de alta un producto; lanza ``ValueError`` si el ID existe o los valores no son numéricos."""
+        if self.inventario.existe(id_producto):
+            raise ValueError("ID de producto ya existente.")
+        try:
+            stock = int(stock)
+            precio = float(precio)
+        except ValueError:
+            raise ValueError("Stock y Precio deben ser valores numéricos válidos.") from None
+
+        nuevo_item = pd.DataFrame([{
+            'ID': id_producto,
+            'Producto': producto,
+            'Stock_Actual': stock,
+            'Precio': precio,
+            'Categoría': categoria
+        }])
+        self.almacen.agregar_producto(nuevo_item)
+        self.inventario.agregar_producto(nuevo_item.iloc[0].to_dict())
+        if self.kpis is not None:
+            self.kpis.registrar_producto(stock, precio)
+        if self.velocidades is not None:
+            self.velocidades.agregar_producto(id_producto)
+        if self.indice_productos is not None:
+            self.indice_productos.agregar(id_producto, producto, categoria)
+        if self.bus is not None:
+            self.bus.publicar(TEMA_INVENTARIO, ids=[str(id_producto)], alta=str(producto))
+        return nuevo_item
+
+
+# --- IMPORTACIÓN DESDE LA LÍNEA DE COMANDOS ---
+
+def leer_ventas_pos(ruta, lineas_por_lote=LINEAS_POR_LOTE):
+    """Recorre un archivo POS (CSV o JSONL) en lotes que nunca parten una venta.
+
+    Las líneas de una misma venta deben ser consecutivas en el archivo.
+    """
+    if ruta.endswith(('.jsonl', '.ndjson', '.json')):
+        bloques = pd.read_json(ruta, lines=True, chunksize=lineas_por_lote, dtype={'Venta': str, 'ID': str, 'Vendedor': str})
+    else:
+        bloques = pd.read_csv(ruta, chunksize=lineas_por_lote, dtype={'Venta': str, 'ID': str, 'Vendedor': str})
+    pendiente = None
+    for bloque in bloques:
+        faltantes = set(COLUMNAS_POS) - set(bloque.columns)
+        if faltantes:
+            raise ValueError(f"Faltan columnas en {ruta}: {', '.join(sorted(faltantes))}")
+        if pendiente is not None:
+            bloque = pd.concat([pendiente, bloque], ignore_index=True)
+        # La última venta del bloque puede continuar en el siguiente: se retiene
+        ultima = bloque['Venta'].iloc[-1]
+        pendiente = bloque[bloque['Venta'] == ultima]
+        completo = bloque[bloque['Venta'] != ultima]
+        if len(completo):
+            yield completo
+    if pendiente is not None and len(pendiente):
+        yield pendiente
+
+
+def _facturar(lineas):
+    """Genera los PDF de un bloque de líneas de pedido (en un proceso del grupo)."""
+    total = 0
+    try:
+        for factura_id, pedido_info, df_carrito in agrupar_facturas([lineas]):
+            generar_documento_factura(pedido_info, df_carrito, factura_id)
+            total += 1
+    finally:
+        archivo_por_defecto().cerrar()  # Los procesos del grupo terminan sin atexit: el segmento se cierra aquí
+    return total
+
+
+def importar(motor, ruta, lineas_por_lote=LINEAS_POR_LOTE, ruta_rechazos=None, facturar=True, procesos=None):
+    """Importa un archivo POS; devuelve un resumen con ventas, líneas, rechazos, pendientes y tasas."""
+    inicio = time.perf_counter()
+    resumen = {'ventas': 0, 'lineas': 0, 'rechazadas': 0, 'facturas': 0}
+    pendientes_previas = motor.confirmaciones_pendientes
+    if ruta_rechazos and os.path.exists(ruta_rechazos):
+        os.remove(ruta_rechazos)
+    grupo = ProcessPoolExecutor(max_workers=procesos) if facturar else None
+    pendientes = set()
+    procesos = procesos or os.cpu_count() or 1
+    try:
+        for lote in leer_ventas_pos(ruta, lineas_por_lote):
+            lineas, rechazos = motor.vender_lote(lote)
+            resumen['ventas'] += lineas['Factura_Ruta'].nunique()
+            resumen['lineas'] += len(lineas)
+            resumen['rechazadas'] += len(rechazos)
+            if ruta_rechazos and len(rechazos):
+                rechazos.to_csv(ruta_rechazos, mode='a', header=not os.path.exists(ruta_rechazos), index=False)
+            if grupo is not None and len(lineas):
+                # Las facturas se reparten entre los procesos sin partir ninguna
+                codigos, _ = pd.factorize(lineas['Factura_Ruta'])
+                for parte in range(min(procesos, codigos.max() + 1)):
+                    pendientes.add(grupo.submit(_facturar, lineas[codigos % procesos == parte]))
+                # Contrapresión: no acumular más de dos lotes de facturas por proceso
+                while len(pendientes) > 2 * procesos:
+                    terminados, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    resumen['facturas'] += sum(f.result() for f in terminados)
+        resumen['segundos_confirmacion'] = time.perf_counter() - inicio
+        for futuro in pendientes:
+            resumen['facturas'] += futuro.result()
+    finally:
+        if grupo is not None:
+            grupo.shutdown()
+    resumen['pendientes'] = motor.confirmaciones_pendientes - pendientes_previas
+    resumen['segundos'] = time.perf_counter() - inicio
+    resumen.setdefault('segundos_confirmacion', resumen['segundos'])
+    return resumen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Motor de ventas sin interfaz.")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    importar_cmd = subcomandos.add_parser('importar', help="Importa ventas de terminales POS (CSV o JSONL).")
+    importar_cmd.add_argument('archivo')
+    importar_cmd.add_argument('--lote', type=int, default=LINEAS_POR_LOTE, help="Líneas por lote confirmado.")
+    importar_cmd.add_argument('--rechazos', help="CSV donde anotar las ventas rechazadas y su motivo.")
+    importar_cmd.add_argument('--sin-facturas', action='store_true', help="No generar los PDF de factura.")
+    importar_cmd.add_argument('--procesos', type=int, help="Procesos para generar facturas (por defecto, uno por CPU).")
+    args = parser.parse_args(argv)
+
+    almacen = crear_almacen()
+    recuperadas, recuperacion = recuperar(almacen)
+    if recuperacion['aplicadas'] or recuperacion['rechazadas']:
+        print(f"↺ Bitácora: {recuperacion['aplicadas']} ventas recuperadas, {recuperacion['rechazadas']} rechazadas.")
+    if not args.sin_facturas:
+        # Ventas recuperadas cuyo PDF no llegó a generarse
+        for factura_id, pedido_info, df_carrito in agrupar_facturas([recuperadas]):
+            if not archivo_por_defecto().existe(factura_id):
+                generar_documento_factura(pedido_info, df_carrito, factura_id)
+    bitacora = BitacoraVentas(sincronizar=almacen.sincronizar)
+    motor = MotorVentas(almacen, InventarioCompartido(almacen.cargar_inventario()), bitacora=bitacora, bus=crear_bus())
+    resumen = importar(motor, args.archivo, args.lote, args.rechazos, not args.sin_facturas, args.procesos)
+    tasa = resumen['ventas'] / resumen['segundos_confirmacion'] if resumen['segundos_confirmacion'] else 0.0
+    print(f"✅ {resumen['ventas']} ventas ({resumen['lineas']} líneas) confirmadas en {resumen['segundos_confirmacion']:.2f} s "
+          f"({tasa:,.0f} ventas/s); {resumen['rechazadas']} rechazadas.")
+    if resumen['pendientes']:
+        print(f"⚠️ {resumen['pendientes']} confirmaciones con el stock descontado y el pedido pendiente: "
+              f"la bitácora las completa al próximo arranque.")
+    if not args.sin_facturas:
+        print(f"🧾 {resumen['facturas']} facturas generadas; total {resumen['segundos']:.2f} s.")
+    almacen.compactar()
+    bitacora.cerrar()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Numeración de facturas y líneas de pedido sin colisiones.
+
+Los números salen de secuencias persistidas en SQLite (``numeracion.db``).
+Cada proceso reserva un bloque de ``tamano_bloque`` números en una sola
+transacción y los reparte desde memoria; solo vuelve a la base cuando agota
+el bloque. Dos cajas, o la aplicación y una importación masiva en otro
+proceso, nunca reciben el mismo número.
+
+Las secuencias son crecientes dentro de cada proceso y toleran huecos: los
+números de un bloque sin usar al reiniciar, o de una venta rechazada, no se
+reutilizan.
+"""
+import functools
+import sqlite3
+import threading
+
+NUMERACION_FILE = 'numeracion.db'
+TAMANO_BLOQUE_NUMERACION = 100  # Números reservados por viaje a la base
+
+SECUENCIA_FACTURAS = 'factura'
+SECUENCIA_PEDIDOS = 'pedido'
+
+
+def formatear_factura(numero):
+    return f"F{numero:08d}"
+
+
+def formatear_pedido(numero):
+    return f"P{numero:010d}"
+
+
+class Numerador:
+    """Secuencias persistentes repartidas por bloques entre los hilos del proceso."""
+
+    def __init__(self, ruta=NUMERACION_FILE, tamano_bloque=TAMANO_BLOQUE_NUMERACION):
+        self.ruta = ruta
+        self.tamano_bloque = tamano_bloque
+        self._lock = threading.Lock()
+        self._bloques = {}  # secuencia -> (siguiente, fin) del bloque en memoria
+        # Las reservas ocurren con el lock tomado: basta una conexión para todo el proceso
+        self._conn = sqlite3.connect(ruta, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS secuencias (nombre TEXT PRIMARY KEY, siguiente INTEGER NOT NULL)")
+
+    def _reservar(self, secuencia, cantidad):
+        """Reserva ``cantidad`` números consecutivos en la base y devuelve el primero."""
+        self._conn.execute("BEGIN IMMEDIATE")  # Serializa las reservas entre procesos
+        try:
+            fila = self._conn.execute("SELECT siguiente FROM secuencias WHERE nombre = ?", (secuencia,)).fetchone()
+            inicio = fila[0] if fila else 1
+            self._conn.execute("INSERT OR REPLACE INTO secuencias (nombre, siguiente) VALUES (?, ?)",
+                               (secuencia, inicio + cantidad))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return inicio
+
+    def siguientes(self, secuencia, cantidad):
+        """``range`` de ``cantidad`` números consecutivos de ``secuencia``.
+
+        Las peticiones grandes (importación por lotes) se reservan en la base
+        directamente, sin consumir el bloque en memoria.
+        """
+        with self._lock:
+            if cantidad >= self.tamano_bloque:
+                inicio = self._reservar(secuencia, cantidad)
+                return range(inicio, inicio + cantidad)
+            inicio, fin = self._bloques.get(secuencia, (0, 0))
+            if fin - inicio < cantidad:
+                # El resto del bloque anterior queda como hueco
+                inicio = self._reservar(secuencia, self.tamano_bloque)
+                fin = inicio + self.tamano_bloque
+            self._bloques[secuencia] = (inicio + cantidad, fin)
+            return range(inicio, inicio + cantidad)
+
+    def siguiente(self, secuencia):
+        return self.siguientes(secuencia, 1)[0]
+
+
+@functools.lru_cache(maxsize=None)
+def numerador_por_defecto():
+    """Numerador del proceso sobre ``NUMERACION_FILE``, creado al primer uso."""
+    return Numerador()
@@ -0,0 +1,99 @@
+"""Velocidad de venta por producto para la alerta predictiva de stock.
+
+Cada ``ID`` guarda un acumulado de unidades con decaimiento exponencial
+(EWMA en tiempo continuo, constante τ): la velocidad en unidades/día es
+``Σ cantidad · e^(-(ahora - fecha)/τ) / τ``, de modo que las ventas recientes
+pesan más y cada producto tiene su propia ventana. Para no recalcular la
+exponencial de todo el catálogo, cada venta se guarda escalada por
+``e^((fecha - origen)/τ)`` y al consultar basta multiplicar por un único
+factor ``e^(-(ahora - origen)/τ)``.
+
+El historial solo se recorre una vez al arrancar; después cada venta actualiza
+el estado en O(tamaño del carrito) y los días de cobertura de todo el catálogo
+se calculan en una pasada NumPy. Los arreglos siguen el mismo orden de
+productos que ``InventarioCompartido`` (ambos anexan las altas al final).
+"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+SEGUNDOS_DIA = 86400.0
+DECAIMIENTO_DIAS = 14.0  # τ: constante de tiempo del promedio exponencial
+DIAS_ALERTA = 14  # Se alerta si el stock cubre menos días que esto
+VELOCIDAD_MINIMA = 0.01  # Unidades/día por debajo de las cuales no se estima cobertura
+
+
+def _dia_actual():
+    return time.time() / SEGUNDOS_DIA
+
+
+class VelocidadVentas:
+    """Estado EWMA de ventas por producto, alineado con el inventario."""
+
+    def __init__(self, df_inventario, df_pedidos, decaimiento_dias=DECAIMIENTO_DIAS, reloj=_dia_actual):
+        self.tau = decaimiento_dias
+        self._reloj = reloj
+        self._origen = reloj()
+        self._lock = threading.Lock()
+        self._indice = pd.Index(df_inventario['ID'])
+        self._acumulado = np.zeros(len(self._indice), dtype=np.float64)  # Escalado al origen
+        self._cargar_historial(df_inventario, df_pedidos)
+
+    def _escala(self, dias):
+        return np.exp((dias - self._origen) / self.tau)
+
+    def _cargar_historial(self, df_inventario, df_pedidos):
+        """Carga inicial: las líneas de pedido guardan el nombre del producto, no el ID."""
+        if df_pedidos.empty:
+            return
+        por_nombre = pd.Series(np.arange(len(df_inventario)), index=df_inventario['Producto'].to_numpy())
+        por_nombre = por_nombre[~por_nombre.index.duplicated()]
+        posiciones = por_nombre.reindex(df_pedidos['Producto'].to_numpy()).to_numpy()
+        fechas = pd.to_datetime(df_pedidos['Fecha'], format='mixed', errors='coerce')
+        dias = ((fechas - pd.Timestamp(0)) / pd.Timedelta(days=1)).to_numpy(dtype=np.float64, na_value=np.nan)
+        validas = ~np.isnan(posiciones) & ~np.isnan(dias)
+        pesos = df_pedidos['Cantidad'].to_numpy(dtype=np.float64)[validas] * self._escala(dias[validas])
+        self._acumulado += np.bincount(posiciones[validas].astype(np.int64), weights=pesos, minlength=len(self._acumulado))
+
+    # --- ACTUALIZACIONES ---
+
+    def registrar_venta(self, ids, cantidades):
+        """Suma una venta confirmada (``ids`` y ``cantidades`` paralelos, pueden repetir ID)."""
+        posiciones = self._indice.get_indexer(np.asarray(ids))
+        cantidades = np.asarray(cantidades, dtype=np.float64)
+        validas = posiciones >= 0
+        with self._lock:
+            np.add.at(self._acumulado, posiciones[validas], cantidades[validas] * self._escala(self._reloj()))
+
+    def agregar_producto(self, id_producto):
+        with self._lock:
+            self._indice = self._indice.append(pd.Index([id_producto]))
+            self._acumulado = np.append(self._acumulado, 0.0)
+
+    # --- CONSULTAS ---
+
+    def velocidades(self):
+        """Unidades/día estimadas para cada producto, en el orden del inventario."""
+        with self._lock:
+            acumulado, indice = self._acumulado, self._indice
+        return indice, acumulado * (1.0 / (self._escala(self._reloj()) * self.tau))
+
+    def alerta(self, df_inventario, dias_alerta=DIAS_ALERTA):
+        """Productos cuyo stock se agota en menos de ``dias_alerta`` días, de menor a mayor cobertura.
+
+        Devuelve las columnas del inventario más ``Velocidad_Venta_Dia`` y ``Dias_Restantes``.
+        """
+        indice, velocidad = self.velocidades()
+        ids = df_inventario['ID']
+        alineado = len(indice) == len(ids) and (len(ids) == 0 or (indice[0] == ids.iloc[0] and indice[-1] == ids.iloc[-1]))
+        if not alineado:
+            velocidad = pd.Series(velocidad, index=indice).reindex(ids, fill_value=0.0).to_numpy()
+        stock = df_inventario['Stock_Actual'].to_numpy()
+        # stock / velocidad <= dias_alerta, sin dividir todo el catálogo
+        en_riesgo = np.flatnonzero((velocidad > VELOCIDAD_MINIMA) & (stock <= dias_alerta * velocidad))
+        dias_restantes = stock[en_riesgo] / velocidad[en_riesgo]
+        orden = np.argsort(dias_restantes, kind='stable')
+        en_riesgo, dias_restantes = en_riesgo[orden], dias_restantes[orden]
+        return df_inventario.iloc[en_riesgo].assign(Velocidad_Venta_Dia=velocidad[en_riesgo], Dias_Restantes=dias_restantes)
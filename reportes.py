@@ -0,0 +1,107 @@
+"""Exportación de reportes por bloques (Gestión Documental).
+
+Los reportes se escriben a un archivo solo cuando se solicitan, recorriendo
+el almacén bloque a bloque (``Almacen.iterar_pedidos``): la memoria queda
+acotada por ``TAMANO_BLOQUE`` aunque el historial ocupe varios gigabytes.
+
+Formatos: ``csv``, ``csv.gz`` y ``parquet`` (este último requiere pyarrow).
+Filtros: rango de fechas y vendedor (resueltos por el almacén) y categoría
+(por los nombres de producto de esa categoría en el inventario).
+"""
+import gzip
+import os
+
+import pandas as pd
+
+from almacenamiento import TAMANO_BLOQUE, COLUMNAS_INVENTARIO
+from esquema import FORMATO_FECHA
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pa_parquet
+except ImportError:  # Sin pyarrow solo se ofrecen CSV y CSV comprimido
+    pa = None
+
+FORMATOS_REPORTE = {'csv': ('.csv', 'text/csv'), 'csv.gz': ('.csv.gz', 'application/gzip')}
+if pa is not None:
+    FORMATOS_REPORTE['parquet'] = ('.parquet', 'application/vnd.apache.parquet')
+
+REPORTE_VENTAS = 'VENTAS'
+REPORTE_INVENTARIO = 'INVENTARIO'
+
+
+def _texto(bloque):
+    """Categóricas como texto: sus categorías cambian de un bloque a otro."""
+    categoricas = [c for c, tipo in bloque.dtypes.items() if isinstance(tipo, pd.CategoricalDtype)]
+    return bloque.astype({c: str for c in categoricas}) if categoricas else bloque
+
+
+def escribir_bloques(bloques, destino, formato='csv'):
+    """Escribe los bloques de DataFrame en ``destino`` sin juntarlos en memoria. Devuelve las filas escritas."""
+    if formato not in FORMATOS_REPORTE:
+        raise ValueError(f"Formato no disponible: {formato}")
+    filas = 0
+    if formato == 'parquet':
+        escritor = None
+        try:
+            for bloque in bloques:
+                tabla = pa.Table.from_pandas(_texto(bloque), preserve_index=False)
+                if escritor is None:
+                    escritor = pa_parquet.ParquetWriter(destino, tabla.schema, compression='zstd')
+                escritor.write_table(tabla.cast(escritor.schema))
+                filas += len(bloque)
+        finally:
+            if escritor is not None:
+                escritor.close()
+        return filas
+
+    abrir = gzip.open if formato == 'csv.gz' else open
+    with abrir(destino, 'wt', encoding='utf-8', newline='') as f:
+        for bloque in bloques:
+            bloque.to_csv(f, index=False, header=filas == 0, date_format=FORMATO_FECHA)
+            filas += len(bloque)
+    return filas
+
+
+def bloques_ventas(almacen, df_inventario, desde=None, hasta=None, vendedor=None, categoria=None,
+                   tamano_bloque=TAMANO_BLOQUE):
+    """Líneas de pedido filtradas, por bloques del almacén."""
+    productos = None
+    if categoria is not None:
+        productos = set(df_inventario.loc[df_inventario['Categoría'] == categoria, 'Producto'].astype(str))
+    for bloque in almacen.iterar_pedidos(desde=desde, hasta=hasta, vendedor=vendedor, tamano_bloque=tamano_bloque):
+        if productos is not None:
+            bloque = bloque[bloque['Producto'].astype(str).isin(productos)]
+        if len(bloque):
+            yield bloque
+
+
+def bloques_inventario(df_inventario, categoria=None, tamano_bloque=TAMANO_BLOQUE):
+    """Inventario (opcionalmente de una categoría) por bloques."""
+    if categoria is not None:
+        df_inventario = df_inventario[df_inventario['Categoría'] == categoria]
+    for inicio in range(0, len(df_inventario), tamano_bloque):
+        yield df_inventario.iloc[inicio:inicio + tamano_bloque][COLUMNAS_INVENTARIO]
+
+
+def exportar_reporte(tipo_reporte, almacen, df_inventario, destino_sin_extension, formato='csv',
+                     desde=None, hasta=None, vendedor=None, categoria=None):
+    """Escribe el reporte ``VENTAS`` o ``INVENTARIO`` y devuelve ``(ruta, filas)``.
+
+    ``destino_sin_extension`` recibe la extensión del formato. Un reporte
+    sin filas no deja archivo (la ruta es ``None``).
+    """
+    extension, _ = FORMATOS_REPORTE[formato]
+    ruta = destino_sin_extension + extension
+    if tipo_reporte == REPORTE_VENTAS:
+        bloques = bloques_ventas(almacen, df_inventario, desde, hasta, vendedor, categoria)
+    elif tipo_reporte == REPORTE_INVENTARIO:
+        bloques = bloques_inventario(df_inventario, categoria)
+    else:
+        raise ValueError(f"Tipo de reporte desconocido: {tipo_reporte}")
+    filas = escribir_bloques(bloques, ruta, formato)
+    if filas == 0:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        return None, 0
+    return ruta, filas
@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+
+import pandas as pd
+import pytest
+
+import almacenamiento
+from almacenamiento import AlmacenCSV, COLUMNAS_PEDIDOS, COLUMNAS_MOVIMIENTOS, guardar_datos, inventario_base
+from esquema import tipar_inventario, tipar_pedidos
+
+STOCK_INICIAL = 1500  # E101 en inventario_base()
+
+
+class Corte(Exception):
+    """Simula que el proceso muere en un paso de la compactación."""
+
+
+@pytest.fixture
+def rutas(tmp_path):
+    guardar_datos(tipar_inventario(inventario_base()), str(tmp_path / 'inventario.csv'))
+    guardar_datos(pd.DataFrame(columns=COLUMNAS_PEDIDOS), str(tmp_path / 'pedidos.csv'))
+    return {'inventario_file': str(tmp_path / 'inventario.csv'), 'pedidos_file': str(tmp_path / 'pedidos.csv'),
+            'movimientos_file': str(tmp_path / 'inventario_movimientos.csv')}
+
+
+def venta(referencia, deltas):
+    """Líneas de pedido y movimientos de una venta con ``deltas`` ``{ID: delta}``."""
+    lineas = tipar_pedidos(pd.DataFrame([
+        {'ID_Pedido': f"{referencia}-{n}", 'Fecha': '2024-01-01 10:00', 'Producto': id_producto, 'Cantidad': -delta,
+         'Monto_Neto': 1.0, 'Monto_Total': 1.07, 'Vendedor': 'V01', 'Factura_Ruta': f"{referencia}.pdf"}
+        for n, (id_producto, delta) in enumerate(deltas.items())], columns=COLUMNAS_PEDIDOS))
+    movimientos = pd.DataFrame([{'ID': i, 'Delta': d, 'Referencia': referencia} for i, d in deltas.items()],
+                               columns=COLUMNAS_MOVIMIENTOS)
+    return lineas, movimientos
+
+
+def stock(almacen, id_producto='E101'):
+    inventario = almacen.cargar_inventario()
+    return int(inventario.loc[inventario['ID'] == id_producto, 'Stock_Actual'].iloc[0])
+
+
+def test_movimientos_se_aplican_y_se_compactan(rutas):
+    almacen = AlmacenCSV(**rutas, umbral_compactacion=3)
+    for n in range(5):
+        almacen.registrar_lote(*venta(f"F{n}", {'E101': -2, 'E103': -1}))
+    assert stock(almacen) == STOCK_INICIAL - 10
+    assert os.path.exists(rutas['movimientos_file'])  # 4 de 10 movimientos después de la compactación
+    reabierto = AlmacenCSV(**rutas)
+    assert stock(reabierto) == STOCK_INICIAL - 10
+    assert stock(reabierto, 'E103') == 395
+    assert len(reabierto.cargar_pedidos()) == 10
+
+
+@pytest.mark.parametrize('paso', [('replace', '.plegando'), ('replace', '.plegado'),
+                                  ('replace', 'inventario.csv'), ('remove', '.plegado')])
+def test_corte_entre_pasos_de_la_compactacion_no_duplica_deltas(rutas, monkeypatch, paso):
+    almacen = AlmacenCSV(**rutas, umbral_compactacion=10**6)
+    for n in range(4):
+        almacen.registrar_lote(*venta(f"F{n}", {'E101': -5}))
+    funcion, sufijo = paso
+    original = getattr(os, funcion)
+
+    def cortar(*args):
+        if args[-1].endswith(sufijo):
+            raise Corte(paso)
+        return original(*args)
+
+    monkeypatch.setattr(os, funcion, cortar)
+    with pytest.raises(Corte):
+        almacen.compactar()
+    monkeypatch.undo()
+
+    reabierto = AlmacenCSV(**rutas, umbral_compactacion=10**6)
+    assert stock(reabierto) == STOCK_INICIAL - 20
+    # Siguen las ventas y una compactación completa: el resultado no cambia
+    reabierto.registrar_lote(*venta('F9', {'E101': -1}))
+    reabierto.compactar()
+    assert stock(AlmacenCSV(**rutas)) == STOCK_INICIAL - 21
+    sobrantes = [r for r in os.listdir(os.path.dirname(rutas['inventario_file']))
+                 if r.endswith(('.plegando', '.plegado', '.compactado', '.tmp'))]
+    assert sobrantes == []
+    assert not os.path.exists(rutas['movimientos_file'])
+
+
+def _vender_en_proceso(rutas, caja, ventas):
+    almacen = AlmacenCSV(**rutas, umbral_compactacion=7)
+    for n in range(ventas):
+        almacen.registrar_lote(*venta(f"C{caja}-{n}", {'E101': -1}))
+
+
+@pytest.mark.skipif(almacenamiento.fcntl is None, reason="Sin bloqueo de archivos entre procesos")
+def test_procesos_compactando_a_la_vez_no_pierden_movimientos(rutas):
+    contexto = multiprocessing.get_context('fork')
+    procesos = [contexto.Process(target=_vender_en_proceso, args=(rutas, caja, 40)) for caja in range(4)]
+    for proceso in procesos:
+        proceso.start()
+    for proceso in procesos:
+        proceso.join()
+    assert all(p.exitcode == 0 for p in procesos)
+    almacen = AlmacenCSV(**rutas)
+    assert stock(almacen) == STOCK_INICIAL - 160
+    assert len(almacen.cargar_pedidos()) == 160
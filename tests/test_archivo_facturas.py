@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+
+import archivo_facturas
+from archivo_facturas import Archivo
+
+
+def pdf(factura_id, relleno=b'x', tamano=600):
+    return factura_id.encode() + relleno * tamano
+
+
+@pytest.fixture
+def archivo(tmp_path):
+    # Sin compresión y segmentos pequeños: cinco facturas por segmento
+    archivo = Archivo(str(tmp_path / 'facturas'), tamano_segmento=3200, nivel_compresion=None)
+    yield archivo
+    archivo.cerrar()
+
+
+def llenar(archivo, cantidad, fecha='2024-01-01 10:00'):
+    for n in range(cantidad):
+        archivo.guardar(f"F{n:08d}", pdf(f"F{n:08d}"), fecha)
+
+
+def test_guardar_leer_y_reintento(tmp_path):
+    archivo = Archivo(str(tmp_path / 'facturas'))
+    archivo.guardar('F00000001', pdf('F00000001'), '2024-01-01 10:00')
+    assert archivo.leer('F00000001') == pdf('F00000001')
+    archivo.guardar('F00000001', pdf('F00000001', b'y'))  # Reintento: el índice apunta al registro nuevo
+    assert archivo.leer('F00000001') == pdf('F00000001', b'y')
+    with pytest.raises(FileNotFoundError):
+        archivo.leer('F99999999')
+    archivo.cerrar()
+
+
+def test_purga_libera_segmentos_vacios(archivo):
+    llenar(archivo, 10, '2019-05-01 10:00')
+    for n in range(3):
+        archivo.guardar(f"N{n}", pdf(f"N{n}"), '2024-01-01 10:00')
+    assert archivo.purgar('2020-01-01') == 10
+    assert archivo.estadisticas()['facturas'] == 3
+    assert not os.path.exists(archivo.ruta_segmento(1)) and not os.path.exists(archivo.ruta_segmento(2))
+    assert archivo.leer('N2') == pdf('N2')
+
+
+def test_compactar_mueve_las_vivas_y_borra_el_segmento(archivo):
+    llenar(archivo, 15)
+    archivo.eliminar(['F00000000', 'F00000001', 'F00000003', 'F00000005', 'F00000006', 'F00000007', 'F00000008'])
+    reescritos, liberados = archivo.compactar()
+    assert (reescritos, liberados) == (2, 2)
+    for n in (2, 4, 9, 10, 14):
+        assert archivo.leer(f"F{n:08d}") == pdf(f"F{n:08d}")
+
+
+def test_compactar_no_pisa_reintento_ni_purga_concurrentes(archivo, tmp_path):
+    llenar(archivo, 15)
+    archivo.eliminar(['F00000000', 'F00000003', 'F00000004'])
+    otro = Archivo(archivo.directorio, tamano_segmento=3200, nivel_compresion=None)  # Otro proceso
+    leer_cuerpo = archivo._leer_cuerpo
+    competencias = []
+
+    def leer_y_competir(segmento, desplazamiento, longitud):
+        cuerpo = leer_cuerpo(segmento, desplazamiento, longitud)
+        if not competencias:
+            # Entre la lectura y la actualización del índice: un reintento y una purga
+            otro.guardar('F00000001', pdf('F00000001', b'z'))
+            otro.eliminar(['F00000002'])
+            competencias.append(segmento)
+        return cuerpo
+
+    archivo._leer_cuerpo = leer_y_competir
+    assert archivo.compactar()[0] == 1
+    del archivo._leer_cuerpo
+    assert competencias == [1]
+    assert archivo.leer('F00000001') == pdf('F00000001', b'z')
+    assert archivo.ubicar('F00000002') is None  # La purga no se deshace
+    assert archivo.leer('F00000005') == pdf('F00000005')
+    otro.cerrar()
+
+
+def test_lector_con_ubicacion_vieja_reintenta_tras_compactar(archivo):
+    llenar(archivo, 11)
+    archivo.eliminar(['F00000000', 'F00000001', 'F00000002'])
+    vieja = archivo.ubicar('F00000003')
+    archivo.compactar()
+    assert not os.path.exists(archivo.ruta_segmento(vieja[0]))
+    assert archivo.leer('F00000003', vieja) == pdf('F00000003')
+
+
+@pytest.mark.skipif(archivo_facturas.fcntl is None, reason="Sin flock los segmentos se juzgan por antigüedad")
+def test_no_borra_el_segmento_abierto_de_un_proceso_vivo_inactivo(archivo):
+    otro = Archivo(archivo.directorio, tamano_segmento=3200, nivel_compresion=None)  # Vivo, pero sin escribir
+    otro.guardar('V1', pdf('V1'), '2019-01-01 10:00')
+    (segmento, *_), = [otro.ubicar('V1')]
+    hace_dos_dias = time.time() - 2 * 24 * 3600
+    os.utime(archivo.ruta_segmento(segmento), (hace_dos_dias, hace_dos_dias))
+    assert archivo.purgar('2020-01-01') == 1
+    archivo.compactar()
+    assert os.path.exists(archivo.ruta_segmento(segmento))
+    otro.guardar('V2', pdf('V2'))  # Sigue escribiendo en el mismo segmento
+    assert archivo.leer('V2') == pdf('V2')
+    otro.cerrar()
+
+
+def _guardar_y_morir(directorio):
+    Archivo(directorio, tamano_segmento=3200, nivel_compresion=None).guardar('M1', pdf('M1'), '2019-01-01 10:00')
+    os._exit(0)  # Sin cerrar el segmento
+
+
+@pytest.mark.skipif(archivo_facturas.fcntl is None, reason="Sin flock los segmentos se juzgan por antigüedad")
+def test_segmento_de_proceso_terminado_se_libera(archivo):
+    proceso = multiprocessing.get_context('fork').Process(target=_guardar_y_morir, args=(archivo.directorio,))
+    proceso.start()
+    proceso.join()
+    (segmento, *_), = [archivo.ubicar('M1')]
+    assert archivo.purgar('2020-01-01') == 1
+    assert not os.path.exists(archivo.ruta_segmento(segmento))
@@ -0,0 +1,185 @@
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+import almacenamiento
+import bitacora_ventas
+from almacenamiento import AlmacenCSV, VentaIncompleta, anexar_datos
+from bitacora_ventas import BitacoraVentas, recuperar
+from test_almacenamiento import STOCK_INICIAL, rutas, stock, venta  # noqa: F401 (fixture)
+
+
+def test_group_commit_comparte_fsync_entre_hilos(tmp_path, monkeypatch):
+    fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: (time.sleep(0.005), fsync(fd)))  # Disco lento: se acumulan ventas
+    bitacora = BitacoraVentas(str(tmp_path / 'bitacora'))
+    barrera = threading.Barrier(16)
+
+    def caja(numero):
+        barrera.wait()
+        for n in range(10):
+            with bitacora.transaccion(*venta(f"C{numero}-{n}", {'E101': -1})):
+                pass
+
+    hilos = [threading.Thread(target=caja, args=(n,)) for n in range(16)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert bitacora.eventos == 160
+    assert bitacora.sincronizaciones < bitacora.eventos / 2
+    bitacora.cerrar()
+    assert os.listdir(tmp_path / 'bitacora') == []  # Todo aplicado: no queda nada que recuperar
+
+
+def test_rota_y_borra_generaciones_aplicadas(tmp_path):
+    directorio = tmp_path / 'bitacora'
+    bitacora = BitacoraVentas(str(directorio), tamano_maximo=2048)
+    for n in range(40):
+        with bitacora.transaccion(*venta(f"F{n}", {'E101': -1})):
+            pass
+    assert len(os.listdir(directorio)) == 1
+    bitacora.cerrar()
+
+
+def _cortar_en_proceso(rutas, directorio, momento):
+    """Confirma dos ventas y muere a mitad de la tercera, sin cerrar la bitácora."""
+    almacen = AlmacenCSV(**rutas)
+    bitacora = BitacoraVentas(directorio, sincronizar=almacen.sincronizar)
+    for referencia in ('F1', 'F2'):
+        lineas, movimientos = venta(referencia, {'E101': -1, 'E103': -2})
+        with bitacora.transaccion(lineas, movimientos):
+            almacen.registrar_lote(lineas, movimientos)
+    lineas, movimientos = venta('F3', {'E101': -4})
+    with bitacora.transaccion(lineas, movimientos):
+        if momento == 'medio':
+            anexar_datos(movimientos, rutas['movimientos_file'])
+        os._exit(0)
+
+
+@pytest.mark.skipif(bitacora_ventas.fcntl is None, reason="Sin flock la recuperación no distingue procesos vivos")
+@pytest.mark.parametrize('momento', ['antes', 'medio', 'medio_compactado'])
+def test_recupera_venta_de_proceso_muerto_sin_duplicar(rutas, tmp_path, momento):
+    directorio = str(tmp_path / 'bitacora')
+    proceso = multiprocessing.get_context('fork').Process(
+        target=_cortar_en_proceso, args=(rutas, directorio, momento.split('_')[0]))
+    proceso.start()
+    proceso.join()
+    almacen = AlmacenCSV(**rutas)
+    if momento == 'medio_compactado':
+        almacen.compactar()  # Los movimientos de F3 desaparecen antes de recuperar
+        assert not os.path.exists(rutas['movimientos_file'])
+    lineas, resumen = recuperar(almacen, directorio)
+    assert resumen == {'ventas': 3, 'aplicadas': 1, 'rechazadas': 0}
+    assert len(lineas) == 5
+    assert os.listdir(directorio) == []
+    for reabierto in (almacen, AlmacenCSV(**rutas)):
+        assert stock(reabierto) == STOCK_INICIAL - 6
+        assert stock(reabierto, 'E103') == 396
+        assert sorted(reabierto.cargar_pedidos()['ID_Pedido']) == ['F1-0', 'F1-1', 'F2-0', 'F2-1', 'F3-0']
+    assert recuperar(almacen, directorio)[1]['ventas'] == 0
+
+
+def test_descarta_registro_cortado_al_final(rutas, tmp_path):
+    directorio = tmp_path / 'bitacora'
+    almacen = AlmacenCSV(**rutas)
+    bitacora = BitacoraVentas(str(directorio))
+    for referencia in ('F1', 'F2'):
+        with bitacora.transaccion(*venta(referencia, {'E101': -1})):
+            pass  # No llegan al almacén: la copia de la bitácora las tiene como vigentes
+    copia = tmp_path / 'copia'
+    shutil.copytree(directorio, copia)
+    bitacora.cerrar()
+    (wal,) = os.listdir(copia)
+    with open(copia / wal, 'ab') as f:
+        f.write(bitacora_ventas._MARCO.pack(500, 0) + b'{"id": "cort')  # Escritura interrumpida
+    lineas, resumen = recuperar(almacen, str(copia))
+    assert resumen['ventas'] == 2
+    assert stock(almacen) == STOCK_INICIAL - 2
+
+
+def _fallar_anexo(monkeypatch, destinos):
+    """Hace fallar los anexos a los archivos de ``destinos`` (todos los intentos)."""
+    original = almacenamiento.anexar_datos
+
+    def anexar(df, filename):
+        if filename in destinos:
+            raise OSError(f"disco lleno: {filename}")
+        return original(df, filename)
+
+    monkeypatch.setattr(almacenamiento, 'anexar_datos', anexar)
+
+
+def test_segundo_anexo_fallido_se_compensa_y_anula(rutas, tmp_path, monkeypatch):
+    almacen = AlmacenCSV(**rutas)
+    almacen.cargar_inventario()
+    bitacora = BitacoraVentas(str(tmp_path / 'bitacora'))
+    _fallar_anexo(monkeypatch, {rutas['pedidos_file']})
+    lineas, movimientos = venta('F1', {'E101': -3})
+    with pytest.raises(OSError):
+        with bitacora.transaccion(lineas, movimientos):
+            almacen.registrar_lote(lineas, movimientos)
+    monkeypatch.undo()
+    copia = str(tmp_path / 'copia')
+    shutil.copytree(bitacora.directorio, copia)
+    bitacora.cerrar()
+
+    assert stock(almacen) == STOCK_INICIAL
+    assert stock(AlmacenCSV(**rutas)) == STOCK_INICIAL
+    assert almacen.referencias_con_movimientos(['F1']) == set()
+    assert recuperar(almacen, copia)[1]['ventas'] == 0  # Anulada
+    assert stock(AlmacenCSV(**rutas)) == STOCK_INICIAL
+
+
+def test_compensacion_fallida_deja_la_venta_para_la_recuperacion(rutas, tmp_path, monkeypatch):
+    almacen = AlmacenCSV(**rutas)
+    almacen.cargar_inventario()
+    directorio = str(tmp_path / 'bitacora')
+    bitacora = BitacoraVentas(directorio)
+    lineas, movimientos = venta('F1', {'E101': -3})
+    original = almacenamiento.anexar_datos
+    llamadas = []
+
+    def anexar(df, filename):
+        llamadas.append(filename)
+        if len(llamadas) > 1:  # Solo el primer anexo (los movimientos) llega al disco
+            raise OSError("disco lleno")
+        return original(df, filename)
+
+    monkeypatch.setattr(almacenamiento, 'anexar_datos', anexar)
+    with pytest.raises(VentaIncompleta):
+        with bitacora.transaccion(lineas, movimientos):
+            almacen.registrar_lote(lineas, movimientos)
+    monkeypatch.undo()
+    assert stock(almacen) == STOCK_INICIAL - 3  # La memoria refleja el descuento en disco
+    bitacora.cerrar()
+    assert os.listdir(directorio)  # Venta pendiente: la bitácora se conserva
+
+    reabierto = AlmacenCSV(**rutas)
+    reabierto.compactar()
+    _, resumen = recuperar(reabierto, directorio)
+    assert resumen == {'ventas': 1, 'aplicadas': 1, 'rechazadas': 0}
+    assert stock(AlmacenCSV(**rutas)) == STOCK_INICIAL - 3
+    assert list(reabierto.cargar_pedidos()['ID_Pedido']) == ['F1-0']
+
+
+def test_recuperar_no_devuelve_lineas_de_ventas_rechazadas(rutas, tmp_path):
+    almacen = almacenamiento.AlmacenSQLite(str(tmp_path / 'ventas.db'))
+    almacen.migrar_desde(AlmacenCSV(**rutas))
+    directorio = tmp_path / 'bitacora'
+    bitacora = BitacoraVentas(str(directorio))
+    ya_registrada = venta('F1', {'E101': -1})
+    almacen.registrar_lote(*ya_registrada)
+    for lineas, movimientos in (ya_registrada, venta('F2', {'E105': -50}), venta('F3', {'E103': -2})):
+        with bitacora.transaccion(lineas, movimientos):
+            pass  # Solo F1 llegó al almacén; F2 pide más stock del que hay
+    copia = tmp_path / 'copia'
+    shutil.copytree(directorio, copia)
+    bitacora.cerrar()
+    lineas, resumen = recuperar(almacen, str(copia))
+    assert resumen == {'ventas': 3, 'aplicadas': 1, 'rechazadas': 1}
+    assert sorted(lineas['ID_Pedido']) == ['F1-0', 'F3-0']
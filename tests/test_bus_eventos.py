@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from bus_eventos import BusMemoria, BusSQLite, tema_area, TEMA_VENTAS, TEMA_INVENTARIO, PREFIJO_AREA
+
+
+@pytest.fixture(params=['memoria', 'sqlite'])
+def crear(request, tmp_path):
+    """Fábrica de buses del backend parametrizado; con SQLite todos comparten el archivo."""
+    if request.param == 'memoria':
+        return lambda capacidad=200: BusMemoria(capacidad=capacidad)
+    return lambda capacidad=200: BusSQLite(str(tmp_path / 'eventos.db'), capacidad=capacidad)
+
+
+def test_lee_solo_lo_nuevo_desde_el_cursor(crear):
+    bus = crear()
+    bus.publicar(TEMA_VENTAS, factura_id='F1')
+    eventos, cursor, incompleta = bus.leer([TEMA_VENTAS])
+    assert [e['datos'] for e in eventos] == [{'factura_id': 'F1'}]
+    assert not incompleta
+    bus.publicar(TEMA_VENTAS, factura_id='F2')
+    eventos, cursor2, _ = bus.leer([TEMA_VENTAS], desde=cursor)
+    assert [e['datos']['factura_id'] for e in eventos] == ['F2']
+    assert cursor2 == bus.ultimo() > cursor
+    assert bus.leer([TEMA_VENTAS], desde=cursor2)[0] == []
+
+
+def test_prefijo_recibe_todas_las_areas_en_orden(crear):
+    bus = crear()
+    bus.publicar(tema_area('ventas'), mensaje='a')
+    bus.publicar(TEMA_INVENTARIO, ids=['E101'])
+    bus.publicar(tema_area('bodega'), mensaje='b')
+    eventos, _, _ = bus.leer([PREFIJO_AREA])
+    assert [(e['tema'], e['datos']['mensaje']) for e in eventos] == [('area/VENTAS', 'a'), ('area/BODEGA', 'b')]
+    eventos, _, _ = bus.leer([PREFIJO_AREA, TEMA_INVENTARIO])
+    assert [e['secuencia'] for e in eventos] == sorted(e['secuencia'] for e in eventos)
+    assert len(eventos) == 3
+
+
+def test_bufer_circular_descarta_y_avisa_lectura_incompleta(crear):
+    bus = crear(capacidad=3)
+    cursor = bus.leer([TEMA_VENTAS])[1]
+    for n in range(5):
+        bus.publicar(TEMA_VENTAS, n=n)
+    bus.publicar(TEMA_INVENTARIO, ids=['E101'])
+    eventos, _, incompleta = bus.leer([TEMA_VENTAS], desde=cursor)
+    assert [e['datos']['n'] for e in eventos] == [2, 3, 4]
+    assert incompleta
+    # Quien ya había visto lo descartado no recibe el aviso, y los otros temas no se recortan
+    assert not bus.leer([TEMA_VENTAS], desde=eventos[0]['secuencia'] - 1)[2]
+    assert len(bus.leer([TEMA_INVENTARIO])[0]) == 1
+
+
+def test_publicaciones_concurrentes_no_repiten_secuencia(crear):
+    bus = crear(capacidad=10_000)
+
+    def publicar(caja):
+        for n in range(50):
+            bus.publicar(TEMA_VENTAS, caja=caja, n=n)
+
+    hilos = [threading.Thread(target=publicar, args=(c,)) for c in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    eventos, cursor, _ = bus.leer([TEMA_VENTAS])
+    secuencias = [e['secuencia'] for e in eventos]
+    assert len(secuencias) == len(set(secuencias)) == 400
+    assert cursor == max(secuencias)
+
+
+def test_sqlite_compartido_entre_instancias(tmp_path):
+    ruta = str(tmp_path / 'eventos.db')
+    BusSQLite(ruta).publicar(TEMA_VENTAS, ventas=3, lineas=9, total=12.5)
+    eventos, _, _ = BusSQLite(ruta).leer([TEMA_VENTAS])
+    assert eventos[0]['datos'] == {'ventas': 3, 'lineas': 9, 'total': 12.5}
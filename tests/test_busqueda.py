@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from busqueda import IndiceProductos, trigramas
+
+
+@pytest.fixture
+def indice():
+    return IndiceProductos(pd.DataFrame({
+        'ID': ['P001', 'P002', 'P003', 'P004', 'P005'],
+        'Producto': ['Laptop Gamer', 'Mouse Inalámbrico', 'Teclado Mecánico', 'Monitor 24"', 'Mousepad XL'],
+        'Categoría': ['Computadoras', 'Accesorios', 'Accesorios', 'Pantallas', 'Accesorios'],
+    }))
+
+
+def test_trigramas_con_relleno():
+    assert trigramas('sol') == {'  s', ' so', 'sol', 'ol '}
+
+
+def test_exacto_antes_que_prefijo(indice):
+    assert indice.buscar('mouse') == ['P002', 'P005']
+    assert indice.buscar('mous') == ['P002', 'P005']
+
+
+def test_sin_tildes_ni_mayusculas(indice):
+    assert indice.buscar('INALAMBRICO') == ['P002']
+    assert indice.buscar('mecánico') == ['P003']
+
+
+def test_todos_los_terminos_deben_coincidir(indice):
+    assert indice.buscar('accesorios teclado') == ['P003']
+    assert indice.buscar('teclado pantallas') == []
+
+
+def test_aproximada_por_trigramas(indice):
+    assert indice.buscar('tecaldo') == ['P003']  # Letras traspuestas
+    assert indice.buscar('monitr') == ['P004']
+    assert indice.buscar('xyzzy') == []
+
+
+def test_id_exacto_primero(indice):
+    assert indice.buscar('p004')[0] == 'P004'
+
+
+def test_consulta_vacia_y_limite(indice):
+    assert indice.buscar('') == ['P001', 'P002', 'P003', 'P004', 'P005']
+    assert indice.buscar('accesorios', limite=2) == ['P002', 'P003']
+
+
+def test_alta_incremental(indice):
+    indice.agregar('P006', 'Audífonos Bluetooth', 'Accesorios')
+    assert len(indice) == 6
+    assert indice.buscar('audifonos') == ['P006']
+    assert indice.buscar('bluetoth') == ['P006']
+    assert indice.buscar('accesorios')[-1] == 'P006'
@@ -0,0 +1,58 @@
+import pandas as pd
+
+from esquema import concatenar, formatear_fecha, tipar_inventario, tipar_pedidos
+
+
+def pedidos(**columnas):
+    base = {
+        'ID_Pedido': ['V1', 'V2'], 'Fecha': ['2024-03-01 10:00', '2024-03-02 11:30'],
+        'Producto': ['Laptop', 'Mouse'], 'Cantidad': [1, 3],
+        'Monto_Neto': [1200.004, 25.5], 'Monto_Total': [1200.004, 76.499],
+        'Vendedor': ['Ana', 'Ana'], 'Factura_Ruta': ['N/A', 'N/A'],
+    }
+    return pd.DataFrame({**base, **columnas})
+
+
+def test_tipar_pedidos_aplica_el_esquema():
+    df = tipar_pedidos(pedidos())
+    assert df['Producto'].dtype == 'category'
+    assert df['Vendedor'].dtype == 'category'
+    assert df['Cantidad'].dtype == 'int32'
+    assert df['Fecha'].dtype == 'datetime64[ns]'
+    assert df['Monto_Total'].dtype == 'float64'
+
+
+def test_montos_se_redondean_a_centavos_al_ingresar():
+    df = tipar_pedidos(pedidos())
+    assert df['Monto_Neto'].tolist() == [1200.0, 25.5]
+    assert df['Monto_Total'].tolist() == [1200.0, 76.5]
+
+
+def test_suma_de_montos_difiere_en_fracciones_de_centavo():
+    # Por esto el esquema no promete sumas exactas: se redondean al mostrarlas
+    df = tipar_pedidos(pedidos(Monto_Total=[0.1, 0.2]))
+    assert df['Monto_Total'].sum() != 0.3
+    assert round(df['Monto_Total'].sum(), 2) == 0.3
+
+
+def test_fechas_en_formato_mixto():
+    df = tipar_pedidos(pedidos(Fecha=['2024-03-01 10:00', '2024-03-02T11:30:15']))
+    assert df['Fecha'].notna().all()
+    assert formatear_fecha(df['Fecha'][0]) == '2024-03-01 10:00'
+
+
+def test_tipar_inventario():
+    df = tipar_inventario(pd.DataFrame({'ID': ['P1'], 'Producto': ['Laptop'], 'Categoría': ['Electrónica'],
+                                        'Precio': [999.999], 'Stock_Actual': [5.0]}))
+    assert df['Stock_Actual'].dtype == 'int32'
+    assert df['Categoría'].dtype == 'category'
+    assert df['Precio'].tolist() == [1000.0]
+
+
+def test_concatenar_une_categorias():
+    a = tipar_pedidos(pedidos())
+    b = tipar_pedidos(pedidos(Producto=['Teclado', 'Monitor'], Vendedor=['Luis', 'Luis']))
+    df = concatenar([a, b])
+    assert df['Producto'].dtype == 'category'
+    assert df['Producto'].tolist() == ['Laptop', 'Mouse', 'Teclado', 'Monitor']
+    assert list(df.index) == [0, 1, 2, 3]
@@ -0,0 +1,67 @@
+import pytest
+
+from archivo_facturas import Archivo
+from facturacion import CacheFacturas
+
+
+class ArchivoContado(Archivo):
+    """Archivo que cuenta las lecturas que llegan al disco."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lecturas = []
+
+    def leer(self, factura_id, ubicacion=None):
+        self.lecturas.append(factura_id)
+        return super().leer(factura_id, ubicacion)
+
+
+@pytest.fixture
+def archivo(tmp_path):
+    archivo = ArchivoContado(str(tmp_path / 'facturas'), nivel_compresion=None)
+    for factura_id in ('F1', 'F2', 'F3'):
+        archivo.guardar(factura_id, factura_id.encode() * 50)  # 100 bytes
+    yield archivo
+    archivo.cerrar()
+
+
+def test_lecturas_repetidas_salen_de_la_cache(archivo):
+    cache = CacheFacturas(capacidad_bytes=1000, archivo=archivo)
+    assert cache.leer('F1') == b'F1' * 50
+    assert cache.leer('F1') == b'F1' * 50
+    assert archivo.lecturas == ['F1']
+
+
+def test_expulsa_la_menos_usada_al_superar_los_bytes(archivo):
+    cache = CacheFacturas(capacidad_bytes=250, archivo=archivo)
+    cache.leer('F1')
+    cache.leer('F2')
+    cache.leer('F1')  # F2 pasa a ser la menos usada
+    cache.leer('F3')
+    assert cache._bytes == 200
+    cache.leer('F1')
+    cache.leer('F3')
+    assert archivo.lecturas == ['F1', 'F2', 'F3']
+    cache.leer('F2')
+    assert archivo.lecturas == ['F1', 'F2', 'F3', 'F2']
+    assert cache._bytes == 200
+
+
+def test_factura_mayor_que_la_capacidad_se_conserva_sola(archivo):
+    cache = CacheFacturas(capacidad_bytes=50, archivo=archivo)
+    cache.leer('F1')
+    cache.leer('F1')
+    assert archivo.lecturas == ['F1']
+    cache.leer('F2')
+    assert cache._bytes == 100
+    cache.leer('F1')
+    assert archivo.lecturas == ['F1', 'F2', 'F1']
+
+
+def test_factura_regenerada_no_sirve_la_copia_vieja(archivo):
+    cache = CacheFacturas(capacidad_bytes=1000, archivo=archivo)
+    cache.leer('F1')
+    archivo.guardar('F1', b'nueva' * 10)
+    assert cache.leer('F1') == b'nueva' * 10
+    assert cache._bytes == 50  # La copia vieja deja de ocupar la caché
+    assert archivo.lecturas == ['F1', 'F1']
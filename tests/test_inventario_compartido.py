@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from almacenamiento import StockInsuficiente, VentaIncompleta, inventario_base
+from esquema import tipar_inventario
+from inventario_compartido import InventarioCompartido, ConflictoVersion
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj():
+    return Reloj()
+
+
+@pytest.fixture
+def inventario(reloj):
+    # E101: 1500, E102: 35, E103: 400, E104: 100, E105: 10
+    return InventarioCompartido(tipar_inventario(inventario_base()), ttl_reserva=60, num_segmentos=4, reloj=reloj)
+
+
+def test_disponible_de_id_inexistente_lanza_keyerror(inventario):
+    with pytest.raises(KeyError):
+        inventario.disponible('X999')
+    assert inventario.disponible('E105') == 10
+
+
+def test_reservas_descuentan_el_disponible_y_caducan(inventario, reloj):
+    reserva = inventario.reservar('E105', 8, sesion='a')
+    assert inventario.disponible('E105') == 2
+    with pytest.raises(StockInsuficiente):
+        inventario.reservar('E105', 3, sesion='b')
+    with pytest.raises(StockInsuficiente):
+        inventario.confirmar_venta(['E105'], [3])  # Otra sesión no puede usar lo reservado
+    inventario.confirmar_venta(['E105'], [8], reservas=[('E105', reserva)])  # La dueña sí
+    assert inventario.disponible('E105') == 2
+    inventario.reservar('E105', 2, sesion='b')
+    reloj.ahora += 61
+    assert inventario.disponible('E105') == 2
+
+
+def test_persistir_fallido_no_descuenta(inventario):
+    def fallar():
+        raise OSError("disco lleno")
+
+    with pytest.raises(OSError):
+        inventario.confirmar_venta(['E102'], [5], persistir=fallar)
+    assert inventario.producto('E102')['Stock_Actual'] == 35
+
+
+def test_venta_incompleta_descuenta_y_relanza(inventario):
+    def incompleta():
+        raise VentaIncompleta("sin líneas de pedido")
+
+    with pytest.raises(VentaIncompleta):
+        inventario.confirmar_venta(['E102'], [5], persistir=incompleta)
+    assert inventario.producto('E102')['Stock_Actual'] == 30  # Igual que el almacén en disco
+
+
+def test_cajas_concurrentes_con_carritos_solapados_no_venden_de_mas(inventario):
+    """Ocho cajas compran carritos que comparten E102 y E105 (los de menos stock) hasta agotarlos."""
+    carritos = [(['E102', 'E101'], [3, 1]), (['E105', 'E102'], [1, 2]), (['E103', 'E105', 'E104'], [2, 1, 1])]
+    vendido = {i: 0 for i in ('E101', 'E102', 'E103', 'E104', 'E105')}
+    ventas, persistidas = [], []
+    lock = threading.Lock()
+    barrera = threading.Barrier(8)
+
+    def caja(numero):
+        barrera.wait()
+        for n in range(30):
+            ids, cantidades = carritos[(numero + n) % len(carritos)]
+            try:
+                inventario.confirmar_venta(ids, cantidades, persistir=lambda: persistidas.append(1),
+                                           reintentos=50)
+            except (StockInsuficiente, ConflictoVersion):
+                continue
+            with lock:
+                ventas.append(numero)
+                for id_producto, cantidad in zip(ids, cantidades):
+                    vendido[id_producto] += cantidad
+
+    hilos = [threading.Thread(target=caja, args=(n,)) for n in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    iniciales = dict(zip(inventario_base()['ID'], inventario_base()['Stock_Actual']))
+    for id_producto, cantidad in vendido.items():
+        final = inventario.producto(id_producto)['Stock_Actual']
+        assert final >= 0
+        assert final == iniciales[id_producto] - cantidad
+    # La demanda supera el stock: los productos compartidos se agotan sin quedar negativos
+    assert inventario.producto('E105')['Stock_Actual'] == 0
+    assert inventario.producto('E102')['Stock_Actual'] < 3
+    assert len(persistidas) == len(ventas)
+
+
+def test_consultar_y_existencias_marcan_ids_inexistentes(inventario):
+    inventario.reservar('E104', 40, sesion='a')
+    consulta = inventario.consultar(['E104', 'X1'])
+    assert consulta['Disponible'].tolist() == [60, -1]
+    assert inventario.existencias(['X1', 'E104']).tolist() == [-1, 100]
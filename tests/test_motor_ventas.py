@@ -0,0 +1,81 @@
+import os
+
+import pandas as pd
+import pytest
+
+import almacenamiento
+from almacenamiento import AlmacenCSV
+from bitacora_ventas import BitacoraVentas, recuperar
+from bus_eventos import BusMemoria, TEMA_VENTAS
+from inventario_compartido import InventarioCompartido
+from motor_ventas import MotorVentas, importar
+from numeracion import Numerador
+from test_almacenamiento import STOCK_INICIAL, rutas, stock  # noqa: F401 (fixture)
+
+
+@pytest.fixture
+def entorno(rutas, tmp_path):
+    almacen = AlmacenCSV(**rutas)
+    bitacora = BitacoraVentas(str(tmp_path / 'bitacora'), sincronizar=almacen.sincronizar)
+    bus = BusMemoria()
+    motor = MotorVentas(almacen, InventarioCompartido(almacen.cargar_inventario()),
+                        numerador=Numerador(str(tmp_path / 'numeracion.db')), bitacora=bitacora, bus=bus)
+    yield motor
+    bitacora.cerrar()
+
+
+def cortar_anexos(monkeypatch, fallidos):
+    """Hace fallar los anexos número ``fallidos`` (contando desde 1) del almacén CSV."""
+    original = almacenamiento.anexar_datos
+    llamadas = []
+
+    def anexar(df, filename):
+        llamadas.append(filename)
+        if len(llamadas) in fallidos:
+            raise OSError("disco lleno")
+        return original(df, filename)
+
+    monkeypatch.setattr(almacenamiento, 'anexar_datos', anexar)
+
+
+def carrito(cantidad=3):
+    return pd.DataFrame({'ID': ['E101'], 'Producto': ['Cable THHN 12AWG'], 'Cantidad': [cantidad],
+                         'Subtotal_Bruto': [0.75 * cantidad]})
+
+
+def test_venta_incompleta_queda_hecha_y_publicada(entorno, rutas, monkeypatch):
+    motor = entorno
+    cortar_anexos(monkeypatch, {2, 3})  # Pedido y compensación fallan; los movimientos llegan
+    venta = motor.vender(carrito(), 'V01')
+    monkeypatch.undo()
+    assert venta['pendiente']
+    assert motor.inventario.producto('E101')['Stock_Actual'] == STOCK_INICIAL - 3
+    eventos, _, _ = motor.bus.leer([TEMA_VENTAS])
+    assert [e['datos']['factura_id'] for e in eventos] == [venta['factura_id']]
+    assert not motor.vender(carrito(1), 'V01')['pendiente']
+
+    motor.bitacora.cerrar()
+    _, resumen = recuperar(AlmacenCSV(**rutas), motor.bitacora.directorio)
+    assert resumen == {'ventas': 2, 'aplicadas': 1, 'rechazadas': 0}
+    reabierto = AlmacenCSV(**rutas)
+    assert stock(reabierto) == STOCK_INICIAL - 4
+    assert len(reabierto.cargar_pedidos()) == 2
+
+
+def test_importacion_sigue_tras_una_venta_incompleta(entorno, rutas, tmp_path, monkeypatch):
+    motor = entorno
+    ruta = str(tmp_path / 'ventas_pos.csv')
+    pd.DataFrame({'Venta': ['A', 'B', 'C'], 'ID': ['E101', 'E103', 'E101'], 'Cantidad': [2, 5, 1],
+                  'Vendedor': ['V01', 'V02', 'V01']}).to_csv(ruta, index=False)
+    cortar_anexos(monkeypatch, {2, 3})
+    resumen = importar(motor, ruta, lineas_por_lote=1, facturar=False)
+    monkeypatch.undo()
+    assert (resumen['ventas'], resumen['lineas'], resumen['rechazadas'], resumen['pendientes']) == (3, 3, 0, 1)
+
+    motor.bitacora.cerrar()
+    recuperar(AlmacenCSV(**rutas), motor.bitacora.directorio)
+    reabierto = AlmacenCSV(**rutas)
+    assert stock(reabierto) == STOCK_INICIAL - 3
+    assert stock(reabierto, 'E103') == 395
+    assert len(reabierto.cargar_pedidos()) == 3
+    assert os.listdir(motor.bitacora.directorio) == []
@@ -0,0 +1,63 @@
+import multiprocessing
+import threading
+
+from numeracion import Numerador, SECUENCIA_FACTURAS, SECUENCIA_PEDIDOS, formatear_factura, formatear_pedido
+
+
+def test_bloques_consecutivos_y_peticiones_grandes(tmp_path):
+    numerador = Numerador(str(tmp_path / 'numeracion.db'), tamano_bloque=10)
+    assert [numerador.siguiente(SECUENCIA_FACTURAS) for _ in range(3)] == [1, 2, 3]
+    assert list(numerador.siguientes(SECUENCIA_PEDIDOS, 4)) == [1, 2, 3, 4]
+    grande = numerador.siguientes(SECUENCIA_FACTURAS, 25)  # Directo de la base, después del bloque en memoria
+    assert list(grande) == list(range(11, 36))
+    assert numerador.siguiente(SECUENCIA_FACTURAS) == 4
+    assert formatear_factura(4) == 'F00000004' and formatear_pedido(4) == 'P0000000004'
+
+
+def test_reinicio_no_repite_numeros(tmp_path):
+    ruta = str(tmp_path / 'numeracion.db')
+    primero = Numerador(ruta, tamano_bloque=10)
+    usados = {primero.siguiente(SECUENCIA_FACTURAS) for _ in range(3)}
+    segundo = Numerador(ruta, tamano_bloque=10)  # El resto del bloque anterior queda como hueco
+    assert segundo.siguiente(SECUENCIA_FACTURAS) == 11
+    assert usados.isdisjoint({segundo.siguiente(SECUENCIA_FACTURAS) for _ in range(20)})
+
+
+def test_hilos_no_repiten_numeros(tmp_path):
+    numerador = Numerador(str(tmp_path / 'numeracion.db'), tamano_bloque=7)
+    obtenidos = [[] for _ in range(8)]
+
+    def caja(n):
+        for k in range(200):
+            obtenidos[n].extend(numerador.siguientes(SECUENCIA_FACTURAS, 1 + k % 3))
+
+    hilos = [threading.Thread(target=caja, args=(n,)) for n in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    todos = [x for lista in obtenidos for x in lista]
+    assert len(todos) == len(set(todos))
+    assert all(lista == sorted(lista) for lista in obtenidos)  # Crecientes dentro del proceso
+
+
+def _numerar_en_proceso(ruta, salida):
+    numerador = Numerador(ruta, tamano_bloque=5)
+    numeros = [numerador.siguiente(SECUENCIA_FACTURAS) for _ in range(300)]
+    numeros += list(numerador.siguientes(SECUENCIA_FACTURAS, 50))
+    with open(salida, 'w') as f:
+        f.write('\n'.join(map(str, numeros)))
+
+
+def test_procesos_no_repiten_numeros(tmp_path):
+    ruta = str(tmp_path / 'numeracion.db')
+    contexto = multiprocessing.get_context('fork')
+    salidas = [str(tmp_path / f"numeros-{n}.txt") for n in range(4)]
+    procesos = [contexto.Process(target=_numerar_en_proceso, args=(ruta, salida)) for salida in salidas]
+    for proceso in procesos:
+        proceso.start()
+    for proceso in procesos:
+        proceso.join()
+    assert all(p.exitcode == 0 for p in procesos)
+    todos = [int(x) for salida in salidas for x in open(salida).read().split()]
+    assert len(todos) == 4 * 350 == len(set(todos))
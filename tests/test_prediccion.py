@@ -0,0 +1,73 @@
+import math
+
+import pandas as pd
+import pytest
+
+from prediccion import VelocidadVentas
+
+HOY = pd.Timestamp('2024-03-15')
+
+
+class Reloj:
+    def __init__(self):
+        self.dia = (HOY - pd.Timestamp(0)) / pd.Timedelta(days=1)
+
+    def __call__(self):
+        return self.dia
+
+
+def inventario(stock=(10, 500, 3)):
+    return pd.DataFrame({'ID': ['P1', 'P2', 'P3'], 'Producto': ['Laptop', 'Mouse', 'Teclado'],
+                         'Stock_Actual': list(stock)})
+
+
+def pedidos(*lineas):
+    return pd.DataFrame(lineas, columns=['Fecha', 'Producto', 'Cantidad'])
+
+
+@pytest.fixture
+def reloj():
+    return Reloj()
+
+
+def velocidad(velocidades, id_producto):
+    indice, valores = velocidades.velocidades()
+    return valores[indice.get_loc(id_producto)]
+
+
+def test_historial_pesa_segun_antiguedad(reloj):
+    df = pedidos((HOY.strftime('%Y-%m-%d %H:%M'), 'Laptop', 14),
+                 ((HOY - pd.Timedelta(days=14)).strftime('%Y-%m-%d %H:%M'), 'Mouse', 14),
+                 (HOY.strftime('%Y-%m-%d %H:%M'), 'Descatalogado', 99))
+    v = VelocidadVentas(inventario(), df, decaimiento_dias=14.0, reloj=reloj)
+    assert velocidad(v, 'P1') == pytest.approx(1.0)
+    assert velocidad(v, 'P2') == pytest.approx(math.exp(-1))  # Una constante de tiempo atrás
+    assert velocidad(v, 'P3') == 0.0
+
+
+def test_velocidad_decae_con_el_tiempo(reloj):
+    v = VelocidadVentas(inventario(), pedidos(), decaimiento_dias=14.0, reloj=reloj)
+    v.registrar_venta(['P1', 'P1', 'X9'], [7, 7, 5])  # Repite ID; el desconocido se ignora
+    assert velocidad(v, 'P1') == pytest.approx(1.0)
+    reloj.dia += 28
+    assert velocidad(v, 'P1') == pytest.approx(math.exp(-2))
+
+
+def test_alerta_ordena_por_cobertura(reloj):
+    v = VelocidadVentas(inventario(stock=(10, 500, 3)), pedidos(), decaimiento_dias=14.0, reloj=reloj)
+    v.registrar_venta(['P1', 'P2', 'P3'], [14, 14, 14])  # 1 unidad/día cada uno
+    alerta = v.alerta(inventario(stock=(10, 500, 3)), dias_alerta=14)
+    assert alerta['ID'].tolist() == ['P3', 'P1']
+    assert alerta['Dias_Restantes'].tolist() == pytest.approx([3.0, 10.0])
+    assert alerta['Velocidad_Venta_Dia'].tolist() == pytest.approx([1.0, 1.0])
+
+
+def test_producto_agregado_se_alinea_con_el_inventario(reloj):
+    v = VelocidadVentas(inventario(), pedidos(), decaimiento_dias=14.0, reloj=reloj)
+    v.agregar_producto('P4')
+    v.registrar_venta(['P4'], [28])
+    df = pd.concat([inventario(), pd.DataFrame({'ID': ['P4'], 'Producto': ['Monitor'], 'Stock_Actual': [4]})],
+                   ignore_index=True)
+    assert v.alerta(df)['ID'].tolist() == ['P4']
+    # Un inventario con otro orden se reindexa por ID
+    assert v.alerta(df.iloc[::-1])['ID'].tolist() == ['P4']
@@ -0,0 +1,79 @@
+import gzip
+import os
+
+import pandas as pd
+import pytest
+
+from almacenamiento import AlmacenCSV, COLUMNAS_INVENTARIO, COLUMNAS_MOVIMIENTOS, COLUMNAS_PEDIDOS
+from esquema import tipar_pedidos
+from reportes import (FORMATOS_REPORTE, REPORTE_INVENTARIO, REPORTE_VENTAS, bloques_ventas, escribir_bloques,
+                      exportar_reporte, pa)
+from test_almacenamiento import rutas  # noqa: F401 (fixture)
+
+PRODUCTOS = ['Cable THHN 12AWG', 'Toma Corriente Doble', 'Interruptor Sencillo']  # Material, Accesorio, Accesorio
+
+
+@pytest.fixture
+def almacen(rutas):  # noqa: F811 (fixture)
+    almacen = AlmacenCSV(**rutas)
+    lineas = tipar_pedidos(pd.DataFrame([
+        {'ID_Pedido': f"F{n}", 'Fecha': f"2024-01-{n + 1:02d} 10:00", 'Producto': PRODUCTOS[n % 3], 'Cantidad': 1,
+         'Monto_Neto': 1.0, 'Monto_Total': 1.07, 'Vendedor': 'V01' if n % 2 else 'V02', 'Factura_Ruta': f"F{n}.pdf"}
+        for n in range(10)], columns=COLUMNAS_PEDIDOS))
+    almacen.registrar_lote(lineas, pd.DataFrame(columns=COLUMNAS_MOVIMIENTOS))
+    return almacen
+
+
+def test_exporta_por_bloques_con_un_solo_encabezado(almacen, tmp_path):
+    destino = str(tmp_path / 'ventas.csv')
+    bloques = list(bloques_ventas(almacen, almacen.cargar_inventario(), tamano_bloque=3))
+    assert [len(b) for b in bloques] == [3, 3, 3, 1]
+    assert escribir_bloques(iter(bloques), destino) == 10
+    df = pd.read_csv(destino)
+    assert list(df.columns) == COLUMNAS_PEDIDOS
+    assert df['ID_Pedido'].tolist() == [f"F{n}" for n in range(10)]
+    assert df['Fecha'][0] == '2024-01-01 10:00'
+
+
+def test_filtros_de_fecha_vendedor_y_categoria(almacen, tmp_path):
+    inventario = almacen.cargar_inventario()
+    ruta, filas = exportar_reporte(REPORTE_VENTAS, almacen, inventario, str(tmp_path / 'r'), 'csv',
+                                   desde=pd.Timestamp('2024-01-03'), vendedor='V01', categoria='Accesorio')
+    assert ruta == str(tmp_path / 'r.csv')
+    # Accesorios (n % 3 != 0) de V01 (impares) desde el día 3
+    assert pd.read_csv(ruta)['ID_Pedido'].tolist() == ['F5', 'F7']
+    assert filas == 2
+
+
+def test_reporte_vacio_no_deja_archivo(almacen, tmp_path):
+    ruta, filas = exportar_reporte(REPORTE_VENTAS, almacen, almacen.cargar_inventario(), str(tmp_path / 'r'),
+                                   vendedor='Nadie')
+    assert (ruta, filas) == (None, 0)
+    assert not os.path.exists(tmp_path / 'r.csv')
+
+
+def test_inventario_comprimido(almacen, tmp_path):
+    ruta, filas = exportar_reporte(REPORTE_INVENTARIO, almacen, almacen.cargar_inventario(), str(tmp_path / 'r'),
+                                   'csv.gz', categoria='Accesorio')
+    assert ruta.endswith('.csv.gz') and filas == 2
+    with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+        df = pd.read_csv(f)
+    assert list(df.columns) == COLUMNAS_INVENTARIO
+    assert df['ID'].tolist() == ['E102', 'E103']
+
+
+@pytest.mark.skipif(pa is None, reason="Requiere pyarrow")
+def test_parquet_une_bloques_con_categorias_distintas(almacen, tmp_path):
+    destino = str(tmp_path / 'ventas.parquet')
+    bloques = bloques_ventas(almacen, almacen.cargar_inventario(), tamano_bloque=4)
+    assert escribir_bloques(bloques, destino, 'parquet') == 10
+    df = pd.read_parquet(destino)
+    assert df['Producto'].tolist() == [PRODUCTOS[n % 3] for n in range(10)]
+
+
+def test_formato_y_tipo_desconocidos(almacen, tmp_path):
+    with pytest.raises(ValueError):
+        escribir_bloques(iter([]), str(tmp_path / 'x.xlsx'), 'xlsx')
+    assert 'xlsx' not in FORMATOS_REPORTE
+    with pytest.raises(ValueError):
+        exportar_reporte('OTRO', almacen, almacen.cargar_inventario(), str(tmp_path / 'r'))